@@ -0,0 +1,281 @@
+"""Benchmarks for parsing the index, searching and installing docsets.
+
+Each benchmark runs against the test index (`tests/data/docsets.json`)
+and synthetic indexes of 10,000 and 100,000 docsets,
+and the install benchmark extracts generated archives with many small files.
+
+Results are saved as JSON, and can be compared to an earlier run:
+
+    python benchmarks/run.py --output new.json --compare old.json
+
+which exits with an error if any benchmark is slower than the threshold.
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import string
+import sys
+import tarfile
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+from zeal_feeds import user_contrib, zeal
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor, DocSetCollection
+
+FIXTURE = Path(__file__).parent.parent / "tests" / "data" / "docsets.json"
+
+INDEX_SIZES = (10_000, 100_000)
+ARCHIVE_SIZES = (1_000, 10_000)
+"""Number of files in the generated docset archives."""
+
+SEARCHES = ("py", "python", "django rest", "xyzzy")
+FUZZY_SEARCHES = ("pyhton", "djnago", "reakt")
+
+
+def main() -> int:
+    """Run the benchmarks, save the results and compare them to a baseline."""
+    parser = argparse.ArgumentParser(description=__doc__.partition("\n")[0])
+    parser.add_argument("--output", type=Path, help="Save the results to a JSON file")
+    parser.add_argument(
+        "--compare", type=Path, help="Compare to an earlier results file"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Slow down (as a ratio of the baseline) counted as a regression "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs of each benchmark (default: 5)"
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Only run the smaller synthetic index and archive",
+    )
+    parser.add_argument("--filter", help="Only run benchmarks containing this text")
+    args = parser.parse_args()
+
+    index_sizes = INDEX_SIZES[:1] if args.quick else INDEX_SIZES
+    archive_sizes = ARCHIVE_SIZES[:1] if args.quick else ARCHIVE_SIZES
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="zeal-feeds-bench-") as work_folder:
+        # keep the installed docsets manifest out of the real application data
+        zeal.user_data_path = lambda app_name: Path(work_folder) / "data"
+        benchmarks = _benchmarks(index_sizes, archive_sizes, Path(work_folder))
+        for name, size, benchmark in benchmarks:
+            if args.filter and args.filter not in name:
+                continue
+            timings = _time(benchmark, args.repeat)
+            result = {
+                "name": name,
+                "size": size,
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "timings": timings,
+            }
+            results.append(result)
+            print(f"{name:<40} {size:>8,} {result['min'] * 1000:>10.2f} ms")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        args.output.parent.mkdir(exist_ok=True, parents=True)
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        return _compare(json.loads(args.compare.read_text()), report, args.threshold)
+    return 0
+
+
+def _benchmarks(
+    index_sizes: tuple[int, ...], archive_sizes: tuple[int, ...], work_folder: Path
+) -> Iterator[tuple[str, int, Callable[[], object]]]:
+    """Yield the name, input size and function for each benchmark."""
+    indexes = [("fixture", json.loads(FIXTURE.read_text()))]
+    indexes += [
+        (f"synthetic-{size}", _synthetic_index(size, seed=size)) for size in index_sizes
+    ]
+
+    for label, index_json in indexes:
+        size = len(index_json)
+        yield (
+            f"parse_docset_index[{label}]",
+            size,
+            lambda index_json=index_json: list(
+                user_contrib._parse_docset_index(index_json)
+            ),
+        )
+        yield (
+            f"collection_from_json[{label}]",
+            size,
+            lambda index_json=index_json: user_contrib._json_collection(index_json),
+        )
+        docsets = list(user_contrib._parse_docset_index(index_json))
+        yield (
+            f"collection_from_docsets[{label}]",
+            size,
+            lambda docsets=docsets: DocSetCollection(docsets),
+        )
+        yield (
+            f"search_first[{label}]",
+            size,
+            lambda index_json=index_json: list(
+                user_contrib._json_collection(index_json).search(SEARCHES[0])
+            ),
+        )
+        collection = user_contrib._json_collection(index_json)
+        # build the search index before timing the searches
+        list(collection.search(SEARCHES[0]))
+        yield (
+            f"search[{label}]",
+            size,
+            lambda collection=collection: [
+                list(collection.search(text)) for text in SEARCHES
+            ],
+        )
+        yield (
+            f"fallback_search[{label}]",
+            size,
+            lambda collection=collection: [
+                list(collection.fallback_search(text)) for text in FUZZY_SEARCHES
+            ],
+        )
+
+    for file_count in archive_sizes:
+        yield (
+            f"install_docset[{file_count}-files]",
+            file_count,
+            _install_benchmark(file_count, work_folder / f"install-{file_count}"),
+        )
+
+
+def _synthetic_index(size: int, seed: int) -> list[dict]:
+    """Generate an `/api/docsets` index with realistic looking docsets."""
+    rng = random.Random(seed)
+    words = [
+        "py",
+        "django",
+        "react",
+        "rest",
+        "flask",
+        "async",
+        "json",
+        "http",
+        "data",
+        "test",
+        "web",
+        "sql",
+        "cloud",
+        "net",
+        "ui",
+    ]
+    index = []
+    for i in range(size):
+        name = "".join(rng.sample(words, rng.randint(1, 3))) + f"_{i}"
+        if rng.random() < 0.5:
+            name = name.title()
+        aliases = [
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+            for _ in range(rng.randint(0, 2))
+        ]
+        index.append(
+            {
+                "name": name,
+                "aliases": aliases,
+                "author": {"name": f"Author {i}", "link": f"https://example.com/{i}"},
+                "archive": f"{name}.tgz",
+                "version": f"{rng.randint(0, 9)}.{rng.randint(0, 20)}.{i}",
+                "specific_versions": [],
+                "urls": [
+                    f"https://{mirror}.example.com/feeds/{name}/{name}.tgz"
+                    for mirror in ("one", "two", "three")
+                ],
+            }
+        )
+    return index
+
+
+def _install_benchmark(file_count: int, work_folder: Path) -> Callable[[], object]:
+    """Create an archive with many small files, returning a function to install it."""
+    docset = DocSet(
+        name="Bench",
+        author=DocSetAuthor(name="", link=""),
+        archive="Bench.tgz",
+        version="1.0",
+    )
+    work_folder.mkdir()
+    tarball = work_folder / docset.archive
+    rng = random.Random(file_count)
+    with tarfile.open(tarball, "w:gz") as archive:
+        for i in range(file_count):
+            content = "".join(
+                rng.choices(string.ascii_letters, k=rng.randint(200, 2000))
+            )
+            data = f"<html><body>{content}</body></html>".encode()
+            member = tarfile.TarInfo(
+                f"Bench.docset/Contents/Resources/Documents/{i % 50}/page{i}.html"
+            )
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+    zeal_app = zeal.Zeal(work_folder / "docsets")
+    zeal_app.docset_path.mkdir()
+
+    def install():
+        zeal_app.install_docset(docset, tarball, replace=True)
+
+    return install
+
+
+def _time(benchmark: Callable[[], object], repeat: int) -> list[float]:
+    """Run the benchmark `repeat` times (after a warm up run), returning the timings."""
+    benchmark()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        benchmark()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _compare(baseline: dict, report: dict, threshold: float) -> int:
+    """Print the change from the baseline, returning 1 if any benchmark regressed."""
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print(f"\nCompared to {baseline['created']}:")
+    for result in report["results"]:
+        previous = baseline_results.get(result["name"])
+        if previous is None:
+            continue
+        # the fastest run is the least affected by other activity on the machine
+        ratio = result["min"] / previous["min"]
+        flag = ""
+        if ratio > threshold:
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:<40} {ratio:>8.2f}x{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks slower than {threshold}x the baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
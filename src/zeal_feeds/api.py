@@ -0,0 +1,391 @@
+"""Async API, for loading the index and installing docsets from other applications.
+
+Blocking work (network requests, reading the index, extracting archives)
+runs in worker threads, so one event loop can manage several docset folders at once.
+Progress is reported as `Event`s to an optional callback, rather than printed,
+and callbacks are run in the event loop's thread.
+
+    docsets = await api.load_index()
+    failures = await api.install(Zeal(docset_path), [docsets["attrs"]])
+
+The command line is a wrapper around these functions.
+
+"""
+
+from __future__ import annotations
+
+import enum
+import threading
+from collections.abc import Callable, Iterable, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import attrs
+from platformdirs import user_cache_path
+
+from . import APP_NAME, archive_cache, timings, user_contrib
+from .user_contrib import DocSet, DocSetCollection, SearchResult
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from . import download
+    from .mirrors import MirrorStats
+    from .zeal import InstalledDocSet, RenameCallback, Zeal
+
+DEFAULT_JOBS = 4
+"""Number of docsets downloaded and installed at once."""
+
+
+class Stage(enum.Enum):
+    """What an `Event` is reporting."""
+
+    LOADING_INDEX = "loading index"
+    """Downloading the index, which can take a while."""
+    CACHED_INDEX = "cached index"
+    STALE_INDEX = "stale index"
+    """Using an out of date cached index, while it is refreshed in the background."""
+    DOWNLOADING = "downloading"
+    CACHED = "cached"
+    """Using the archive from the archive cache."""
+    CORRUPT = "corrupt"
+    """The cached archive is corrupt, so it is downloaded again."""
+    INSTALLING = "installing"
+    RENAMED = "renamed"
+    """The docset folder in the archive is renamed to the docset's name."""
+    INSTALLED = "installed"
+    DOWNLOADED = "downloaded"
+    """Downloaded but not installed, for a dry run."""
+
+
+@attrs.frozen
+class Event:
+    """Progress of loading the index, or of a docset's install."""
+
+    stage: Stage
+    docset: str | None = None
+    completed: int | None = None
+    """Bytes downloaded so far, when downloading."""
+    total: int | None = None
+    """Size of the download, if known."""
+
+
+EventCallback = Callable[[Event], None]
+
+_download_locks: dict[Path, threading.Lock] = {}
+_download_locks_guard = threading.Lock()
+
+
+@attrs.define
+class IndexOptions:
+    """Where to load the index from, and how long the cached index is used."""
+
+    url: str = user_contrib.USER_DOCSET_API
+    ttl: int = user_contrib.CACHE_TTL
+    """Seconds the cached index is used before checking for updates."""
+    stale_while_revalidate: bool = False
+    """Use an out of date cached index, refreshing it in the background."""
+
+    def load(self, on_event: EventCallback | None = None) -> DocSetCollection:
+        """Load the index, blocking until it is loaded (see `load_index`)."""
+        on_event = on_event or _ignore
+        with timings.phase("load cached index"):
+            docsets = user_contrib.load_cached_index(self.ttl, url=self.url)
+        if docsets:
+            on_event(Event(Stage.CACHED_INDEX))
+            return docsets
+        if self.stale_while_revalidate and (
+            docsets := user_contrib.load_cached_index(max_age=None, url=self.url)
+        ):
+            on_event(Event(Stage.STALE_INDEX))
+            user_contrib.revalidate_in_background(self.url)
+            return docsets
+        on_event(Event(Stage.LOADING_INDEX))
+        return user_contrib.user_contrib_index(self.url)
+
+
+@attrs.define
+class InstallOptions:
+    """How docsets are installed."""
+
+    jobs: int = DEFAULT_JOBS
+    """Number of docsets to download and install at once."""
+    cache_size: int = archive_cache.DEFAULT_MAX_SIZE
+    """Size cap in bytes for the archive cache, which is pruned after installing."""
+    dry_run: bool = False
+    """Download the docsets without installing them."""
+    stream: bool = False
+    """Extract the docsets while downloading, without saving the archives."""
+    replace: bool = False
+    """Replace docsets that are already installed."""
+
+
+@attrs.frozen
+class Update:
+    """Installed docset with a newer version in the index."""
+
+    installed: InstalledDocSet
+    docset: DocSet
+
+
+async def load_index(
+    options: IndexOptions | None = None, *, on_event: EventCallback | None = None
+) -> DocSetCollection:
+    """Load the index of user contributed docsets, from the cache if it is recent."""
+    import asyncio
+
+    options = options or IndexOptions()
+    on_event = _threadsafe(asyncio.get_running_loop(), on_event)
+    return await asyncio.to_thread(options.load, on_event)
+
+
+async def search(
+    docsets: DocSetCollection, text: str, limit: int | None = None
+) -> list[SearchResult]:
+    """Search the docsets, best matches first (see `DocSetCollection.ranked_search`)."""
+    import asyncio
+
+    return await asyncio.to_thread(docsets.ranked_search, text, limit)
+
+
+async def install(
+    zeal: Zeal | Sequence[Zeal],
+    docsets: Iterable[DocSet],
+    options: InstallOptions | None = None,
+    *,
+    digests: dict[str, str] | None = None,
+    on_event: EventCallback | None = None,
+) -> dict[str, str]:
+    """Download and install docsets, `options.jobs` at a time.
+
+    Each docset is installed as soon as its download finishes.
+    If several docset folders (`zeal`) are given, each docset is downloaded
+    and extracted once, and hard linked into the other folders (see `Zeal.link_docset`).
+    Returns a mapping of docset names to error messages for any failed docsets,
+    rather than aborting the remaining docsets.
+    Archives are checked against the expected SHA-256 `digests`, by docset name.
+
+    Downloaded archives are kept in the archive cache,
+    which is pruned to `options.cache_size` once all the docsets are installed.
+
+    """
+    import asyncio
+
+    from .mirrors import MirrorStats
+
+    options = options or InstallOptions()
+    cache = archive_cache.ArchiveCache.default(options.cache_size)
+    installer = _Installer(
+        list(zeal) if isinstance(zeal, Sequence) else [zeal],
+        await asyncio.to_thread(MirrorStats.load),
+        cache,
+        options,
+        _threadsafe(asyncio.get_running_loop(), on_event),
+        digests=digests or {},
+    )
+    semaphore = asyncio.Semaphore(options.jobs)
+
+    async def install_docset(docset: DocSet) -> None:
+        async with semaphore:
+            await asyncio.to_thread(installer.install, docset)
+
+    docsets = list(docsets)
+    results = await asyncio.gather(
+        *(install_docset(docset) for docset in docsets), return_exceptions=True
+    )
+    failures = {
+        docset.name: str(result) or type(result).__name__
+        for docset, result in zip(docsets, results)
+        if isinstance(result, Exception)
+    }
+    await asyncio.to_thread(installer.mirror_stats.save)
+    await asyncio.to_thread(cache.prune)
+    return failures
+
+
+def outdated(zeal: Zeal, docsets: DocSetCollection) -> list[Update]:
+    """Find the installed docsets with a different version in the index.
+
+    Only docsets installed from the user contributed feeds are included.
+
+    """
+    from .zeal import FEED_URL
+
+    updates = []
+    for installed in zeal.installed_metadata():
+        if installed.feed_url != FEED_URL.format(name=installed.name):
+            continue
+        docset = docsets.get(installed.name)
+        if docset is not None and docset.version != installed.version:
+            updates.append(Update(installed, docset))
+    return updates
+
+
+async def update(
+    zeal: Zeal,
+    docsets: DocSetCollection,
+    options: InstallOptions | None = None,
+    *,
+    on_event: EventCallback | None = None,
+) -> dict[str, str]:
+    """Install the new versions of outdated docsets (see `outdated` and `install`)."""
+    import asyncio
+
+    updates = await asyncio.to_thread(outdated, zeal, docsets)
+    options = attrs.evolve(options or InstallOptions(), replace=True)
+    return await install(
+        zeal, [update.docset for update in updates], options, on_event=on_event
+    )
+
+
+@attrs.define
+class _Installer:
+    """Download and install a docset, reporting progress as events."""
+
+    zeals: list[Zeal]
+    """Docset folders to install to."""
+    mirror_stats: MirrorStats
+    cache: archive_cache.ArchiveCache
+    options: InstallOptions
+    on_event: EventCallback
+    digests: dict[str, str] = attrs.field(factory=dict)
+    """Expected SHA-256 digests of the archives, by docset name."""
+
+    def install(self, docset: DocSet) -> None:
+        """Download and install a single docset."""
+        if self.options.stream:
+            self._install_stream(docset)
+            return
+
+        download_path = user_cache_path(APP_NAME) / "downloads" / docset.archive
+        # other `install` calls might be downloading the same archive
+        with _download_lock(download_path):
+            archive = self._cached_archive(docset)
+            if archive:
+                self.on_event(Event(Stage.CACHED, docset.name))
+            else:
+                from . import download
+
+                self.on_event(Event(Stage.DOWNLOADING, docset.name))
+                archive = download.download_archive(
+                    docset,
+                    download_path,
+                    self.mirror_stats,
+                    self._progress_callback(docset, Stage.DOWNLOADING),
+                    sha256=self.digests.get(docset.name),
+                )
+                archive = self.cache.add(docset, archive)
+
+        if self.options.dry_run:
+            self.on_event(Event(Stage.DOWNLOADED, docset.name))
+            return
+        self.on_event(Event(Stage.INSTALLING, docset.name))
+        first, *others = self._targets(docset)
+        first.install_docset(
+            docset,
+            archive,
+            replace=self.options.replace,
+            on_rename=self._rename_callback(docset),
+        )
+        self._link(docset, first, others)
+        self.on_event(Event(Stage.INSTALLED, docset.name))
+
+    def _cached_archive(self, docset: DocSet) -> Path | None:
+        """Get the docset's archive from the cache, if it has the expected digest."""
+        archive = self.cache.get(docset)
+        sha256 = self.digests.get(docset.name)
+        if archive and sha256 and self.cache.digest(docset) != sha256:
+            return None
+        if archive and not self.cache.verify(docset):
+            self.on_event(Event(Stage.CORRUPT, docset.name))
+            return None
+        return archive
+
+    def _install_stream(self, docset: DocSet) -> None:
+        """Install the docset while it downloads."""
+        import io
+
+        from . import download
+
+        self.on_event(Event(Stage.INSTALLING, docset.name))
+        with io.BufferedReader(
+            download.ArchiveStream(
+                docset,
+                self.mirror_stats,
+                self._progress_callback(docset, Stage.INSTALLING),
+                sha256=self.digests.get(docset.name),
+            )
+        ) as stream:
+            first, *others = self._targets(docset)
+            first.install_docset_stream(
+                docset,
+                stream,
+                replace=self.options.replace,
+                on_rename=self._rename_callback(docset),
+            )
+        self._link(docset, first, others)
+        self.on_event(Event(Stage.INSTALLED, docset.name))
+
+    def _targets(self, docset: DocSet) -> list[Zeal]:
+        """Get the docset folders to install to.
+
+        Unless replacing, folders that already have the docset are skipped.
+
+        """
+        if self.options.replace:
+            return self.zeals
+        folder = f"{docset.name}.docset"
+        targets = [
+            zeal for zeal in self.zeals if not (zeal.docset_path / folder).exists()
+        ]
+        # installing to the first folder reports that the docset is installed
+        return targets or self.zeals[:1]
+
+    def _link(self, docset: DocSet, source: Zeal, targets: list[Zeal]) -> None:
+        """Link the docset installed in `source` into the other folders."""
+        installed = source.docset_path / f"{docset.name}.docset"
+        for zeal in targets:
+            zeal.link_docset(docset, installed, replace=self.options.replace)
+
+    def _rename_callback(self, docset: DocSet) -> RenameCallback:
+        def renamed(folder: str) -> None:
+            self.on_event(Event(Stage.RENAMED, docset.name))
+
+        return renamed
+
+    def _progress_callback(
+        self, docset: DocSet, stage: Stage
+    ) -> download.ProgressCallback:
+        def update_progress(downloaded: int, total: int | None) -> None:
+            self.on_event(Event(stage, docset.name, downloaded, total))
+
+        return update_progress
+
+
+def _download_lock(download_path: Path) -> threading.Lock:
+    """Get the lock for downloading to a path, shared by every `install` call.
+
+    Partial downloads are kept at the same path to be resumed,
+    so only one download to each path can run at once.
+
+    """
+    with _download_locks_guard:
+        return _download_locks.setdefault(download_path, threading.Lock())
+
+
+def _threadsafe(
+    loop: asyncio.AbstractEventLoop, on_event: EventCallback | None
+) -> EventCallback:
+    """Wrap the callback to run in the event loop, when called from a worker thread."""
+    if on_event is None:
+        return _ignore
+    callback = on_event
+
+    def call_soon(event: Event) -> None:
+        loop.call_soon_threadsafe(callback, event)
+
+    return call_soon
+
+
+def _ignore(event: Event) -> None:
+    pass
@@ -0,0 +1,204 @@
+"""Cache of downloaded docset archives, so that reinstalling does not download them.
+
+Archives are keyed by docset name, version and archive name,
+and the least recently used archives are removed when the cache is over its size cap.
+The SHA-256 digest of each download is kept alongside the archive,
+so that a corrupted archive is not installed.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import shutil
+import threading
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import attrs
+from platformdirs import user_cache_path
+
+from . import APP_NAME
+from .user_contrib import DocSet
+
+DEFAULT_MAX_SIZE = 1_073_741_824  # 1 GiB
+"""Default size cap (in bytes) for the archive cache."""
+
+DIGEST_SUFFIX = ".sha256"
+
+_HASH_BUFFER_SIZE = 1_048_576
+
+
+@attrs.define
+class CachedArchive:
+    """Archive in the cache."""
+
+    name: str
+    version: str
+    archive: str
+    path: Path
+    size: int
+    last_used: float
+
+
+@attrs.define
+class ArchiveCache:
+    """Cache of docset archives, in `name/version/archive` folders."""
+
+    path: Path
+    max_size: int = DEFAULT_MAX_SIZE
+    _lock: threading.Lock = attrs.field(
+        factory=threading.Lock, init=False, repr=False, eq=False
+    )
+
+    @classmethod
+    def default(cls, max_size: int = DEFAULT_MAX_SIZE) -> ArchiveCache:
+        """Archive cache in the user cache folder."""
+        return cls(user_cache_path(APP_NAME) / "archives", max_size)
+
+    def archive_path(self, docset: DocSet) -> Path:
+        """Location of the docset archive in the cache."""
+        # versions can contain slashes, so the folder names are quoted
+        return (
+            self.path
+            / quote(docset.name, safe="")
+            / quote(docset.version, safe="")
+            / quote(docset.archive, safe="")
+        )
+
+    def get(self, docset: DocSet) -> Path | None:
+        """Get the cached archive for the docset version, if there is one."""
+        archive = self.archive_path(docset)
+        try:
+            # the modification time records when the archive was last used
+            os.utime(archive)
+        except FileNotFoundError:
+            return None
+        return archive
+
+    def add(self, docset: DocSet, archive: Path) -> Path:
+        """Move a downloaded archive, and its digest if there is one, into the cache."""
+        destination = self.archive_path(docset)
+        with self._lock:
+            destination.parent.mkdir(exist_ok=True, parents=True)
+            if digest_path(archive).exists():
+                shutil.move(digest_path(archive), digest_path(destination))
+            else:
+                digest_path(destination).unlink(missing_ok=True)
+            shutil.move(archive, destination)
+        os.utime(destination)
+        return destination
+
+    def digest(self, docset: DocSet) -> str | None:
+        """Get the SHA-256 digest recorded when the archive was downloaded."""
+        try:
+            return digest_path(self.archive_path(docset)).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def verify(self, docset: DocSet) -> bool:
+        """Check the cached archive against its recorded digest.
+
+        An archive that does not match is removed from the cache.
+        Archives cached without a digest are assumed to be intact.
+
+        """
+        expected = self.digest(docset)
+        archive = self.archive_path(docset)
+        if expected is None:
+            return archive.exists()
+        try:
+            with archive.open("rb") as file:
+                actual = file_sha256(file).hexdigest()
+        except FileNotFoundError:
+            return False
+        if actual == expected:
+            return True
+        with self._lock:
+            archive.unlink(missing_ok=True)
+            digest_path(archive).unlink(missing_ok=True)
+        return False
+
+    def entries(self) -> list[CachedArchive]:
+        """List the archives in the cache, from the most to least recently used."""
+        entries = []
+        for archive in self.path.glob("*/*/*"):
+            if archive.suffix == DIGEST_SUFFIX or not archive.is_file():
+                continue
+            stat = archive.stat()
+            version_folder = archive.parent
+            entries.append(
+                CachedArchive(
+                    name=unquote(version_folder.parent.name),
+                    version=unquote(version_folder.name),
+                    archive=unquote(archive.name),
+                    path=archive,
+                    size=stat.st_size,
+                    last_used=stat.st_mtime,
+                )
+            )
+        entries.sort(key=lambda entry: entry.last_used, reverse=True)
+        return entries
+
+    def prune(
+        self, max_size: int | None = None, keep: Path | None = None
+    ) -> list[CachedArchive]:
+        """Remove the least recently used archives until the cache is under the cap.
+
+        The `keep` archive is never removed, as it is in use,
+        but its size still counts towards the cap.
+        Returns the archives that were removed.
+
+        """
+        max_size = self.max_size if max_size is None else max_size
+        removed = []
+        with self._lock:
+            total_size = 0
+            for entry in self.entries():
+                total_size += entry.size
+                if total_size > max_size and entry.path != keep:
+                    self._remove(entry)
+                    removed.append(entry)
+        return removed
+
+    def clear(self) -> list[CachedArchive]:
+        """Remove every archive from the cache."""
+        return self.prune(max_size=0)
+
+    def _remove(self, entry: CachedArchive) -> None:
+        entry.path.unlink(missing_ok=True)
+        digest_path(entry.path).unlink(missing_ok=True)
+        # remove the empty version and docset folders
+        for folder in (entry.path.parent, entry.path.parent.parent):
+            try:
+                folder.rmdir()
+            except OSError:
+                break
+
+
+def digest_path(archive: Path) -> Path:
+    """Location of the SHA-256 digest for an archive."""
+    return archive.with_name(f"{archive.name}{DIGEST_SUFFIX}")
+
+
+def file_sha256(
+    file: io.BufferedIOBase, sha256: hashlib._Hash | None = None
+) -> hashlib._Hash:
+    """Hash the rest of a file, continuing the given hash if there is one."""
+    sha256 = sha256 or hashlib.sha256()
+    buffer = bytearray(_HASH_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while size := file.readinto(view):
+        sha256.update(view[:size])
+    return sha256
+
+
+def format_size(size: float) -> str:
+    """Format a number of bytes for people."""
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
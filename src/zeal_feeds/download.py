@@ -0,0 +1,406 @@
+"""Download docset archives from the mirrors listed in the index.
+
+Archives are downloaded to a `.part` file, with a JSON sidecar file recording what is
+being downloaded, so that an interrupted download can be resumed by a later run.
+The SHA-256 digest of the archive is computed while it downloads,
+and saved alongside the archive.
+
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import re
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import attrs
+import requests
+from cattrs import Converter
+
+from . import ApplicationError, timings
+from .archive_cache import digest_path, file_sha256
+from .mirrors import MirrorStats, host
+from .transport import default_transport
+from .user_contrib import DocSet
+
+ProgressCallback = Callable[[int, "int | None"], None]
+"""Called with the bytes downloaded so far and the total size (if known)."""
+
+CHUNK_SIZE = 262_144
+"""Bytes to read from a mirror at a time."""
+
+PROGRESS_INTERVAL = 0.1
+"""Minimum seconds between progress updates."""
+
+STALL_WINDOW = 15
+"""Seconds over which the download speed is checked for a stall."""
+
+STALL_MIN_BYTES = 16_384
+"""Minimum bytes to receive during a `STALL_WINDOW` before the mirror is stalled."""
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class MirrorStalledError(Exception):
+    """Raised when a mirror stops sending data at a useful speed."""
+
+
+@attrs.define
+class PartialDownload:
+    """Information saved alongside a partially downloaded archive."""
+
+    # *cattrs* evaluations this type hint, so we cannot use | when <= py3.10
+    size: Optional[int] = None
+    """Expected size of the complete archive."""
+    etag: Optional[str] = None
+    mirror: Optional[str] = None
+    """URL the download was started from."""
+
+    @classmethod
+    def load(cls, sidecar: Path) -> PartialDownload | None:
+        """Load the sidecar file, returning `None` if missing or corrupt."""
+        try:
+            return Converter().structure(json.loads(sidecar.read_text()), cls)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def save(self, sidecar: Path) -> None:
+        """Save the sidecar file."""
+        sidecar.write_text(json.dumps(Converter().unstructure(self), indent=2))
+
+    def matches(self, url: str, r: requests.Response) -> bool:
+        """Check whether a partial response continues this download.
+
+        Any mirror with an archive of the same size is assumed to have the same bytes,
+        but the original mirror must also return the same ETag.
+
+        """
+        match = _CONTENT_RANGE.fullmatch(r.headers.get("content-range", ""))
+        if not match or match[3] == "*" or int(match[3]) != self.size:
+            return False
+        etag = r.headers.get("etag")
+        same_mirror = self.mirror is not None and host(url) == host(self.mirror)
+        return not (same_mirror and self.etag and etag and etag != self.etag)
+
+
+def download_archive(
+    docset: DocSet,
+    destination: Path,
+    stats: MirrorStats,
+    on_progress: ProgressCallback | None = None,
+    sha256: str | None = None,
+) -> Path:
+    """Download the docset archive from the fastest mirror.
+
+    If a mirror fails, or stalls, the download continues from the next best mirror,
+    resuming from the bytes already received when that mirror supports it.
+    The partial download is kept if every mirror fails, to be resumed later.
+
+    The archive's digest is saved next to it (see `archive_cache.digest_path`),
+    and checked against `sha256` if given.
+
+    """
+    if not docset.urls:
+        raise ApplicationError(f"No download URLs for {docset.name}")
+
+    destination.parent.mkdir(exist_ok=True, parents=True)
+    partial_archive = destination.with_name(f"{destination.name}.part")
+    sidecar = destination.with_name(f"{destination.name}.part.json")
+
+    partial = PartialDownload.load(sidecar) if partial_archive.exists() else None
+    if partial is None:
+        partial = PartialDownload()
+        partial_archive.write_bytes(b"")
+
+    with timings.phase("rank mirrors", docset.name):
+        urls = stats.rank(docset.urls)
+
+    errors = []
+    with (
+        timings.phase("download", docset.name) as phase,
+        partial_archive.open("r+b") as archive,
+    ):
+        # hashing the bytes from an earlier run also leaves the file at the end
+        transfer = _Transfer(
+            archive, partial, sidecar, stats, on_progress, file_sha256(archive)
+        )
+        for url in urls:
+            try:
+                transfer.download_from(url)
+            except (requests.RequestException, MirrorStalledError) as exc:
+                stats.record_failure(host(url))
+                errors.append(f"{host(url)}: {exc}")
+                continue
+            break
+        else:
+            raise ApplicationError(
+                f"Failed to download {docset.name} from any mirror "
+                f"({'; '.join(errors)})"
+            )
+        phase.bytes = transfer.received
+
+    size = partial_archive.stat().st_size
+    if partial.size is not None and size != partial.size:
+        raise ApplicationError(
+            f"Downloaded {docset.name} archive is {size} bytes, expected {partial.size}"
+        )
+    digest = transfer.sha256.hexdigest()
+    if sha256 is not None and digest != sha256.lower():
+        # the bytes are wrong, so do not resume from them
+        partial_archive.unlink()
+        sidecar.unlink(missing_ok=True)
+        raise ApplicationError(
+            f"Downloaded {docset.name} archive has SHA-256 {digest}, expected {sha256}"
+        )
+    digest_path(destination).write_text(f"{digest}\n")
+    partial_archive.replace(destination)
+    sidecar.unlink(missing_ok=True)
+    return destination
+
+
+@attrs.define
+class _Transfer:
+    """Download an archive, possibly from several mirrors in turn."""
+
+    archive: BinaryIO
+    partial: PartialDownload
+    sidecar: Path
+    stats: MirrorStats
+    on_progress: ProgressCallback | None = None
+    sha256: hashlib._Hash = attrs.field(factory=hashlib.sha256)
+    """Digest of the bytes written to the archive."""
+    received: int = 0
+    """Bytes received from the mirrors (including any discarded when restarting)."""
+
+    def download_from(self, url: str) -> None:
+        """Download from a single mirror, continuing a partial download if possible."""
+        offset = self.archive.tell()
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        start = time.perf_counter()
+        with default_transport().get(url, headers=headers, stream=True) as r:
+            if (
+                offset
+                and r.status_code == requests.codes.requested_range_not_satisfiable
+                and offset == self.partial.size
+            ):
+                # already downloaded, but not renamed
+                return
+            r.raise_for_status()
+            self.stats.record_latency(host(url), time.perf_counter() - start)
+
+            if offset and r.status_code == requests.codes.partial_content:
+                if not self.partial.matches(url, r):
+                    # mirror has a different file, so download all of it
+                    self._restart()
+                    r.close()
+                    self.download_from(url)
+                    return
+            elif offset:
+                # mirror ignored the range request, so start again
+                self._restart()
+                offset = 0
+
+            total = None
+            content_length = r.headers.get("content-length")
+            if content_length and not r.headers.get("content-encoding"):
+                total = offset + int(content_length)
+
+            if not offset:
+                self.partial.size = total
+                self.partial.etag = r.headers.get("etag")
+                self.partial.mirror = url
+                self.partial.save(self.sidecar)
+
+            downloaded = self._copy(r, offset, total)
+
+        if total is not None and downloaded != total:
+            raise requests.ConnectionError(
+                f"incomplete download ({downloaded} of {total} bytes)"
+            )
+        self.stats.record_throughput(
+            host(url), downloaded - offset, time.perf_counter() - start
+        )
+
+    def _restart(self) -> None:
+        self.archive.seek(0)
+        self.archive.truncate()
+        self.sha256 = hashlib.sha256()
+
+    def _copy(self, r: requests.Response, offset: int, total: int | None) -> int:
+        """Write the response to the archive, returning the total bytes downloaded."""
+        downloaded = offset
+        window_start, window_bytes = time.perf_counter(), 0
+        reported_at = 0.0
+        try:
+            for content in default_transport().iter_content(r, chunk_size=CHUNK_SIZE):
+                self.archive.write(content)
+                self.sha256.update(content)
+                self.received += len(content)
+                downloaded += len(content)
+                window_bytes += len(content)
+                now = time.perf_counter()
+                if self.on_progress and now - reported_at >= PROGRESS_INTERVAL:
+                    self.on_progress(downloaded, total)
+                    reported_at = now
+                if (elapsed := now - window_start) > STALL_WINDOW:
+                    if window_bytes < STALL_MIN_BYTES:
+                        raise MirrorStalledError(
+                            f"received {window_bytes} bytes in {elapsed:.0f} seconds"
+                        )
+                    window_start, window_bytes = now, 0
+        finally:
+            if self.on_progress:
+                self.on_progress(downloaded, total)
+        return downloaded
+
+
+class ArchiveStream(io.RawIOBase):
+    """Read an archive directly from the fastest mirror, without saving it.
+
+    If a mirror fails part way through,
+    reading continues from the next mirror that supports range requests
+    and has an archive of the same size.
+    The stream cannot be restarted, so a mirror that only returns the complete archive
+    is skipped once data has been read.
+
+    There is no stall detection, because reading is paced by the consumer,
+    but the read timeout still applies.
+    The SHA-256 digest of the bytes read is available as `sha256`,
+    and if an expected digest is given, reading the end of a stream that does not
+    match it raises an error.
+
+    """
+
+    def __init__(
+        self,
+        docset: DocSet,
+        stats: MirrorStats,
+        on_progress: ProgressCallback | None = None,
+        sha256: str | None = None,
+    ):
+        if not docset.urls:
+            raise ApplicationError(f"No download URLs for {docset.name}")
+        self.docset = docset
+        self.stats = stats
+        self.on_progress = on_progress
+        self.expected_sha256 = sha256
+        self._urls = iter(stats.rank(docset.urls))
+        self._partial = PartialDownload()
+        self._response: requests.Response | None = None
+        self._url = ""
+        self._chunks: Iterator[bytes] = iter(())
+        # unread part of the last chunk, as a view to avoid copying it for each read
+        self._buffer = memoryview(b"")
+        self._position = 0
+        self._reported_at = 0.0
+        self._errors: list[str] = []
+        self.sha256 = hashlib.sha256()
+
+    @property
+    def size(self) -> int | None:
+        """Size of the archive, if reported by the mirror it is read from."""
+        return self._partial.size
+
+    def readable(self) -> bool:
+        """Stream is always readable."""
+        return True
+
+    def connect(self) -> None:
+        """Connect to the fastest mirror before reading, to find the archive size."""
+        if self._response is None:
+            self._connect()
+
+    def readinto(self, buffer) -> int:
+        """Read the next bytes from the current mirror."""
+        while not self._buffer:
+            if self._response is None:
+                self._connect()
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                if self._partial.size is None or self._position >= self._partial.size:
+                    self._check_digest()
+                    return 0
+                self._fail("incomplete download")
+            except requests.RequestException as exc:
+                self._fail(str(exc))
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self.sha256.update(self._buffer[:size])
+        self._buffer = self._buffer[size:]
+        self._position += size
+        now = time.perf_counter()
+        if self.on_progress and (
+            now - self._reported_at >= PROGRESS_INTERVAL
+            or self._position == self._partial.size
+        ):
+            self.on_progress(self._position, self._partial.size)
+            self._reported_at = now
+        return size
+
+    def close(self) -> None:
+        """Close the connection to the current mirror."""
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        super().close()
+
+    def _connect(self) -> None:
+        """Connect to the next mirror, continuing from the current position."""
+        for url in self._urls:
+            headers = {"Range": f"bytes={self._position}-"} if self._position else {}
+            start = time.perf_counter()
+            try:
+                r = default_transport().get(url, headers=headers, stream=True)
+                r.raise_for_status()
+            except requests.RequestException as exc:
+                self.stats.record_failure(host(url))
+                self._errors.append(f"{host(url)}: {exc}")
+                continue
+            self.stats.record_latency(host(url), time.perf_counter() - start)
+
+            if self._position and not (
+                r.status_code == requests.codes.partial_content
+                and self._partial.matches(url, r)
+            ):
+                r.close()
+                self._errors.append(f"{host(url)}: cannot resume download")
+                continue
+            if not self._position:
+                content_length = r.headers.get("content-length")
+                if content_length and not r.headers.get("content-encoding"):
+                    self._partial.size = int(content_length)
+                self._partial.etag = r.headers.get("etag")
+                self._partial.mirror = url
+
+            self._response, self._url = r, url
+            self._chunks = default_transport().iter_content(r, chunk_size=CHUNK_SIZE)
+            return
+
+        raise ApplicationError(
+            f"Failed to download {self.docset.name} from any mirror "
+            f"({'; '.join(self._errors)})"
+        )
+
+    def _check_digest(self) -> None:
+        """Check the complete archive against the expected digest."""
+        digest = self.sha256.hexdigest()
+        if self.expected_sha256 is not None and digest != self.expected_sha256.lower():
+            raise ApplicationError(
+                f"Downloaded {self.docset.name} archive has SHA-256 {digest}, "
+                f"expected {self.expected_sha256}"
+            )
+
+    def _fail(self, error: str) -> None:
+        """Drop the current mirror after an error."""
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+        self.stats.record_failure(host(self._url))
+        self._errors.append(f"{host(self._url)}: {error}")
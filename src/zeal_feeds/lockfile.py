@@ -0,0 +1,125 @@
+"""Lockfiles listing a set of docsets, to install the same docsets on other machines.
+
+A lockfile is JSON, with the name, version, archive and download URLs of each docset,
+so it can be installed without loading the docset index,
+and the SHA-256 digest of the archive (when known) so the download can be verified.
+
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from collections.abc import Iterable
+from pathlib import Path, PurePosixPath
+from typing import Optional
+from urllib.parse import urlsplit
+
+import attrs
+
+from . import ApplicationError
+from .archive_cache import ArchiveCache
+from .user_contrib import DocSet, DocSetAuthor
+from .zeal import InstalledDocSet
+
+LOCKFILE_VERSION = 1
+
+
+@attrs.define
+class LockedDocSet:
+    """Docset entry in a lockfile."""
+
+    name: str
+    version: str
+    # *cattrs* evaluations this type hint, so we cannot use | when <= py3.10
+    archive: Optional[str] = None
+    """Archive name, which is needed (with `urls`) to install without the index."""
+    urls: list[str] = attrs.field(factory=list)
+    sha256: Optional[str] = None
+
+    @property
+    def resolved(self) -> bool:
+        """Whether the docset can be installed without looking it up in the index."""
+        return bool(self.archive and self.urls)
+
+    def to_docset(self) -> DocSet:
+        """Create the docset model to install (only if `resolved`)."""
+        return DocSet(
+            name=self.name,
+            author=DocSetAuthor(name="", link=""),
+            archive=self.archive or "",
+            version=self.version,
+            urls=self.urls,
+        )
+
+
+@attrs.define
+class Lockfile:
+    """Set of docsets to install."""
+
+    docsets: list[LockedDocSet] = attrs.field(factory=list)
+    version: int = LOCKFILE_VERSION
+
+    @classmethod
+    def load(cls, path: str) -> Lockfile:
+        """Load a lockfile, with a `path` of "-" reading standard input."""
+        from cattrs import BaseValidationError, Converter, transform_error
+
+        try:
+            text = sys.stdin.read() if path == "-" else Path(path).read_text()
+            lockfile = Converter().structure(json.loads(text), cls)
+        except OSError as exc:
+            raise ApplicationError(f"Failed to read lockfile: {exc}") from exc
+        except BaseValidationError as exc:
+            errors = "; ".join(transform_error(exc))
+            raise ApplicationError(f"Invalid lockfile {path}: {errors}") from exc
+        except (ValueError, TypeError, KeyError) as exc:
+            raise ApplicationError(f"Invalid lockfile {path}: {exc}") from exc
+        if lockfile.version > LOCKFILE_VERSION:
+            raise ApplicationError(
+                f"Lockfile {path} is version {lockfile.version}, "
+                f"this version of zeal-feeds supports version {LOCKFILE_VERSION}"
+            )
+        return lockfile
+
+    @classmethod
+    def from_installed(
+        cls, installed: Iterable[InstalledDocSet], cache: ArchiveCache | None = None
+    ) -> Lockfile:
+        """Create a lockfile for installed docsets.
+
+        The archive name is taken from the download URLs,
+        since Zeal's `meta.json` does not include it,
+        and the digest is included if the archive is in the `cache`.
+
+        """
+        docsets = []
+        for docset in sorted(installed, key=lambda docset: docset.name.lower()):
+            locked = LockedDocSet(
+                name=docset.name,
+                version=docset.version or "",
+                archive=_archive_name(docset.urls),
+                urls=docset.urls,
+            )
+            if cache and locked.resolved:
+                locked.sha256 = cache.digest(locked.to_docset())
+            docsets.append(locked)
+        return cls(docsets)
+
+    def dump(self) -> str:
+        """Get the lockfile as JSON."""
+        from cattrs import Converter
+
+        return json.dumps(Converter().unstructure(self), indent=2) + "\n"
+
+    def unique(self) -> list[LockedDocSet]:
+        """Get the docsets without duplicate names (later entries take precedence)."""
+        docsets = {docset.name.lower(): docset for docset in self.docsets}
+        return list(docsets.values())
+
+
+def _archive_name(urls: list[str]) -> str | None:
+    """Get the archive name from the first download URL."""
+    if not urls:
+        return None
+    return PurePosixPath(urlsplit(urls[0]).path).name or None
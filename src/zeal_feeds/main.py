@@ -2,21 +2,32 @@
 
 This module handles modules parsing and end-user interaction.
 
+Modules that are only needed by some sub-commands (downloading, extracting,
+progress bars) are imported by those sub-commands, to keep start up fast.
+
 """
 
 from __future__ import annotations
 
 import argparse
-import random
+import contextlib
+import json
+import sys
+import time
+from collections.abc import Iterable, Sequence
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import requests
-from platformdirs import user_runtime_path
-from rich.progress import Progress
+import attrs
 
-from zeal_feeds import ApplicationError, user_contrib
+from zeal_feeds import ApplicationError, archive_cache, timings, user_contrib
 from zeal_feeds.console import console
-from zeal_feeds.zeal import Zeal
+
+if TYPE_CHECKING:
+    from rich.progress import Progress, TaskID
+
+    from zeal_feeds import api
+    from zeal_feeds.zeal import Zeal
 
 
 def main():
@@ -27,116 +38,681 @@ def main():
     subparsers = parser.add_subparsers()
 
     install_parser = subparsers.add_parser("install", help="install docsets")
-    install_parser.add_argument("docset", metavar="DOCSET", nargs="+")
-    install_parser.add_argument("--url", default=user_contrib.USER_DOCSET_API)
-    install_parser.add_argument("--config", help="Specify path to Zeal.conf file")
+    install_parser.add_argument("docset", metavar="DOCSET", nargs="*")
+    install_parser.add_argument(
+        "--from-file",
+        metavar="FILE",
+        help="Install the docsets in a lockfile (from `export`), - for standard input",
+    )
+    install_parser.add_argument(
+        "--config",
+        action="append",
+        help="Specify path to Zeal.conf file, "
+        "repeat to install into several Zeal profiles",
+    )
     install_parser.add_argument(
+        "--docset-path",
+        action="append",
+        metavar="PATH",
+        help="Install into this docset folder (instead of Zeal's configured folder), "
+        "can be repeated and combined with --config",
+    )
+    _add_index_arguments(install_parser)
+    _add_timings_argument(install_parser)
+    install_mode = _add_install_arguments(install_parser)
+    install_mode.add_argument(
         "--dry-run",
         action="store_true",
         help="Downloads the docsets but does not install",
     )
     install_parser.set_defaults(func=install)
 
+    update_parser = subparsers.add_parser("update", help="update installed docsets")
+    update_parser.add_argument("--config", help="Specify path to Zeal.conf file")
+    _add_index_arguments(update_parser)
+    _add_timings_argument(update_parser)
+    update_mode = _add_install_arguments(update_parser)
+    update_mode.add_argument(
+        "--check",
+        action="store_true",
+        help="List the docsets with updates, without installing them",
+    )
+    update_parser.set_defaults(func=update)
+
+    export_parser = subparsers.add_parser(
+        "export", help="write the installed docsets to a lockfile"
+    )
+    export_parser.add_argument(
+        "file", metavar="FILE", help="Lockfile to write, - for standard output"
+    )
+    export_parser.add_argument("--config", help="Specify path to Zeal.conf file")
+    export_parser.set_defaults(func=export)
+
+    _add_cache_parser(subparsers)
+
     search_parser = subparsers.add_parser("search", help="search available docsets")
     search_parser.add_argument("text", metavar="TEXT")
-    search_parser.add_argument("--url", default=user_contrib.USER_DOCSET_API)
+    search_parser.add_argument(
+        "--limit",
+        type=_positive_int,
+        metavar="N",
+        help="Only show the N best matches",
+    )
+    _add_index_arguments(search_parser)
+    _add_timings_argument(search_parser)
     search_parser.set_defaults(func=search)
 
+    _add_query_parser(subparsers)
+    _add_serve_parser(subparsers)
+
     args = parser.parse_args()
     if not hasattr(args, "func"):
         parser.print_help()
         return 1
+    if getattr(args, "limit_rate", None):
+        from zeal_feeds.transport import default_transport
+
+        default_transport().bandwidth_limit = args.limit_rate * 1024
+    recorder = timings.enable() if getattr(args, "timings", None) else None
 
     try:
         return args.func(args)
     except ApplicationError as exc:
         return str(exc)
+    finally:
+        if recorder:
+            _print_timings(recorder, args.timings)
+
+
+def _add_cache_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the `cache` sub-command, which has its own sub-commands."""
+    cache_parser = subparsers.add_parser("cache", help="manage downloaded archives")
+    cache_parser.set_defaults(func=cache_list)
+    cache_subparsers = cache_parser.add_subparsers()
+    cache_list_parser = cache_subparsers.add_parser("list", help="list cached archives")
+    cache_list_parser.set_defaults(func=cache_list)
+    cache_prune_parser = cache_subparsers.add_parser(
+        "prune", help="remove least recently used archives over the size cap"
+    )
+    _add_cache_size_argument(cache_prune_parser)
+    cache_prune_parser.set_defaults(func=cache_prune)
+    cache_clear_parser = cache_subparsers.add_parser(
+        "clear", help="remove all cached archives"
+    )
+    cache_clear_parser.set_defaults(func=cache_clear)
+
+
+def _add_query_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the `query` sub-command."""
+    query_parser = subparsers.add_parser(
+        "query", help="search the symbols in the installed docsets"
+    )
+    query_parser.add_argument("text", metavar="TEXT")
+    query_parser.add_argument("--config", help="Specify path to Zeal.conf file")
+    query_parser.add_argument(
+        "--limit",
+        type=_positive_int,
+        default=20,
+        metavar="N",
+        help="Show the N best matches (default: %(default)s)",
+    )
+    query_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=_positive_int,
+        default=4,
+        metavar="N",
+        help="Number of docset indexes to read at once (default: %(default)s)",
+    )
+    query_parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Search each docset's index, instead of the combined symbol index",
+    )
+    _add_timings_argument(query_parser)
+    query_parser.set_defaults(func=query)
+
+
+def _add_serve_parser(subparsers: argparse._SubParsersAction) -> None:
+    """Add the `serve` sub-command."""
+    serve_parser = subparsers.add_parser(
+        "serve", help="serve the index and archives to other machines"
+    )
+    serve_parser.add_argument(
+        "--host",
+        default="0.0.0.0",
+        help="Address to listen on (default: %(default)s)",
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=_positive_int,
+        default=8_080,
+        help="Port to listen on (default: %(default)s)",
+    )
+    _add_index_arguments(serve_parser)
+    _add_cache_size_argument(serve_parser)
+    _add_limit_rate_argument(serve_parser)
+    serve_parser.set_defaults(func=serve)
+
+
+def _add_index_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options for loading the docset index to a sub-command."""
+    parser.add_argument("--url", default=user_contrib.USER_DOCSET_API)
+    parser.add_argument(
+        "--index-ttl",
+        type=int,
+        default=user_contrib.CACHE_TTL,
+        metavar="SECONDS",
+        help="Use the cached index for this long before checking for updates "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stale-while-revalidate",
+        action="store_true",
+        help="Use an out of date cached index, and refresh it in the background",
+    )
+
+
+def _add_install_arguments(
+    parser: argparse.ArgumentParser,
+) -> argparse._MutuallyExclusiveGroup:
+    """Add the options for installing docsets to a sub-command.
+
+    Returns a group for options that cannot be combined with `--stream`.
+
+    """
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=_positive_int,
+        default=4,
+        metavar="N",
+        help="Number of docsets to download and install at once (default: %(default)s)",
+    )
+    _add_cache_size_argument(parser)
+    _add_limit_rate_argument(parser)
+    install_mode = parser.add_mutually_exclusive_group()
+    install_mode.add_argument(
+        "--stream",
+        action="store_true",
+        help="Extract the docsets while downloading, without saving the archives",
+    )
+    return install_mode
+
+
+def _add_cache_size_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=archive_cache.DEFAULT_MAX_SIZE // 1_048_576,
+        metavar="MIB",
+        help="Size cap for the cache of downloaded archives, in MiB "
+        "(default: %(default)s, 0 disables the cache)",
+    )
+
+
+def _add_timings_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="table",
+        choices=["table", "json"],
+        help="Show how long each phase took, as a table (default) "
+        "or JSON (on standard error)",
+    )
+
+
+def _add_limit_rate_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--limit-rate",
+        type=_positive_int,
+        metavar="KIB",
+        help="Limit the total download speed, in KiB per second",
+    )
 
 
 def search(args) -> str | None:
     """Search for matching docsets."""
-    docset_data = _load_docset_index(args.url)
-    fallback = False
-
-    search_text = args.text
+    docset_data = _load_docset_index(args)
 
-    matches = sorted(docset_data.search(search_text))
-    if not matches:
-        matches = sorted(docset_data.fallback_search(search_text))
-        fallback = True
-    if not matches:
+    with timings.phase("search"):
+        results = docset_data.ranked_search(args.text, limit=args.limit)
+    if not results:
         return "No matching docsets found"
 
-    if fallback:
+    if results[0].rank is user_contrib.MatchRank.FUZZY:
         console.print("No exact matches, did you mean:")
     else:
         console.print("Matching docsets:")
-    for docset in matches:
-        console.print(docset.name)
+    for result in results:
+        console.print(result.docset.name)
     return None
 
 
-def install(args) -> str | None:
-    """Install the specified DocSets."""
+def query(args) -> str | None:
+    """Search for symbols in the installed docsets."""
+    from zeal_feeds import symbols
+    from zeal_feeds.zeal import Zeal
+
     zeal = Zeal.load_config(args.config) if args.config else Zeal.find_config()
+    search = symbols.search_docsets if args.no_index else symbols.query
+    results = search(
+        zeal.docset_path, zeal.installed_metadata(), args.text, args.limit, args.jobs
+    )
+    if not results:
+        return "No matching symbols found"
+
+    from rich.table import Table
+
+    table = Table("Symbol", "Type", "Docset", "Path")
+    for symbol in results:
+        table.add_row(symbol.name, symbol.type, symbol.docset, symbol.path)
+    console.print(table)
+    return None
+
+
+def install(args) -> str | None:
+    """Install the specified DocSets, and those in the lockfile."""
+    if not args.docset and not args.from_file:
+        return "Specify the docsets to install, or a lockfile with --from-file"
+
+    zeals = _install_targets(args)
+
+    pending_docsets, locked_versions, digests = _locked_docsets(args, zeals)
+    docset_names = [*args.docset, *locked_versions]
+    if docset_names:
+        docset_data = _load_docset_index(args)
+        found_docsets = {name: docset_data.get(name) for name in docset_names}
+        missing_docsets = [
+            name for name, docset in found_docsets.items() if docset is None
+        ]
+        if missing_docsets:
+            return f"Failed to find the following docsets: {', '.join(missing_docsets)}"
+        if mismatched := _mismatched_versions(locked_versions, found_docsets):
+            return (
+                "The index has other versions of the following locked docsets: "
+                f"{', '.join(mismatched)}"
+            )
+        # only skip docsets that are installed in every docset folder
+        installed_docsets = set.intersection(
+            *(set(zeal.installed_docsets()) for zeal in zeals)
+        )
+        for name, docset in found_docsets.items():
+            if docset is None:
+                continue
+            # outdated docsets from the lockfile are installed over the old version
+            if docset.name in installed_docsets and name not in locked_versions:
+                console.print(f"Skipping {docset.name!r}, already installed")
+                continue
+            pending_docsets[docset.name] = docset
+
+    failures = _install_docsets(
+        zeals,
+        pending_docsets.values(),
+        jobs=args.jobs,
+        cache_size=args.cache_size,
+        digests=digests,
+        dry_run=args.dry_run,
+        stream=args.stream,
+        # only docsets from a lockfile are installed over an older version
+        replace=bool(args.from_file),
+    )
+    return _report_failures(failures, "install")
+
 
-    docset_data = _load_docset_index(args.url)
-
-    docset_names = args.docset
-    found_docsets = {name: docset_data.get(name) for name in docset_names}
-    missing_docsets = [name for name, docset in found_docsets.items() if docset is None]
-    if missing_docsets:
-        return f"Failed to find the following docsets: {', '.join(missing_docsets)}"
-
-    installed_docsets = set(zeal.installed_docsets())
-    for docset in found_docsets.values():
-        if docset is None:
-            continue
-        if docset.name in installed_docsets:
-            console.print(f"Skipping {docset.name!r}, already installed")
-            continue
-        archive = _download_archive(docset)
-        if args.dry_run:
-            console.print(f"Skipping {docset.name!r} due to --dry-run")
+def _install_targets(args) -> list[Zeal]:
+    """Get the docset folders to install to, from `--config` and `--docset-path`."""
+    from zeal_feeds.zeal import Zeal
+
+    zeals = [Zeal.load_config(config) for config in args.config or ()]
+    for docset_path in args.docset_path or ():
+        path = Path(docset_path)
+        path.mkdir(exist_ok=True, parents=True)
+        zeals.append(Zeal(path))
+    if not zeals:
+        return [Zeal.find_config()]
+    # the same folder could be given by more than one option
+    unique = {zeal.docset_path.resolve(): zeal for zeal in reversed(zeals)}
+    return list(reversed(unique.values()))
+
+
+def _locked_docsets(
+    args, zeals: list[Zeal]
+) -> tuple[dict[str, user_contrib.DocSet], dict[str, str], dict[str, str]]:
+    """Get the docsets to install from the lockfile, if there is one.
+
+    Returns the docsets that can be installed without the index,
+    the locked versions of docsets that need to be looked up in the index,
+    and the expected archive digests.
+    Docsets without a digest are looked up in the index, even if they have URLs,
+    since the digest is the only other way to check the downloaded version.
+    Docsets that are installed with the locked version (in every folder) are skipped.
+
+    """
+    from zeal_feeds.lockfile import Lockfile
+
+    locked_versions: dict[str, str] = {}
+    if not args.from_file:
+        return {}, locked_versions, {}
+
+    installed_versions = [
+        {docset.name.lower(): docset.version for docset in zeal.installed_metadata()}
+        for zeal in zeals
+    ]
+    pending_docsets = {}
+    digests = {}
+    for locked in Lockfile.load(args.from_file).unique():
+        if all(
+            versions.get(locked.name.lower()) == locked.version
+            for versions in installed_versions
+        ):
+            console.print(
+                f"Skipping {locked.name!r}, {locked.version} already installed",
+                highlight=False,
+            )
+        elif locked.resolved and locked.sha256:
+            pending_docsets[locked.name] = locked.to_docset()
+            digests[locked.name] = locked.sha256
         else:
-            with console.status(f"Installing {docset.name}"):
-                zeal.install_docset(docset, archive)
+            locked_versions[locked.name] = locked.version
+    return pending_docsets, locked_versions, digests
+
+
+def _mismatched_versions(
+    locked_versions: dict[str, str],
+    docsets: dict[str, user_contrib.DocSet | None],
+) -> list[str]:
+    """Describe the locked docsets that have another version in the index."""
+    mismatched = []
+    for name, version in locked_versions.items():
+        docset = docsets[name]
+        if docset is not None and docset.version != version:
+            mismatched.append(f"{name} ({version} locked, {docset.version} in index)")
+    return mismatched
+
+
+def update(args) -> str | None:
+    """Update installed DocSets that have a new version in the index."""
+    from zeal_feeds import api
+    from zeal_feeds.zeal import Zeal
+
+    zeal = Zeal.load_config(args.config) if args.config else Zeal.find_config()
 
-        archive.unlink()
+    docset_data = _load_docset_index(args)
+
+    updates = api.outdated(zeal, docset_data)
+    for outdated in updates:
+        console.print(
+            f"{outdated.docset.name}: {outdated.installed.version} "
+            f"-> {outdated.docset.version}",
+            highlight=False,
+        )
+
+    if not updates:
+        console.print("All docsets are up to date")
+        return None
+    if args.check:
+        return None
+
+    failures = _install_docsets(
+        zeal,
+        [outdated.docset for outdated in updates],
+        jobs=args.jobs,
+        cache_size=args.cache_size,
+        stream=args.stream,
+        replace=True,
+    )
+    return _report_failures(failures, "update")
+
+
+def export(args) -> str | None:
+    """Write the installed docsets to a lockfile."""
+    from zeal_feeds.lockfile import Lockfile
+    from zeal_feeds.zeal import FEED_URL, Zeal
+
+    to_stdout = args.file == "-"
+    stdout = sys.stdout
+    with contextlib.ExitStack() as stack:
+        if to_stdout:
+            # the lockfile is written to standard output, so messages go to stderr
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        zeal = Zeal.load_config(args.config) if args.config else Zeal.find_config()
+
+        installed_docsets = []
+        for installed in zeal.installed_metadata():
+            if installed.feed_url != FEED_URL.format(name=installed.name):
+                console.print(
+                    f"Skipping {installed.name!r}, not a user contributed docset"
+                )
+                continue
+            installed_docsets.append(installed)
+
+    lockfile = Lockfile.from_installed(
+        installed_docsets, archive_cache.ArchiveCache.default()
+    )
+    if to_stdout:
+        stdout.write(lockfile.dump())
+        return None
+    try:
+        Path(args.file).write_text(lockfile.dump())
+    except OSError as exc:
+        return f"Failed to write lockfile: {exc}"
+    console.print(f"Exported {len(lockfile.docsets)} docsets to {args.file}")
+    return None
 
+
+def cache_list(args) -> str | None:
+    """List the archives in the download cache."""
+    cache = archive_cache.ArchiveCache.default()
+    entries = cache.entries()
+    if not entries:
+        console.print("No cached archives")
+        return None
+    from rich.table import Table
+
+    table = Table("Docset", "Version", "Archive", "Size", "Last Used")
+    for entry in entries:
+        table.add_row(
+            entry.name,
+            entry.version,
+            entry.archive,
+            archive_cache.format_size(entry.size),
+            time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.last_used)),
+        )
+    console.print(table)
+    total_size = sum(entry.size for entry in entries)
+    console.print(f"Total: {archive_cache.format_size(total_size)}")
     return None
 
 
-def _load_docset_index(url: str) -> user_contrib.DocSetCollection:
-    """Load the docset index, with a spinner."""
-    if docsets := user_contrib.load_cached_index():
-        # should I use Rich for "normal" output?
-        console.print("Using cached index of user contributed docsets")
-        return docsets
-    with console.status("Loading index of user contributed docsets"):
-        return user_contrib.user_contrib_index(url)
+def cache_prune(args) -> str | None:
+    """Remove the least recently used archives that are over the cache size cap."""
+    cache = archive_cache.ArchiveCache.default(args.cache_size * 1_048_576)
+    _print_removed(cache.prune())
+    return None
 
 
-def _download_archive(docset: user_contrib.DocSet) -> Path:
-    """Download the docset archive, from a random mirror, with progress bar.
+def cache_clear(args) -> str | None:
+    """Remove all archives from the download cache."""
+    _print_removed(archive_cache.ArchiveCache.default().clear())
+    return None
+
+
+def serve(args) -> str | None:
+    """Serve the docset index and archives, as a caching proxy."""
+    from zeal_feeds.mirrors import MirrorStats
+    from zeal_feeds.serve import INDEX_PATH, DocsetProxy, DocsetServer
+
+    proxy = DocsetProxy(
+        upstream_url=args.url,
+        index_ttl=args.index_ttl,
+        cache=archive_cache.ArchiveCache.default(args.cache_size * 1_048_576),
+        mirror_stats=MirrorStats.load(),
+    )
+    try:
+        server = DocsetServer((args.host, args.port), proxy)
+    except OSError as exc:
+        return f"Failed to listen on {args.host}:{args.port}: {exc}"
+    with server, contextlib.suppress(KeyboardInterrupt):
+        port = server.server_address[1]
+        console.print(
+            f"Serving docsets on http://{args.host}:{port}, "
+            f"use --url http://<this machine>:{port}{INDEX_PATH}",
+            highlight=False,
+        )
+        server.serve_forever()
+    return None
 
-    According to *zeal-user-contrib*, the random URL is what *Zeal* does.
+
+def _print_timings(recorder: timings.Recorder, output_format: str) -> None:
+    """Print the recorded phases, and the total for each phase.
+
+    JSON is printed to standard error, so it can be separated from the normal output.
+
+    """
+    if output_format == "json":
+        # plain print, so the JSON is not wrapped or highlighted
+        print(json.dumps(recorder.report(), indent=2), file=sys.stderr)
+        return
+
+    from rich.table import Table
+
+    table = Table("Phase", "Docset", "Time", "Size", "Files", "Throughput")
+    for phases in (recorder.phases, recorder.summary()):
+        for phase in phases:
+            throughput = phase.throughput
+            table.add_row(
+                phase.name,
+                phase.docset or ("" if phases is recorder.phases else "(total)"),
+                f"{phase.seconds:.3f} s",
+                "" if phase.bytes is None else archive_cache.format_size(phase.bytes),
+                "" if phase.files is None else str(phase.files),
+                ""
+                if throughput is None
+                else f"{archive_cache.format_size(throughput)}/s",
+            )
+        table.add_section()
+    console.print(table)
+
+
+def _print_removed(removed: list[archive_cache.CachedArchive]) -> None:
+    for entry in removed:
+        console.print(f"Removed {entry.name} ({entry.version})", highlight=False)
+    removed_size = archive_cache.format_size(sum(entry.size for entry in removed))
+    console.print(f"Removed {len(removed)} archives ({removed_size})")
+
+
+def _report_failures(failures: dict[str, str], action: str) -> str | None:
+    """Print the docsets that failed, returning an error message if any failed."""
+    if not failures:
+        return None
+    for name, error in failures.items():
+        console.print(f"Failed to {action} {name!r}: {error}", style="red")
+    return f"Failed to {action} the following docsets: {', '.join(failures)}"
+
+
+def _install_docsets(
+    zeal: Zeal | Sequence[Zeal],
+    docsets: Iterable[user_contrib.DocSet],
+    *,
+    jobs: int,
+    cache_size: int = archive_cache.DEFAULT_MAX_SIZE // 1_048_576,
+    digests: dict[str, str] | None = None,
+    **options: bool,
+) -> dict[str, str]:
+    """Download and install docsets (see `api.install`), with progress bars.
+
+    The `cache_size` is in MiB, and the `options` are passed to `api.InstallOptions`.
 
     """
-    archive_url = random.choice(docset.urls)
-    archive_destination = user_runtime_path("zeal-feeds") / docset.archive
-    archive_destination.parent.mkdir(exist_ok=True, parents=True)
-
-    with (
-        requests.get(archive_url, stream=True) as r,
-        Progress() as progress,
-        archive_destination.open("wb") as archive,
-    ):
-        file_size = int(r.headers["content-length"])
-        download_task = progress.add_task(f"Downloading {docset.name}", total=file_size)
-
-        for content in r.iter_content(chunk_size=512):
-            archive.write(content)
-            progress.update(download_task, advance=len(content))
-
-    return archive_destination
+    import asyncio
+
+    from rich.progress import Progress
+
+    from zeal_feeds import api
+
+    install_options = api.InstallOptions(
+        jobs=jobs, cache_size=cache_size * 1_048_576, **options
+    )
+    with Progress(console=console) as progress:
+        return asyncio.run(
+            api.install(
+                zeal,
+                docsets,
+                install_options,
+                digests=digests,
+                on_event=_ProgressDisplay(progress).on_event,
+            )
+        )
+
+
+@attrs.define
+class _ProgressDisplay:
+    """Show the install events as progress bars, one for each docset."""
+
+    progress: Progress
+    _tasks: dict[str, TaskID] = attrs.field(factory=dict)
+
+    def on_event(self, event: api.Event) -> None:
+        """Add or update the docset's progress bar."""
+        from zeal_feeds.api import Stage
+
+        name = event.docset or ""
+        if event.stage is Stage.CORRUPT:
+            self.progress.console.print(
+                f"Cached archive for {name!r} is corrupt, downloading again"
+            )
+        elif event.stage is Stage.DOWNLOADED:
+            self.progress.console.print(f"Skipping {name!r} due to --dry-run")
+        elif event.stage is Stage.RENAMED:
+            self.progress.console.print(
+                f"Fixing folder name for {name!r}: {name}.docset"
+            )
+        elif name not in self._tasks:
+            description = {
+                Stage.CACHED: f"Using cached {name}",
+                Stage.DOWNLOADING: f"Downloading {name}",
+            }.get(event.stage, f"Installing {name}")
+            completed = 1 if event.stage is Stage.CACHED else 0
+            total = 1 if event.stage is Stage.CACHED else None
+            self._tasks[name] = self.progress.add_task(
+                description, total=total, completed=completed
+            )
+        elif event.completed is not None:
+            self.progress.update(
+                self._tasks[name], completed=event.completed, total=event.total
+            )
+        elif event.stage is Stage.INSTALLING:
+            self.progress.update(self._tasks[name], description=f"Installing {name}")
+        elif event.stage is Stage.INSTALLED:
+            self.progress.update(self._tasks[name], description=f"Installed {name}")
+
+
+def _load_docset_index(args) -> user_contrib.DocSetCollection:
+    """Load the docset index (see `api.IndexOptions`), with a spinner."""
+    from zeal_feeds.api import IndexOptions, Stage
+
+    status = contextlib.ExitStack()
+
+    def on_event(event: api.Event) -> None:
+        if event.stage is Stage.CACHED_INDEX:
+            # should I use Rich for "normal" output?
+            console.print("Using cached index of user contributed docsets")
+        elif event.stage is Stage.STALE_INDEX:
+            console.print("Using cached index of user contributed docsets, refreshing")
+        else:
+            status.enter_context(
+                console.status("Loading index of user contributed docsets")
+            )
+
+    options = IndexOptions(args.url, args.index_ttl, args.stale_while_revalidate)
+    with status:
+        return options.load(on_event)
+
+
+def _positive_int(value: str) -> int:
+    """Argument type for options that require a positive integer."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value!r}")
+    return number
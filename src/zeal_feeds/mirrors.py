@@ -0,0 +1,187 @@
+"""Select the fastest mirror for downloading docset archives.
+
+Latency and throughput are tracked per host and saved in the application data folder,
+so that later runs can rank mirrors without probing all of them again.
+
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+import attrs
+import requests
+from cattrs import Converter
+from platformdirs import user_data_path
+
+from . import APP_NAME
+from .transport import default_transport
+
+_STATS_FILENAME = "mirrors.json"
+
+PROBE_TIMEOUT = 5
+"""Seconds to wait for a mirror to respond to a probe."""
+
+PROBE_TTL = 3_600
+"""Seconds before a host's latency is considered out of date and probed again."""
+
+_SMOOTHING = 0.3
+"""Weight of a new measurement in the exponential moving averages."""
+
+_FAILURE_PENALTY = 30.0
+"""Seconds added to a host's estimated download time for each recent failure."""
+
+_TYPICAL_SIZE = 5_000_000
+"""Archive size (in bytes) assumed when ranking mirrors without probing them."""
+
+
+@attrs.define
+class HostStats:
+    """Latency and throughput history for a mirror host."""
+
+    # *cattrs* evaluations this type hint, so we cannot use | when <= py3.10
+    latency: Optional[float] = None
+    """Response time (in seconds), as a moving average."""
+    throughput: Optional[float] = None
+    """Download speed (in bytes per second), as a moving average."""
+    failures: int = 0
+    """Number of consecutive failed requests."""
+    probed_at: float = 0.0
+
+    def estimate(self, size: int, default_throughput: float | None = None) -> float:
+        """Estimate the seconds needed to download a file from this host.
+
+        Hosts that have not been downloaded from are assumed to have the
+        `default_throughput`, so that they are not ranked on latency alone.
+
+        """
+        seconds = self.latency if self.latency is not None else PROBE_TIMEOUT
+        if throughput := self.throughput or default_throughput:
+            seconds += size / throughput
+        return seconds + self.failures * _FAILURE_PENALTY
+
+
+class MirrorStats:
+    """Collection of mirror statistics, keyed by host.
+
+    Methods are safe to call from multiple download threads.
+
+    """
+
+    def __init__(
+        self, hosts: dict[str, HostStats] | None = None, path: Path | None = None
+    ):
+        self.path = path
+        self._hosts = hosts or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path | None = None) -> MirrorStats:
+        """Load the saved statistics, ignoring a missing or corrupt file."""
+        path = path or user_data_path(APP_NAME) / _STATS_FILENAME
+        try:
+            raw_stats = json.loads(path.read_text())
+            hosts = Converter().structure(raw_stats, dict[str, HostStats])
+        except (OSError, ValueError, TypeError, KeyError):
+            hosts = {}
+        return cls(hosts, path)
+
+    def save(self) -> None:
+        """Save the statistics, if loaded from a file."""
+        if self.path is None:
+            return
+        with self._lock:
+            raw_stats = Converter().unstructure(self._hosts)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.path.write_text(json.dumps(raw_stats, indent=2))
+
+    def __getitem__(self, host: str) -> HostStats:
+        with self._lock:
+            return self._hosts.setdefault(host, HostStats())
+
+    def record_latency(self, host: str, seconds: float) -> None:
+        """Record a successful response time for a host."""
+        stats = self[host]
+        with self._lock:
+            stats.latency = _moving_average(stats.latency, seconds)
+            stats.probed_at = time.time()
+            stats.failures = 0
+
+    def record_throughput(self, host: str, size: int, seconds: float) -> None:
+        """Record a completed download from a host."""
+        if seconds <= 0:
+            return
+        stats = self[host]
+        with self._lock:
+            stats.throughput = _moving_average(stats.throughput, size / seconds)
+            stats.failures = 0
+
+    def record_failure(self, host: str) -> None:
+        """Record a failed probe or download for a host."""
+        stats = self[host]
+        with self._lock:
+            stats.failures += 1
+            stats.probed_at = time.time()
+
+    def rank(self, urls: Iterable[str]) -> list[str]:
+        """Order mirror URLs from fastest to slowest.
+
+        Hosts without recent measurements are probed in parallel first.
+        Hosts without a throughput measurement are assumed to have the median
+        throughput of the hosts that have one.
+
+        """
+        urls = list(urls)
+        now = time.time()
+        stale_urls = [
+            url for url in urls if now - self[host(url)].probed_at > PROBE_TTL
+        ]
+        sizes: dict[str, int | None] = {}
+        if stale_urls:
+            with ThreadPoolExecutor(max_workers=len(stale_urls)) as executor:
+                sizes = dict(zip(stale_urls, executor.map(self.probe, stale_urls)))
+        size = next((size for size in sizes.values() if size), _TYPICAL_SIZE)
+        with self._lock:
+            throughputs = [
+                stats.throughput for stats in self._hosts.values() if stats.throughput
+            ]
+        throughput = statistics.median(throughputs) if throughputs else None
+        return sorted(urls, key=lambda url: self[host(url)].estimate(size, throughput))
+
+    def probe(self, url: str) -> int | None:
+        """Measure how long a mirror takes to respond to a HEAD request.
+
+        Returns the size of the file (if reported by the mirror).
+
+        """
+        start = time.perf_counter()
+        try:
+            r = default_transport().head(
+                url, allow_redirects=True, timeout=PROBE_TIMEOUT
+            )
+            r.raise_for_status()
+        except requests.RequestException:
+            self.record_failure(host(url))
+            return None
+        self.record_latency(host(url), time.perf_counter() - start)
+        content_length = r.headers.get("content-length")
+        return int(content_length) if content_length else None
+
+
+def host(url: str) -> str:
+    """Get the host name of a mirror URL."""
+    return urlsplit(url).netloc
+
+
+def _moving_average(average: float | None, value: float) -> float:
+    if average is None:
+        return value
+    return (1 - _SMOOTHING) * average + _SMOOTHING * value
@@ -0,0 +1,454 @@
+"""Serve the docset index and archives to other machines, as a caching proxy.
+
+The index is served with the archive URLs rewritten to point at this server,
+and archives are streamed from the upstream mirrors the first time they are requested,
+while they are added to the cache.
+Both support conditional requests, and cached archives support range requests.
+
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from collections.abc import Callable
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import quote, unquote, urlsplit
+
+import attrs
+from platformdirs import user_cache_path, user_data_path
+
+from . import APP_NAME, ApplicationError, download, user_contrib
+from .archive_cache import ArchiveCache, digest_path
+from .console import console
+from .mirrors import MirrorStats
+
+INDEX_PATH = "/api/docsets"
+ARCHIVE_PATH = "/archives/"
+
+_CHUNK_SIZE = 1_048_576
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+@attrs.define
+class Resource:
+    """Response body, either in memory or an open file, with its validators.
+
+    Archives streamed from upstream are not seekable, and their size may be unknown.
+    The content is `None` when only the headers are available.
+
+    """
+
+    content: bytes | BinaryIO | io.RawIOBase | None
+    size: int | None
+    etag: str
+    content_type: str
+    last_modified: float | None = None
+
+    def close(self) -> None:
+        """Close the file, if the content is read from one."""
+        if not isinstance(self.content, (bytes, type(None))):
+            self.content.close()
+
+    def seekable(self) -> bool:
+        """Check whether ranges of the content can be sent."""
+        if self.content is None or self.size is None:
+            return False
+        return isinstance(self.content, bytes) or self.content.seekable()
+
+
+@attrs.define
+class DocsetProxy:
+    """Index and archives shared by the request handlers.
+
+    The index is cached in its own folder, separate from the index used by
+    the other commands, which could be loaded from this server.
+
+    """
+
+    upstream_url: str
+    index_ttl: float
+    cache: ArchiveCache
+    mirror_stats: MirrorStats
+    index_folder: Path = attrs.field(factory=lambda: user_data_path(APP_NAME) / "serve")
+    _docsets: user_contrib.DocSetCollection | None = None
+    _index_body: dict[tuple[int, str], Resource] = attrs.field(factory=dict)
+    _index_lock: threading.Lock = attrs.field(factory=threading.Lock)
+    _archive_locks: dict[str, threading.Lock] = attrs.field(factory=dict)
+
+    def docsets(self) -> user_contrib.DocSetCollection:
+        """Get the docset index, refreshing it from upstream when it is out of date."""
+        with self._index_lock:
+            if (
+                self._docsets is None
+                or user_contrib.cache_age(self.index_folder) > self.index_ttl
+            ):
+                self._docsets = user_contrib.load_cached_index(
+                    self.index_ttl,
+                    url=self.upstream_url,
+                    cache_folder=self.index_folder,
+                )
+                if self._docsets is None:
+                    self._docsets = user_contrib.user_contrib_index(
+                        self.upstream_url, cache_folder=self.index_folder
+                    )
+            return self._docsets
+
+    def index(self, base_url: str) -> Resource:
+        """Get the index JSON, with archive URLs pointing to `base_url`."""
+        self.docsets()
+        cached_index = user_contrib.cached_index_file(self.index_folder)
+        index_stat = cached_index.stat()
+        key = (index_stat.st_mtime_ns, base_url)
+        with self._index_lock:
+            if key not in self._index_body:
+                index_json = json.loads(cached_index.read_text())
+                for docset in index_json:
+                    docset["urls"] = [_archive_url(base_url, docset)]
+                body = json.dumps(index_json).encode()
+                self._index_body = {
+                    key: Resource(
+                        content=body,
+                        size=len(body),
+                        etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                        content_type="application/json",
+                        last_modified=index_stat.st_mtime,
+                    )
+                }
+            return self._index_body[key]
+
+    def archive(self, name: str, archive: str, headers_only: bool = False) -> Resource:
+        """Get a docset archive, from the cache or streamed from upstream.
+
+        A cached archive is opened before the cache is pruned,
+        so it can still be sent if another request removes it from the cache.
+        For `headers_only` (HEAD) requests, an archive that is not cached
+        is not downloaded, only its size is requested from upstream.
+
+        """
+        docset = self.docsets().get(name)
+        if docset is None or docset.archive != archive:
+            raise FileNotFoundError(f"{name}/{archive}")
+
+        archive_file = self._open_cached(docset)
+        if archive_file is not None:
+            size = os.fstat(archive_file.fileno()).st_size
+            return self._archive_resource(docset, archive_file, size)
+        if headers_only:
+            return self._archive_resource(docset, None, self._upstream_size(docset))
+        return self._stream_archive(docset)
+
+    def _open_cached(self, docset: user_contrib.DocSet) -> BinaryIO | None:
+        """Open the cached archive, if there is one."""
+        archive_path = self.cache.get(docset)
+        if archive_path is None:
+            return None
+        try:
+            return archive_path.open("rb")
+        except FileNotFoundError:
+            # removed by another request pruning the cache
+            return None
+
+    def _upstream_size(self, docset: user_contrib.DocSet) -> int | None:
+        """Get the archive size from the fastest mirror that reports it."""
+        for url in self.mirror_stats.rank(docset.urls):
+            if (size := self.mirror_stats.probe(url)) is not None:
+                return size
+        return None
+
+    def _stream_archive(self, docset: user_contrib.DocSet) -> Resource:
+        """Stream an archive from upstream, adding it to the cache once it is complete.
+
+        If another request is already adding the archive to the cache,
+        it is streamed without being cached again.
+
+        """
+        with self._index_lock:
+            archive_lock = self._archive_locks.setdefault(docset.name, threading.Lock())
+        stream = download.ArchiveStream(docset, self.mirror_stats)
+        if not archive_lock.acquire(blocking=False):
+            stream.connect()
+            return self._archive_resource(docset, stream, stream.size)
+        try:
+            console.print(f"Downloading {docset.name}", highlight=False)
+            stream.connect()
+            content = _CachingStream(
+                stream, archive_lock, functools.partial(self._add_archive, docset)
+            )
+        except BaseException:
+            archive_lock.release()
+            raise
+        return self._archive_resource(docset, content, stream.size)
+
+    def _add_archive(self, docset: user_contrib.DocSet, downloaded: Path) -> None:
+        archive_path = self.cache.add(docset, downloaded)
+        self.cache.prune(keep=archive_path)
+        self.mirror_stats.save()
+
+    def _archive_resource(
+        self,
+        docset: user_contrib.DocSet,
+        content: BinaryIO | io.RawIOBase | None,
+        size: int | None,
+    ) -> Resource:
+        version_hash = hashlib.sha256(docset.version.encode()).hexdigest()[:16]
+        return Resource(
+            content=content,
+            size=size,
+            etag=f'"{version_hash}-{size}"'
+            if size is not None
+            else f'"{version_hash}"',
+            content_type="application/gzip",
+        )
+
+
+class _CachingStream(io.RawIOBase):
+    """Read an archive from upstream, while writing it to a file for the cache.
+
+    Once the archive has all been read, the file is passed to `on_complete`.
+    The archive lock is held until the stream is closed.
+
+    """
+
+    def __init__(
+        self,
+        stream: download.ArchiveStream,
+        lock: threading.Lock,
+        on_complete: Callable[[Path], None],
+    ):
+        self.stream = stream
+        self.on_complete = on_complete
+        self._lock = lock
+        downloads = user_cache_path(APP_NAME) / "downloads"
+        downloads.mkdir(exist_ok=True, parents=True)
+        fd, path = tempfile.mkstemp(
+            prefix=f"{stream.docset.archive}-", suffix=".part", dir=downloads
+        )
+        self._path = Path(path)
+        self._file = os.fdopen(fd, "wb")
+        self._received = 0
+
+    def readable(self) -> bool:
+        """Stream is always readable."""
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Read the next bytes from upstream, and write them to the file."""
+        size = self.stream.readinto(buffer)
+        if size:
+            self._file.write(memoryview(buffer)[:size])
+            self._received += size
+        # cache the archive before the last bytes are sent,
+        # so that the client's next request finds it
+        if (not size or self._received == self.stream.size) and not self._file.closed:
+            self._file.close()
+            digest_path(self._path).write_text(f"{self.stream.sha256.hexdigest()}\n")
+            self.on_complete(self._path)
+        return size
+
+    def close(self) -> None:
+        """Close the upstream connection, and remove the file if it is incomplete."""
+        if not self.closed:
+            self.stream.close()
+            self._file.close()
+            self._path.unlink(missing_ok=True)
+            digest_path(self._path).unlink(missing_ok=True)
+            self._lock.release()
+        super().close()
+
+
+class DocsetRequestHandler(BaseHTTPRequestHandler):
+    """Handle requests for the index and archives."""
+
+    server: DocsetServer
+
+    def do_GET(self):  # noqa: N802
+        """Send the index or an archive."""
+        self._handle(send_body=True)
+
+    def do_HEAD(self):  # noqa: N802
+        """Send the headers for the index or an archive."""
+        self._handle(send_body=False)
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Log requests to the console."""
+        console.print(
+            f"{self.address_string()} - {format % args}", highlight=False, markup=False
+        )
+
+    def _handle(self, send_body: bool) -> None:
+        path = urlsplit(self.path).path
+        try:
+            if path == INDEX_PATH:
+                resource = self.server.proxy.index(self._base_url())
+            elif path.startswith(ARCHIVE_PATH):
+                name, _, archive = path[len(ARCHIVE_PATH) :].partition("/")
+                resource = self.server.proxy.archive(
+                    unquote(name), unquote(archive), headers_only=not send_body
+                )
+            else:
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+        except FileNotFoundError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        except ApplicationError as exc:
+            self.send_error(HTTPStatus.BAD_GATEWAY, str(exc))
+            return
+
+        try:
+            self._send_resource(resource, send_body)
+        finally:
+            resource.close()
+
+    def _send_resource(self, resource: Resource, send_body: bool) -> None:
+        if self._not_modified(resource):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_validators(resource)
+            self.end_headers()
+            return
+
+        size = resource.size
+        if size is None or not resource.seekable():
+            self._send_stream(resource, send_body)
+            return
+
+        byte_range = self._byte_range(resource, size)
+        if byte_range is None:
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range
+        if (start, end) == (0, size - 1) or size == 0:
+            self.send_response(HTTPStatus.OK)
+        else:
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Type", resource.content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self._send_validators(resource)
+        self.end_headers()
+        if send_body:
+            self._send_content(resource, start, end - start + 1)
+
+    def _send_stream(self, resource: Resource, send_body: bool) -> None:
+        """Send the complete resource as it is read, ignoring any range request.
+
+        Without a known size, the end of the response is marked by closing the
+        connection.
+
+        """
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", resource.content_type)
+        if resource.size is not None:
+            self.send_header("Content-Length", str(resource.size))
+        self._send_validators(resource)
+        self.end_headers()
+        if send_body and isinstance(resource.content, io.IOBase):
+            try:
+                _copy_bytes(resource.content, self.wfile)
+            except ApplicationError as exc:
+                # too late to send an error, so the client gets an incomplete archive
+                self.log_error("%s", exc)
+
+    def _base_url(self) -> str:
+        host = self.headers.get("Host") or "{}:{}".format(*self.server.server_address)
+        return f"http://{host}"
+
+    def _not_modified(self, resource: Resource) -> bool:
+        if if_none_match := self.headers.get("If-None-Match"):
+            etags = {etag.strip() for etag in if_none_match.split(",")}
+            return resource.etag in etags or "*" in etags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and resource.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(resource.last_modified) <= since
+        return False
+
+    def _byte_range(self, resource: Resource, size: int) -> tuple[int, int] | None:
+        """Get the first and last byte to send, or `None` if not satisfiable.
+
+        Only single ranges are supported,
+        anything else is answered with the complete resource.
+
+        """
+        complete = (0, size - 1)
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if not range_header or (if_range and if_range != resource.etag):
+            return complete
+        match = _RANGE.fullmatch(range_header.strip())
+        if not match or match[1] == match[2] == "":
+            return complete
+        if match[1] == "":
+            # suffix range, for the last N bytes
+            start, end = max(size - int(match[2]), 0), size - 1
+        else:
+            start = int(match[1])
+            end = min(int(match[2]), size - 1) if match[2] else complete[1]
+        if start > end or start >= size:
+            return None
+        return start, end
+
+    def _send_validators(self, resource: Resource) -> None:
+        self.send_header("ETag", resource.etag)
+        if resource.last_modified is not None:
+            self.send_header(
+                "Last-Modified", formatdate(resource.last_modified, usegmt=True)
+            )
+
+    def _send_content(self, resource: Resource, start: int, length: int) -> None:
+        if isinstance(resource.content, bytes):
+            self.wfile.write(resource.content[start : start + length])
+            return
+        if resource.content is not None:
+            resource.content.seek(start)
+            _copy_bytes(resource.content, self.wfile, length)
+
+
+class DocsetServer(ThreadingHTTPServer):
+    """HTTP server for the docset index and archives."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], proxy: DocsetProxy):
+        super().__init__(address, DocsetRequestHandler)
+        self.proxy = proxy
+
+
+def _archive_url(base_url: str, docset: dict) -> str:
+    name, archive = quote(docset["name"], safe=""), quote(docset["archive"], safe="")
+    return f"{base_url}{ARCHIVE_PATH}{name}/{archive}"
+
+
+def _copy_bytes(
+    source: BinaryIO | io.RawIOBase,
+    destination: io.BufferedIOBase,
+    length: int | None = None,
+) -> None:
+    """Copy `length` bytes between files, or the rest of the source file."""
+    while length is None or length > 0:
+        chunk = source.read(_CHUNK_SIZE if length is None else min(length, _CHUNK_SIZE))
+        if not chunk:
+            break
+        destination.write(chunk)
+        if length is not None:
+            length -= len(chunk)
@@ -0,0 +1,373 @@
+"""Search the symbols (classes, functions, etc.) defined by the installed docsets.
+
+Each docset has a SQLite search index, `docSet.dsidx`, with either a `searchIndex` table
+(Dash docsets) or the Core Data `ZTOKEN` tables (docsets generated by Apple's tools).
+
+The symbols of every installed docset are copied into one full text search index
+in the cache folder, which is only refreshed for docsets whose `docSet.dsidx` has
+changed, so a query does not need to open every docset's database.
+If SQLite does not have FTS5 with the trigram tokenizer (SQLite 3.34),
+each docset's index is searched directly instead.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import heapq
+import re
+import sqlite3
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import attrs
+from platformdirs import user_cache_path
+
+from . import APP_NAME, timings
+from .console import console
+from .zeal import InstalledDocSet
+
+DSIDX_PATH = "Contents/Resources/docSet.dsidx"
+"""Location of the search index in a docset folder."""
+
+INDEX_VERSION = 1
+
+_SEARCH_INDEX_QUERY = "SELECT name, type, path FROM searchIndex"
+_ZTOKEN_QUERY = """
+SELECT ztokenname AS name, ztypename AS type,
+    zpath || ifnull('#' || zanchor, '') AS path
+FROM ztoken
+LEFT JOIN ztokenmetainformation ON ztoken.zmetainformation = ztokenmetainformation.z_pk
+LEFT JOIN zfilepath ON ztokenmetainformation.zfile = zfilepath.z_pk
+LEFT JOIN ztokentype ON ztoken.ztokentype = ztokentype.z_pk
+"""
+
+_SCHEMA = """
+DROP TABLE IF EXISTS symbols_fts;
+DROP TABLE IF EXISTS symbols;
+DROP TABLE IF EXISTS docsets;
+CREATE TABLE docsets (
+    id INTEGER PRIMARY KEY,
+    dsidx TEXT UNIQUE,
+    name TEXT,
+    mtime_ns INTEGER
+);
+CREATE TABLE symbols (
+    id INTEGER PRIMARY KEY, docset_id INTEGER, name TEXT, type TEXT, path TEXT
+);
+CREATE INDEX symbols_docset_id ON symbols (docset_id);
+CREATE VIRTUAL TABLE symbols_fts USING fts5 (
+    name, content='symbols', content_rowid='id', tokenize='trigram'
+);
+"""
+
+_SEPARATORS = re.compile(r"[.:/#\s]+")
+
+_TRIGRAM = 3
+"""Shortest text that can be found with the trigram index."""
+
+
+@attrs.frozen
+class Symbol:
+    """Symbol from a docset's search index."""
+
+    name: str
+    type: str
+    path: str
+    """Page in the docset, relative to the `Documents` folder."""
+    docset: str
+
+
+@attrs.define
+class SymbolIndex:
+    """Full text search index of the symbols in a docset folder's docsets."""
+
+    connection: sqlite3.Connection
+
+    @classmethod
+    def open(cls, docset_path: Path) -> SymbolIndex:
+        """Open the index for a docset folder, creating it if needed.
+
+        Raises `sqlite3.OperationalError` if SQLite does not support FTS5.
+
+        """
+        key = hashlib.sha256(str(docset_path.resolve()).encode()).hexdigest()[:16]
+        index_file = user_cache_path(APP_NAME) / "symbols" / f"{key}.sqlite"
+        index_file.parent.mkdir(exist_ok=True, parents=True)
+        connection = sqlite3.connect(index_file)
+        try:
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+            if version != INDEX_VERSION:
+                connection.executescript(
+                    f"{_SCHEMA} PRAGMA user_version = {INDEX_VERSION};"
+                )
+        except sqlite3.Error:
+            connection.close()
+            raise
+        _add_rank_function(connection)
+        return cls(connection)
+
+    def close(self) -> None:
+        """Close the index database."""
+        self.connection.close()
+
+    def refresh(
+        self, docset_path: Path, docsets: Iterable[InstalledDocSet], jobs: int
+    ) -> int:
+        """Index the docsets that are new or changed, returning how many there were.
+
+        The docsets' search indexes are read in parallel, by `jobs` threads,
+        and docsets that are no longer installed are removed.
+
+        """
+        installed = {}
+        for docset in docsets:
+            dsidx_path = docset_path / docset.folder / DSIDX_PATH
+            with contextlib.suppress(OSError):
+                installed[str(dsidx_path)] = (
+                    docset.name,
+                    dsidx_path.stat().st_mtime_ns,
+                )
+        indexed = {
+            dsidx: (docset_id, mtime_ns)
+            for docset_id, dsidx, mtime_ns in self.connection.execute(
+                "SELECT id, dsidx, mtime_ns FROM docsets"
+            )
+        }
+        changed = [
+            dsidx
+            for dsidx, (_, mtime_ns) in installed.items()
+            if dsidx not in indexed or indexed[dsidx][1] != mtime_ns
+        ]
+        removed = [
+            docset_id
+            for dsidx, (docset_id, mtime_ns) in indexed.items()
+            if dsidx not in installed or installed[dsidx][1] != mtime_ns
+        ]
+        if not changed and not removed:
+            return 0
+
+        with (
+            timings.phase("index symbols") as phase,
+            self.connection,
+            ThreadPoolExecutor(max_workers=jobs) as executor,
+        ):
+            for docset_id in removed:
+                self._remove(docset_id)
+            futures = {
+                executor.submit(read_symbols, Path(dsidx)): dsidx for dsidx in changed
+            }
+            for future in as_completed(futures):
+                dsidx = futures[future]
+                name, mtime_ns = installed[dsidx]
+                symbols = _result_or_warn(future.result, name)
+                if symbols is None:
+                    # not recorded, so the next refresh tries to read it again
+                    continue
+                self._add(dsidx, name, mtime_ns, symbols)
+            phase.files = len(changed)
+        return len(changed)
+
+    def search(self, text: str, limit: int) -> list[Symbol]:
+        """Find the symbols containing `text`, best matches first."""
+        if len(text) >= _TRIGRAM:
+            # quoted, so the text is matched as a string rather than a query
+            condition = (
+                "symbols.id IN "
+                "(SELECT rowid FROM symbols_fts WHERE symbols_fts MATCH ?)"
+            )
+            pattern = '"{}"'.format(text.replace('"', '""'))
+        else:
+            # too short for the trigram index, so every name is checked
+            condition = "symbols.name LIKE ? ESCAPE '\\'"
+            pattern = _like_pattern(text)
+        rows = self.connection.execute(
+            f"""
+            SELECT symbols.name, symbols.type, symbols.path, docsets.name
+            FROM symbols
+            JOIN docsets ON docsets.id = symbols.docset_id
+            WHERE {condition}
+            ORDER BY symbol_rank(symbols.name, ?), length(symbols.name),
+                symbols.name, docsets.name
+            LIMIT ?
+            """,
+            (pattern, text.lower(), limit),
+        )
+        return [Symbol(*row) for row in rows]
+
+    def _add(
+        self, dsidx: str, name: str, mtime_ns: int, symbols: list[tuple[str, str, str]]
+    ) -> None:
+        docset_id = self.connection.execute(
+            "INSERT INTO docsets (dsidx, name, mtime_ns) VALUES (?, ?, ?)",
+            (dsidx, name, mtime_ns),
+        ).lastrowid
+        self.connection.executemany(
+            "INSERT INTO symbols (docset_id, name, type, path) VALUES (?, ?, ?, ?)",
+            ((docset_id, *symbol) for symbol in symbols),
+        )
+        self.connection.execute(
+            "INSERT INTO symbols_fts (rowid, name) "
+            "SELECT id, name FROM symbols WHERE docset_id = ?",
+            (docset_id,),
+        )
+
+    def _remove(self, docset_id: int) -> None:
+        # the full text index only has the text, so removing rows needs the text too
+        self.connection.execute(
+            "INSERT INTO symbols_fts (symbols_fts, rowid, name) "
+            "SELECT 'delete', id, name FROM symbols WHERE docset_id = ?",
+            (docset_id,),
+        )
+        self.connection.execute("DELETE FROM symbols WHERE docset_id = ?", (docset_id,))
+        self.connection.execute("DELETE FROM docsets WHERE id = ?", (docset_id,))
+
+
+def query(
+    docset_path: Path,
+    docsets: Iterable[InstalledDocSet],
+    text: str,
+    limit: int,
+    jobs: int,
+) -> list[Symbol]:
+    """Find symbols in the installed docsets, best matches first.
+
+    Uses the combined index (refreshing it first) if SQLite supports FTS5,
+    otherwise searches each docset's index directly (see `search_docsets`).
+
+    """
+    try:
+        index = SymbolIndex.open(docset_path)
+    except sqlite3.OperationalError:
+        return search_docsets(docset_path, docsets, text, limit, jobs)
+    try:
+        index.refresh(docset_path, docsets, jobs)
+        with timings.phase("query symbols"):
+            return index.search(text, limit)
+    finally:
+        index.close()
+
+
+def search_docsets(
+    docset_path: Path,
+    docsets: Iterable[InstalledDocSet],
+    text: str,
+    limit: int,
+    jobs: int,
+) -> list[Symbol]:
+    """Find symbols containing `text` by searching each docset's index, in parallel."""
+    with (
+        timings.phase("query symbols"),
+        ThreadPoolExecutor(max_workers=jobs) as executor,
+    ):
+        futures = {
+            executor.submit(
+                _search_dsidx, docset_path / docset.folder / DSIDX_PATH, text, limit
+            ): docset.name
+            for docset in docsets
+            if (docset_path / docset.folder / DSIDX_PATH).exists()
+        }
+        results = [
+            Symbol(*row, docset=futures[future])
+            for future in as_completed(futures)
+            for row in _result_or_warn(future.result, futures[future]) or ()
+        ]
+    lower_text = text.lower()
+    return heapq.nsmallest(
+        limit,
+        results,
+        key=lambda symbol: (
+            _match_rank(symbol.name, lower_text),
+            len(symbol.name),
+            symbol.name,
+            symbol.docset,
+        ),
+    )
+
+
+def read_symbols(dsidx: Path) -> list[tuple[str, str, str]]:
+    """Read the name, type and path of every symbol in a docset's search index."""
+    with contextlib.closing(_connect_read_only(dsidx)) as connection:
+        return connection.execute(_symbols_query(connection)).fetchall()
+
+
+def _search_dsidx(dsidx: Path, text: str, limit: int) -> list[tuple[str, str, str]]:
+    """Get the best `limit` symbols containing `text` from a docset's search index."""
+    with contextlib.closing(_connect_read_only(dsidx)) as connection:
+        _add_rank_function(connection)
+        return connection.execute(
+            f"""
+            SELECT name, type, path FROM ({_symbols_query(connection)})
+            WHERE name LIKE ? ESCAPE '\\'
+            ORDER BY symbol_rank(name, ?), length(name), name
+            LIMIT ?
+            """,
+            (_like_pattern(text), text.lower(), limit),
+        ).fetchall()
+
+
+def _like_pattern(text: str) -> str:
+    """Pattern to find names containing `text` with `LIKE`, escaping its wildcards."""
+    return "%{}%".format(re.sub(r"([\\%_])", r"\\\1", text))
+
+
+def _connect_read_only(dsidx: Path) -> sqlite3.Connection:
+    return sqlite3.connect(
+        f"{dsidx.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+    )
+
+
+def _symbols_query(connection: sqlite3.Connection) -> str:
+    """Get the query for the symbols, for the search index's format."""
+    tables = {
+        name.lower()
+        for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )
+    }
+    if "searchindex" in tables:
+        return _SEARCH_INDEX_QUERY
+    if "ztoken" in tables:
+        return _ZTOKEN_QUERY
+    raise sqlite3.DatabaseError("no searchIndex or ZTOKEN table")
+
+
+def _add_rank_function(connection: sqlite3.Connection) -> None:
+    connection.create_function(
+        "symbol_rank", 2, lambda name, text: _match_rank(name or "", text)
+    )
+
+
+def _match_rank(name: str, text: str) -> int:
+    """Rank how well a symbol name matches the (lower case) search text.
+
+    Exact matches are first, then the last part of a qualified name
+    (such as `join` for `os.path.join`), then prefixes, substrings,
+    and names that only have the same words.
+
+    """
+    name = name.lower()
+    if name == text:
+        return 0
+    if _SEPARATORS.split(name)[-1] == text:
+        return 1
+    if name.startswith(text):
+        return 2
+    if text in name:
+        return 3
+    return 4
+
+
+def _result_or_warn(
+    result: Callable[[], list[tuple[str, str, str]]], name: str
+) -> list[tuple[str, str, str]] | None:
+    """Get the symbols read from a docset's index, warning if it could not be read."""
+    try:
+        return result()
+    except sqlite3.Error as exc:
+        console.print(
+            f"Skipping {name!r}, failed to read its search index: {exc}", style="red"
+        )
+        return None
@@ -0,0 +1,111 @@
+"""Record how long each phase of loading and installing docsets takes.
+
+Recording is off by default, when `phase` returns a shared do-nothing context,
+so instrumented code costs almost nothing unless `--timings` is used.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any, ContextManager
+
+import attrs
+
+
+@attrs.define
+class Phase:
+    """Wall time, and the bytes and files processed, for one phase of the work."""
+
+    name: str
+    docset: str | None = None
+    seconds: float = 0.0
+    bytes: int | None = None
+    files: int | None = None
+
+    @property
+    def throughput(self) -> float | None:
+        """Bytes per second, if the bytes were recorded."""
+        if self.bytes is None or self.seconds <= 0:
+            return None
+        return self.bytes / self.seconds
+
+
+class Recorder:
+    """Collect the phases recorded by any thread."""
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.phases: list[Phase] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, docset: str | None = None) -> Iterator[Phase]:
+        """Time the phase, which can also be given the bytes and files processed."""
+        phase = Phase(name, docset)
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds = time.perf_counter() - start
+            with self._lock:
+                self.phases.append(phase)
+
+    def summary(self) -> list[Phase]:
+        """Total each phase over all the docsets."""
+        totals: dict[str, Phase] = {}
+        for phase in self.phases:
+            total = totals.setdefault(phase.name, Phase(phase.name))
+            total.seconds += phase.seconds
+            if phase.bytes is not None:
+                total.bytes = (total.bytes or 0) + phase.bytes
+            if phase.files is not None:
+                total.files = (total.files or 0) + phase.files
+        return list(totals.values())
+
+    def report(self) -> dict[str, Any]:
+        """Get the phases and totals, as JSON compatible data."""
+        return {
+            "phases": [_phase_dict(phase) for phase in self.phases],
+            "totals": [_phase_dict(phase) for phase in self.summary()],
+        }
+
+
+class _NullRecorder:
+    """Recorder that records nothing, used when timings are not wanted."""
+
+    enabled = False
+
+    def __init__(self) -> None:
+        self._context = contextlib.nullcontext(Phase(""))
+
+    def phase(self, name: str, docset: str | None = None) -> ContextManager[Phase]:
+        return self._context
+
+
+_recorder: Recorder | _NullRecorder = _NullRecorder()
+
+
+def enable() -> Recorder:
+    """Start recording phases, returning the recorder."""
+    global _recorder  # noqa: PLW0603
+    _recorder = Recorder()
+    return _recorder
+
+
+def recorder() -> Recorder | _NullRecorder:
+    """Get the current recorder."""
+    return _recorder
+
+
+def phase(name: str, docset: str | None = None) -> ContextManager[Phase]:
+    """Time a phase with the current recorder."""
+    return _recorder.phase(name, docset)
+
+
+def _phase_dict(phase: Phase) -> dict[str, Any]:
+    return {**attrs.asdict(phase), "throughput": phase.throughput}
@@ -0,0 +1,160 @@
+"""HTTP transport shared by every network request.
+
+Each host gets its own pooled session, so that downloading several archives from
+the same mirror reuses the connections (and TLS sessions) instead of opening new ones.
+Requests have connect and read timeouts, failed connections and server errors are
+retried a few times with jittered backoff, and downloads can be limited to a
+maximum bandwidth shared by all the downloads.
+
+"""
+
+from __future__ import annotations
+
+import functools
+import random
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = 10
+"""Seconds to wait for a connection to a server."""
+
+READ_TIMEOUT = 30
+"""Seconds to wait for data from a server before giving up."""
+
+RETRIES = 2
+"""Number of times a failed connection or server error is retried."""
+
+RETRY_BACKOFF = 0.5
+"""Base delay (in seconds) before retrying, doubled for each further retry."""
+
+POOL_SIZE = 8
+"""Connections kept open to each host."""
+
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _JitteredRetry(Retry):
+    """Retry with "full jitter", so that clients retrying together do not collide."""
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, super().get_backoff_time())
+
+
+class Throttle:
+    """Token bucket limiting the total bandwidth of several downloads.
+
+    Methods are safe to call from multiple download threads.
+
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._available = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        """Wait until `size` bytes can be received without exceeding the rate."""
+        with self._lock:
+            now = time.monotonic()
+            # allow bursts of up to one second of data
+            self._available = min(
+                self.rate, self._available + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._available -= size
+            delay = -self._available / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Transport:
+    """Pooled sessions per host, with timeouts, retries and a bandwidth limit."""
+
+    def __init__(
+        self,
+        *,
+        timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+        retries: int = RETRIES,
+        retry_backoff: float = RETRY_BACKOFF,
+        bandwidth_limit: int | None = None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._throttle: Throttle | None = None
+        self.bandwidth_limit = bandwidth_limit
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bandwidth_limit(self) -> int | None:
+        """Maximum bytes per second for all downloads, or `None` for no limit."""
+        return int(self._throttle.rate) if self._throttle else None
+
+    @bandwidth_limit.setter
+    def bandwidth_limit(self, limit: int | None) -> None:
+        self._throttle = Throttle(limit) if limit else None
+
+    def session(self, url: str) -> requests.Session:
+        """Get the session for the host of a URL."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._new_session()
+            return self._sessions[host]
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a GET request, using the default timeout unless one is given."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session(url).get(url, **kwargs)
+
+    def head(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a HEAD request, using the default timeout unless one is given."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session(url).head(url, **kwargs)
+
+    def iter_content(self, r: requests.Response, chunk_size: int) -> Iterator[bytes]:
+        """Iterate over a streamed response body, keeping to the bandwidth limit."""
+        for chunk in r.iter_content(chunk_size=chunk_size):
+            if self._throttle:
+                self._throttle.consume(len(chunk))
+            yield chunk
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+    def _new_session(self) -> requests.Session:
+        retry = _JitteredRetry(
+            total=self.retries,
+            backoff_factor=self.retry_backoff,
+            status_forcelist=_RETRY_STATUSES,
+            # return the last error response, rather than raising a retry error
+            raise_on_status=False,
+            # a mirror asking for a long wait is better skipped than waited for
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+@functools.cache
+def default_transport() -> Transport:
+    """Get the transport shared by the whole application."""
+    return Transport()
@@ -1,22 +1,57 @@
-"""Functionality related to fetching the user contributed docsets."""
+"""Functionality related to fetching the user contributed docsets.
+
+Loading the cached index is on the start up path of every command,
+so the modules for downloading (*requests*) and parsing the JSON (*cattrs*)
+are only imported when they are needed.
+
+The index is parsed one docset at a time as it downloads, while it is saved to the
+cache, so the whole index (which includes the icons) is never in memory at once.
+
+"""
 
 from __future__ import annotations
 
+import array
+import codecs
+import contextlib
+import enum
+import functools
+import heapq
+import itertools
 import json
+import marshal
+import re
+import sys
+import threading
 import time
-from collections.abc import Iterable, Iterator, Mapping
-from typing import Optional
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, TypeVar
 
 import attrs
-import requests
-from cattrs import Converter
-from cattrs.gen import make_dict_structure_fn, override
 from platformdirs import user_data_path
 
-from . import APP_NAME, ApplicationError
+from . import APP_NAME, ApplicationError, timings
+
+if TYPE_CHECKING:
+    from cattrs import Converter
 
 USER_DOCSET_API = "https://zealusercontributions.vercel.app/api/docsets"
 _CACHE_FILENAME = "docsets.json"
+_CACHE_INFO_FILENAME = "docsets-cache.json"
+_BINARY_CACHE_FILENAME = "docsets.bin"
+_BINARY_CACHE_VERSION = 3
+_INDEX_CHUNK_SIZE = 65_536
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER = re.compile(r"[-+0-9.eE]*")
+
+T = TypeVar("T")
+
+FUZZY_DISTANCE = 2
+"""Maximum edit distance for `DocSetCollection.fallback_search` matches."""
+
+CACHE_TTL = 43_200  # 12 hours in seconds
+"""Default number of seconds the cached index is used without checking for updates."""
 
 
 @attrs.define
@@ -35,7 +70,7 @@ class DocSet:
     @property
     def title(self) -> str:
         """Pretty name of Docset."""
-        return self.name.replace("_", " ")
+        return _title(self.name)
 
     def __str__(self):
         return f"{self.name} ({self.version})"
@@ -50,47 +85,293 @@ class DocSetCollection(Mapping[str, DocSet]):
     This mapping is keyed by the DocSet ID,
     and provides other methods for searching the collection.
 
+    When created `from_records`, the DocSet models are only created when accessed,
+    and the search index can be loaded (rather than built) when it is first needed.
+
     """
 
-    def __init__(self, docsets: Iterable[DocSet]):
-        self._docsets = {self._normalize(docset.name): docset for docset in docsets}
+    def __init__(self, docsets: Iterable[DocSet] = ()):
+        self._docsets: dict[str, DocSet] = {}
+        self._names: dict[str, tuple[str, Sequence[str]]] = {}
+        self._records: dict[str, Any] = {}
+        self._structure: Callable[[Any], DocSet] | None = None
+        self._search_index: _SearchIndex | None = None
+        self._load_search_index: Callable[[], _SearchIndex] | None = None
+        for docset in docsets:
+            id_ = self._normalize(docset.name)
+            self._docsets[id_] = docset
+            self._names[id_] = (docset.name, docset.aliases)
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[tuple[str, Sequence[str], T]],
+        structure: Callable[[T], DocSet],
+        search_index: Callable[[], _SearchIndex] | None = None,
+    ) -> DocSetCollection:
+        """Create a collection that only creates DocSet models when needed.
+
+        Each record is the name, aliases and raw data for a docset,
+        with `structure` converting the raw data into a `DocSet` when first accessed.
+        If given, `search_index` loads a saved search index for the same records.
+
+        """
+        collection = cls()
+        collection._structure = structure
+        collection._load_search_index = search_index
+        for name, aliases, record in records:
+            id_ = cls._normalize(name)
+            collection._names[id_] = (name, aliases)
+            collection._records[id_] = record
+        return collection
 
     def __getitem__(self, item: str) -> DocSet:
-        return self._docsets[self._normalize(item)]
+        id_ = self._normalize(item)
+        if (docset := self._docsets.get(id_)) is not None:
+            return docset
+        record = self._records[id_]
+        assert self._structure is not None
+        # another thread might create the same docset, the first one is kept
+        return self._docsets.setdefault(id_, self._structure(record))
 
     def __len__(self) -> int:
-        return len(self._docsets)
+        return len(self._names)
 
     def __iter__(self):
-        return iter(self._docsets)
+        return iter(self._names)
 
     def search(self, text: str) -> Iterator[DocSet]:
         """Yield packages that match the provided name."""
         text = self._normalize(text)
-        for id_, docset in self._docsets.items():
-            if text in id_:
-                yield docset
-                continue
-            if text in self._normalize(docset.title):
-                yield docset
-                continue
-            if self._search_aliases(text, docset.aliases):
-                yield docset
-                continue
+        index = self._get_search_index()
+        for i in index.candidates(text):
+            if any(text in field for field in index.docset_fields(i)):
+                yield self[index.ids[i]]
 
     def fallback_search(self, text: str) -> Iterator[DocSet]:
-        """Yield packages that approximately match the provided name."""
+        """Yield packages that approximately match the name, title or an alias."""
         text = self._normalize(text)
-        for id_, docset in self._docsets.items():
-            if _edit_distance(text, id_) <= 2:
-                yield docset
+        index = self._get_search_index()
+        for _, _, id_ in index.fuzzy_matches(text, FUZZY_DISTANCE):
+            yield self[id_]
+
+    def ranked_search(self, text: str, limit: int | None = None) -> list[SearchResult]:
+        """Find the docsets that best match the provided name.
+
+        Matches are ranked by how they matched (see `MatchRank`), then by name.
+        Fuzzy matches are only included when nothing else matches,
+        ranked by their edit distance.
+
+        With a `limit`, only the best results are selected (with a heap),
+        and DocSet models are only created for those results.
+
+        """
+        text = self._normalize(text)
+        index = self._get_search_index()
+        matches: Iterator[tuple[MatchRank, int, str]] = index.ranked_matches(text)
+        if (first_match := next(matches, None)) is None:
+            matches = index.fuzzy_matches(text, FUZZY_DISTANCE)
+        else:
+            matches = itertools.chain((first_match,), matches)
+        if limit is None:
+            best_matches = sorted(matches)
+        else:
+            best_matches = heapq.nsmallest(limit, matches)
+        return [
+            SearchResult(self[id_], rank, distance)
+            for rank, distance, id_ in best_matches
+        ]
+
+    def _get_search_index(self) -> _SearchIndex:
+        """Load or build the search index the first time it is needed."""
+        if self._search_index is None and self._load_search_index is not None:
+            self._search_index = self._load_search_index()
+        if self._search_index is None:
+            self._search_index = _SearchIndex.build(self._names, self._normalize)
+        return self._search_index
 
     @staticmethod
     def _normalize(value: str) -> str:
         return value.lower()
 
-    def _search_aliases(self, text: str, aliases: list[str]) -> bool:
-        return any(text in self._normalize(alias) for alias in aliases)
+
+class MatchRank(enum.IntEnum):
+    """How a docset matched a search, from the best to the worst match."""
+
+    EXACT = 0
+    PREFIX = 1
+    SUBSTRING = 2
+    ALIAS = 3
+    FUZZY = 4
+
+
+@attrs.frozen
+class SearchResult:
+    """Docset found by `DocSetCollection.ranked_search`."""
+
+    docset: DocSet
+    rank: MatchRank
+    distance: int = 0
+    """Edit distance, for fuzzy matches."""
+
+
+@attrs.define
+class _SearchIndex:
+    """Normalized names of docsets, with a trigram index for substring searches.
+
+    Every trigram of a search term must appear in the docset's ID, title or aliases
+    for the term to be a substring of one of them,
+    so intersecting the trigram postings finds the only docsets worth checking.
+
+    Fuzzy matches are only checked for fields of a similar length,
+    that have (nearly) the same characters as the search term (see `fuzzy_candidates`).
+
+    Building the index takes longer than a search,
+    so it is saved with the pre-parsed cache (see `dumps`).
+    The fields and postings are kept as strings and packed integers,
+    which `marshal` loads much faster than tuples and sets.
+
+    """
+
+    ids: list[str]
+    fields: list[str]
+    """Normalized ID, title and aliases for each docset, joined by null characters."""
+    trigrams: dict[str, bytes]
+    """Positions of the docsets containing each trigram, as packed integers."""
+    lengths: dict[int, tuple[bytes, bytes]]
+    """Docset positions and character masks for the fields of each length, packed."""
+
+    @classmethod
+    def build(
+        cls,
+        names: Mapping[str, tuple[str, Sequence[str]]],
+        normalize: Callable[[str], str],
+    ) -> _SearchIndex:
+        """Index the names of the docsets, keyed by ID."""
+        ids, fields = [], []
+        postings: dict[str, set[int]] = {}
+        lengths: dict[int, tuple[array.array, array.array]] = {}
+        for i, (id_, (name, aliases)) in enumerate(names.items()):
+            docset_fields = (
+                id_,
+                normalize(_title(name)),
+                *(normalize(alias) for alias in aliases),
+            )
+            ids.append(id_)
+            fields.append("\0".join(docset_fields))
+            for field in docset_fields:
+                positions, masks = lengths.setdefault(
+                    len(field), (array.array("I"), array.array("Q"))
+                )
+                positions.append(i)
+                masks.append(_character_mask(field))
+                for trigram in _trigrams(field):
+                    postings.setdefault(trigram, set()).add(i)
+        trigrams = {
+            trigram: array.array("I", sorted(positions)).tobytes()
+            for trigram, positions in postings.items()
+        }
+        packed_lengths = {
+            length: (positions.tobytes(), masks.tobytes())
+            for length, (positions, masks) in lengths.items()
+        }
+        return cls(ids, fields, trigrams, packed_lengths)
+
+    def dumps(self) -> bytes:
+        """Save the index in the `marshal` format."""
+        return marshal.dumps((self.ids, self.fields, self.trigrams, self.lengths))
+
+    @classmethod
+    def loads(cls, data: bytes) -> _SearchIndex:
+        """Load an index saved by `dumps`."""
+        return cls(*marshal.loads(data))
+
+    def docset_fields(self, i: int) -> list[str]:
+        """Get the normalized ID, title and aliases of the docset at position `i`."""
+        return self.fields[i].split("\0")
+
+    def candidates(self, text: str) -> Iterable[int]:
+        """Positions of docsets that could contain the text, in collection order."""
+        text_trigrams = _trigrams(text)
+        if not text_trigrams:
+            return range(len(self.ids))
+        postings = sorted(
+            (self.trigrams.get(trigram, b"") for trigram in text_trigrams), key=len
+        )
+        positions = [array.array("I", posting) for posting in postings]
+        return sorted(set(positions[0]).intersection(*positions[1:]))
+
+    def ranked_matches(self, text: str) -> Iterator[tuple[MatchRank, int, str]]:
+        """Yield the rank, distance (always zero) and ID of matching docsets."""
+        for i in self.candidates(text):
+            id_, title, *aliases = self.docset_fields(i)
+            if text == id_:
+                yield MatchRank.EXACT, 0, id_
+            elif id_.startswith(text) or title.startswith(text):
+                yield MatchRank.PREFIX, 0, id_
+            elif text in id_ or text in title:
+                yield MatchRank.SUBSTRING, 0, id_
+            elif any(text in alias for alias in aliases):
+                yield MatchRank.ALIAS, 0, id_
+
+    def fuzzy_matches(
+        self, text: str, limit: int
+    ) -> Iterator[tuple[MatchRank, int, str]]:
+        """Yield the rank, edit distance and ID of approximately matching docsets."""
+        shortest, longest = len(text) - limit, len(text) + limit
+        for i in self.fuzzy_candidates(text, limit):
+            distance = min(
+                _bounded_edit_distance(text, field, limit)
+                for field in self.docset_fields(i)
+                if shortest <= len(field) <= longest
+            )
+            if distance <= limit:
+                yield MatchRank.FUZZY, distance, self.ids[i]
+
+    def fuzzy_candidates(self, text: str, limit: int) -> list[int]:
+        """Positions of docsets that could be within `limit` edits of the text.
+
+        The docset needs a field within `limit` characters of the text's length,
+        and each character that is only in the text or only in the field
+        needs an edit, which is checked with masks of the characters.
+        If the text is split into `limit + 1` parts, at least one part is unchanged
+        by the edits, so a matching field must contain it.
+        The trigram index finds those docsets, when the parts are long enough.
+
+        """
+        text_mask = _character_mask(text)
+        positions: set[int] = set()
+        for length in range(max(len(text) - limit, 0), len(text) + limit + 1):
+            packed_positions, packed_masks = self.lengths.get(length, (b"", b""))
+            for i, mask in zip(
+                array.array("I", packed_positions), array.array("Q", packed_masks)
+            ):
+                if (
+                    bin(text_mask & ~mask).count("1") <= limit
+                    and bin(mask & ~text_mask).count("1") <= limit
+                ):
+                    positions.add(i)
+        part_size = len(text) // (limit + 1)
+        if part_size >= 3:
+            starts = range(0, limit * part_size + 1, part_size)
+            ends = [*starts[1:], len(text)]
+            containing: set[int] = set()
+            for start, end in zip(starts, ends):
+                containing.update(self.candidates(text[start:end]))
+            positions &= containing
+        return sorted(positions)
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _character_mask(text: str) -> int:
+    """Set a bit for each character in the text (characters can share a bit)."""
+    mask = 0
+    for char in text:
+        mask |= 1 << (ord(char) % 64)
+    return mask
 
 
 @attrs.define
@@ -121,73 +402,522 @@ class DocSetComment:
     _comment: str
 
 
-def user_contrib_index(docset_index: str) -> DocSetCollection:
-    """Get the user contributed docset index information."""
-    r = requests.get(docset_index)
-    if not r.ok:
-        raise ApplicationError(
-            "Failed to load information about user contributed docsets"
-        )
+@attrs.define
+class CacheInfo:
+    """HTTP validators for the cached index, used for conditional requests."""
+
+    url: str
+    # *cattrs* evaluations this type hint, so we cannot use | when <= py3.10
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def headers(self) -> dict[str, str]:
+        """Headers to only download the index if it has changed."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
 
-    index_json = r.json()
-    cached_index = user_data_path(APP_NAME) / _CACHE_FILENAME
-    cached_index.parent.mkdir(exist_ok=True, parents=True)
-    json.dump(index_json, cached_index.open("w"))
 
-    return DocSetCollection(_parse_docset_index(index_json))
+def user_contrib_index(
+    docset_index: str, *, cache_folder: Path | None = None
+) -> DocSetCollection:
+    """Get the user contributed docset index information.
 
+    If the index is cached, a conditional request is made,
+    and the cached index is used if the index has not changed.
+    The index is cached in the application data folder, or the `cache_folder`.
 
-def load_cached_index() -> DocSetCollection | None:
+    """
+    cache_folder = cache_folder or user_data_path(APP_NAME)
+    cached_index = cache_folder / _CACHE_FILENAME
+    cache_info_file = cache_folder / _CACHE_INFO_FILENAME
+
+    cache_info = _load_cache_info(cache_info_file) if cached_index.exists() else None
+    headers = (
+        cache_info.headers() if cache_info and cache_info.url == docset_index else {}
+    )
+
+    import requests
+
+    from .transport import default_transport
+
+    transport = default_transport()
+    with timings.phase("fetch index"):
+        try:
+            r = transport.get(docset_index, headers=headers, stream=True)
+        except requests.RequestException as exc:
+            raise ApplicationError(
+                f"Failed to load information about user contributed docsets: {exc}"
+            ) from exc
+    with r:
+        if r.status_code == requests.codes.not_modified and cache_info:
+            # saving the cache info marks the cache as fresh again
+            _save_cache_info(cache_info_file, cache_info)
+            return _load_index_file(cached_index)
+        if not r.ok:
+            raise ApplicationError(
+                "Failed to load information about user contributed docsets"
+            )
+
+        cache_folder.mkdir(exist_ok=True, parents=True)
+        with timings.phase("parse index") as phase:
+            try:
+                records, phase.bytes = _stream_index(
+                    transport.iter_content(r, _INDEX_CHUNK_SIZE), cached_index
+                )
+            except requests.RequestException as exc:
+                raise ApplicationError(
+                    f"Failed to load information about user contributed docsets: {exc}"
+                ) from exc
+            except (ValueError, TypeError, KeyError) as exc:
+                raise ApplicationError(
+                    f"Invalid index of user contributed docsets: {exc}"
+                ) from exc
+            docsets = _records_collection(records)
+            _write_binary_index(
+                cache_folder / _BINARY_CACHE_FILENAME, cached_index, records, docsets
+            )
+    cache_info = CacheInfo(
+        url=docset_index,
+        etag=r.headers.get("etag"),
+        last_modified=r.headers.get("last-modified"),
+    )
+    _save_cache_info(cache_info_file, cache_info)
+
+    return docsets
+
+
+def load_cached_index(
+    max_age: float | None = CACHE_TTL,
+    *,
+    url: str | None = None,
+    include_icons: bool = False,
+    cache_folder: Path | None = None,
+) -> DocSetCollection | None:
     """Try to load cached Docset index.json.
 
-    Checks for existence of cached file and that it is less than 12 hours old.
+    Checks for existence of cached file and that it is less than `max_age` seconds old
+    (a `max_age` of `None` accepts a cache of any age).
+    If a `url` is given, an index that was downloaded from another URL is not used.
+
+    Unless `include_icons` is set, the docsets are loaded from the pre-parsed cache,
+    which does not include the icons.
 
     """
-    cached_index = user_data_path(APP_NAME) / _CACHE_FILENAME
+    cached_index = cached_index_file(cache_folder)
     if not cached_index.exists():
         return None
-    cache_updated = cached_index.stat().st_mtime
-    if time.time() - cache_updated > 43_200:  # 12 hours in seconds
+    if max_age is not None and cache_age(cache_folder) > max_age:
         return None
+    if url is not None:
+        cached_url = _cached_index_url(cached_index.with_name(_CACHE_INFO_FILENAME))
+        # caches saved before the URL was recorded are assumed to match
+        if cached_url is not None and cached_url != url:
+            return None
+
+    if include_icons:
+        return _json_collection(json.loads(cached_index.read_text()))
+    return _load_index_file(cached_index)
+
+
+def cached_index_file(cache_folder: Path | None = None) -> Path:
+    """Location of the cached `/api/docsets` JSON."""
+    return (cache_folder or user_data_path(APP_NAME)) / _CACHE_FILENAME
 
-    cached_json = json.load(cached_index.open("r"))
-    return DocSetCollection(_parse_docset_index(cached_json))
+
+def cache_age(cache_folder: Path | None = None) -> float:
+    """Seconds since the cached index was last downloaded or validated."""
+    cache_folder = cache_folder or user_data_path(APP_NAME)
+    cache_info_file = cache_folder / _CACHE_INFO_FILENAME
+    if not cache_info_file.exists():
+        cache_info_file = cache_folder / _CACHE_FILENAME
+    return time.time() - cache_info_file.stat().st_mtime
+
+
+def revalidate_in_background(docset_index: str) -> threading.Thread:
+    """Refresh the cached index in a background thread.
+
+    The thread is not a daemon, so the application waits for it to finish on exit.
+    Errors are ignored, since the cache will be refreshed on the next run.
+
+    """
+    import requests
+
+    def revalidate():
+        with contextlib.suppress(
+            ApplicationError, OSError, ValueError, requests.RequestException
+        ):
+            user_contrib_index(docset_index)
+
+    thread = threading.Thread(target=revalidate, name="revalidate-index")
+    thread.start()
+    return thread
+
+
+def _replace_file(path: Path, text: str) -> None:
+    """Write a file so that readers never see a partially written file."""
+    temp_path = path.with_name(f"{path.name}.tmp")
+    temp_path.write_text(text)
+    temp_path.replace(path)
+
+
+def _load_cache_info(cache_info_file: Path) -> CacheInfo | None:
+    from cattrs import Converter
+
+    try:
+        return Converter().structure(json.loads(cache_info_file.read_text()), CacheInfo)
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def _cached_index_url(cache_info_file: Path) -> str | None:
+    """Get the URL the cached index was downloaded from, without loading *cattrs*."""
+    try:
+        url = json.loads(cache_info_file.read_text())["url"]
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return url if isinstance(url, str) else None
+
+
+def _save_cache_info(cache_info_file: Path, cache_info: CacheInfo) -> None:
+    from cattrs import Converter
+
+    _replace_file(cache_info_file, json.dumps(Converter().unstructure(cache_info)))
+
+
+def _load_index_file(cached_index: Path) -> DocSetCollection:
+    """Load docsets from the pre-parsed cache, falling back to the cached JSON."""
+    binary_index = cached_index.with_name(_BINARY_CACHE_FILENAME)
+    if (docsets := _read_binary_index(binary_index, cached_index)) is not None:
+        return docsets
+    with cached_index.open("rb") as index_file:
+        chunks = iter(functools.partial(index_file.read, _INDEX_CHUNK_SIZE), b"")
+        records = tuple(map(_docset_record, _iter_json_array(_decode(chunks))))
+    docsets = _records_collection(records)
+    with contextlib.suppress(OSError):
+        _write_binary_index(binary_index, cached_index, records, docsets)
+    return docsets
+
+
+def _json_collection(index_json: list[dict]) -> DocSetCollection:
+    """Create a collection that structures the `/api/docsets` data on demand."""
+    converter = _docset_converter()
+    return DocSetCollection.from_records(
+        ((docset["name"], docset.get("aliases", []), docset) for docset in index_json),
+        functools.partial(converter.structure, cl=DocSet),
+    )
+
+
+def _binary_index_header(source: Path) -> bytes:
+    """Identify the format and source of the pre-parsed cache.
+
+    The `marshal` format depends on the Python version,
+    and the source JSON size and modification time detect a stale cache.
+
+    """
+    source_stat = source.stat()
+    return (
+        f"zeal-feeds {_BINARY_CACHE_VERSION} {sys.implementation.cache_tag} "
+        f"{source_stat.st_size} {source_stat.st_mtime_ns}\n"
+    ).encode()
+
+
+def _write_binary_index(
+    binary_index: Path,
+    source: Path,
+    records: tuple[tuple, ...],
+    docsets: DocSetCollection,
+) -> None:
+    """Save docset records, and their search index, in a format that is quick to load.
+
+    The records (see `_docset_record`) are tuples of built-in types
+    that `marshal` can load without any further parsing.
+    The search index is saved as nested `marshal` data,
+    so it is only loaded by commands that search.
+
+    """
+    search_index = docsets._get_search_index().dumps()
+    temp_path = binary_index.with_name(f"{binary_index.name}.tmp")
+    temp_path.write_bytes(
+        _binary_index_header(source) + marshal.dumps((records, search_index))
+    )
+    temp_path.replace(binary_index)
+
+
+def _read_binary_index(binary_index: Path, source: Path) -> DocSetCollection | None:
+    """Load docsets from the pre-parsed cache, if it is current."""
+    try:
+        data = binary_index.read_bytes()
+    except OSError:
+        return None
+    header, _, payload = data.partition(b"\n")
+    if header + b"\n" != _binary_index_header(source):
+        return None
+    try:
+        records, search_index = marshal.loads(payload)
+    except (EOFError, ValueError, TypeError):
+        return None
+    return _records_collection(
+        records, functools.partial(_SearchIndex.loads, search_index)
+    )
+
+
+def _records_collection(
+    records: Iterable[tuple], search_index: Callable[[], _SearchIndex] | None = None
+) -> DocSetCollection:
+    """Create a collection that creates the docsets from records on demand."""
+    return DocSetCollection.from_records(
+        ((record[0], record[5], record) for record in records),
+        _docset_from_record,
+        search_index,
+    )
+
+
+def _docset_record(docset: dict) -> tuple:
+    """Docset data from the index as a tuple of built-in types (without the icons)."""
+    return (
+        docset["name"],
+        docset["author"]["name"],
+        docset["author"]["link"],
+        docset["archive"],
+        docset["version"],
+        tuple(docset.get("aliases", ())),
+        tuple(docset.get("urls", ())),
+    )
+
+
+def _docset_from_record(record: tuple) -> DocSet:
+    name, author_name, author_link, archive, version, aliases, urls = record
+    return DocSet(
+        name=name,
+        author=DocSetAuthor(name=author_name, link=author_link),
+        archive=archive,
+        version=version,
+        aliases=list(aliases),
+        urls=list(urls),
+    )
+
+
+def _stream_index(
+    chunks: Iterable[bytes], cached_index: Path
+) -> tuple[tuple[tuple, ...], int]:
+    """Parse the index as it is received, saving the JSON to the cache.
+
+    Returns the docset records, and the number of bytes received.
+    The cached index is only replaced once the whole index has been parsed.
+
+    """
+    temp_path = cached_index.with_name(f"{cached_index.name}.tmp")
+    received = 0
+
+    def save(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        nonlocal received
+        for chunk in chunks:
+            cache_file.write(chunk)
+            received += len(chunk)
+            yield chunk
+
+    try:
+        with temp_path.open("wb") as cache_file:
+            records = tuple(
+                map(_docset_record, _iter_json_array(_decode(save(chunks))))
+            )
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    temp_path.replace(cached_index)
+    return records, received
+
+
+def _decode(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode UTF-8 text that might have characters split between chunks."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """Yield the elements of a JSON array as its text is read."""
+    reader = _JsonArrayReader(iter(chunks))
+    reader.expect("[")
+    if reader.next_token() == "]":
+        reader.position += 1
+    else:
+        while True:
+            yield reader.value()
+            if reader.expect(",", "]") == "]":
+                break
+    reader.end()
+
+
+class _JsonArrayReader:
+    """Read JSON values from text chunks, keeping only the text not yet parsed.
+
+    An incomplete value is parsed again once more text has been read,
+    with the text at least doubled each time, to avoid parsing large values
+    over and over.
+
+    The line and column of the parsed text that has been dropped are tracked,
+    so errors report their position in the whole input.
+
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self.chunks = chunks
+        self.text = ""
+        self.position = 0
+        self._decoder = json.JSONDecoder()
+        self._offset = 0
+        self._line = 1
+        self._column = 0
+        """Characters on the current line before the start of `text`."""
+
+    def read(self, minimum: int) -> bool:
+        """Read until the unparsed text is at least `minimum` characters."""
+        self._offset += self.position
+        if newlines := self.text.count("\n", 0, self.position):
+            self._line += newlines
+            self._column = self.position - self.text.rfind("\n", 0, self.position) - 1
+        else:
+            self._column += self.position
+        parts = [self.text[self.position :]]
+        size = len(parts[0])
+        for chunk in self.chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= minimum:
+                break
+        self.text, self.position = "".join(parts), 0
+        return len(parts) > 1
+
+    def next_token(self) -> str:
+        """Skip whitespace, returning the next character (without consuming it)."""
+        while True:
+            self.position = _skip_whitespace(self.text, self.position)
+            if self.position < len(self.text):
+                return self.text[self.position]
+            if not self.read(1):
+                raise self.error("Unexpected end of data", self.position)
+
+    def expect(self, *tokens: str) -> str:
+        """Consume the next character, which must be one of `tokens`."""
+        token = self.next_token()
+        if token not in tokens:
+            expected = " or ".join(repr(token) for token in tokens)
+            raise self.error(f"Expecting {expected}", self.position)
+        self.position += 1
+        return token
+
+    def value(self) -> Any:
+        """Parse the next value."""
+        token = self.next_token()
+        if token == "-" or token.isdigit():
+            # a number at the end of the text might continue in the next chunk
+            while _skip_number(self.text, self.position) == len(self.text):
+                if not self.read(len(self.text) - self.position + 1):
+                    break
+        while True:
+            pending = len(self.text) - self.position
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.position)
+            except json.JSONDecodeError as exc:
+                if self.read(2 * pending):
+                    continue
+                raise self.error(exc.msg, exc.pos) from None
+            break
+        self.position = end
+        return value
+
+    def end(self) -> None:
+        """Check that the rest of the text is whitespace, reading all of it."""
+        while True:
+            self.position = _skip_whitespace(self.text, self.position)
+            if self.position < len(self.text):
+                raise self.error("Extra data", self.position)
+            if not self.read(1):
+                return
+
+    def error(self, message: str, position: int) -> json.JSONDecodeError:
+        """Create an error for a position in `text`, with its position in the input."""
+        error = json.JSONDecodeError(message, self.text, position)
+        error.pos = self._offset + position
+        if newlines := self.text.count("\n", 0, position):
+            error.lineno = self._line + newlines
+        else:
+            error.lineno = self._line
+            error.colno = self._column + position + 1
+        error.args = (
+            f"{message}: line {error.lineno} column {error.colno} (char {error.pos})",
+        )
+        return error
+
+
+def _skip_whitespace(text: str, position: int) -> int:
+    match = _WHITESPACE.match(text, position)
+    return match.end() if match else position
+
+
+def _skip_number(text: str, position: int) -> int:
+    match = _NUMBER.match(text, position)
+    return match.end() if match else position
 
 
 def _parse_docset_index(index_json: dict) -> Iterator[DocSet]:
     """Yield docset data models from the `/api/docsets` data."""
+    converter = _docset_converter()
+    for docset in index_json:
+        yield converter.structure(docset, DocSet)
+
+
+@functools.cache
+def _docset_converter() -> Converter:
+    """Create the converter for docsets once, since creating the hook is slow."""
+    from cattrs import Converter
+    from cattrs.gen import make_dict_structure_fn, override
+
     converter = Converter()
     # map "icon@2x" in JSON to "icon_2x" in dataclass
     converter.register_structure_hook(
         DocSet,
         make_dict_structure_fn(DocSet, converter, icon_2x=override(rename="icon@2x")),
     )
+    return converter
 
-    for docset in index_json:
-        yield converter.structure(docset, DocSet)
 
+def _title(name: str) -> str:
+    return name.replace("_", " ")
 
-def _edit_distance(pattern: str, target: str) -> int:
-    len_a, len_b = len(pattern), len(target)
-    d = _edit_distance_matrix(len_a, len_b)
+
+def _bounded_edit_distance(pattern: str, target: str, limit: int) -> int:
+    """Levenshtein distance between two strings, if it is no more than `limit`.
+
+    Returns `limit + 1` for any larger distance.
+    Only the diagonal band of the matrix within `limit` is calculated,
+    and the calculation stops once every cell in a row exceeds the limit.
+
+    """
+    if abs(len(pattern) - len(target)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    # the two rows are reused, cells outside the band are never less than `too_far`
+    previous = list(range(len(target) + 1))
+    current = [too_far] * (len(target) + 1)
     for i, pattern_char in enumerate(pattern, start=1):
-        for j, target_char in enumerate(target, start=1):
-            cost = int(pattern_char != target_char)
-            d[i][j] = min(
-                d[i - 1][j] + 1,  # deletion
-                d[i][j - 1] + 1,  # insertion
-                d[i - 1][j - 1] + cost,  # substitution
+        start = max(1, i - limit)
+        left = current[start - 1] = i if start == 1 else too_far
+        row_minimum = left
+        for j in range(start, min(len(target), i + limit) + 1):
+            current[j] = left = min(
+                previous[j] + 1,  # deletion
+                left + 1,  # insertion
+                previous[j - 1] + (pattern_char != target[j - 1]),  # substitution
             )
-    return d[len_a][len_b]
-
-
-def _edit_distance_matrix(pattern_length: int, target_length: int) -> list[list[int]]:
-    rows, cols = pattern_length + 1, target_length + 1
-    d = []
-    for _ in range(rows):
-        d.append([0] * cols)
-    for i in range(rows):
-        d[i][0] = i
-    for j in range(cols):
-        d[0][j] = j
-    return d
+            row_minimum = min(row_minimum, left)
+        if row_minimum > limit:
+            return too_far
+        previous, current = current, previous
+    return min(previous[-1], too_far)
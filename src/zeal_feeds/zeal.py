@@ -2,23 +2,46 @@
 
 from __future__ import annotations
 
+import contextlib
+import glob
+import hashlib
 import json
+import os
+import shutil
 import sys
-import tarfile
-from collections.abc import Iterator
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
 from configparser import ConfigParser
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Optional
 
 import attrs
 from cattrs import Converter
-from platformdirs import user_config_path
+from platformdirs import user_config_path, user_data_path
 
-from . import ApplicationError
+from . import APP_NAME, ApplicationError, timings
 from .console import console
 from .user_contrib import DocSet
 
+if TYPE_CHECKING:
+    import tarfile
+
 FEED_URL = "https://zealusercontributions.vercel.app/api/docsets/{name}.xml"
 
+_READ_SIZE = 1_048_576
+"""Bytes to read at a time when skipping the end of an archive stream."""
+
+_STALE_STAGING_AGE = 3_600
+"""Seconds before a staging folder is assumed to be left by an interrupted install."""
+
+_MTIME_GRANULARITY_NS = 2_000_000_000
+"""Coarsest modification time resolution expected from a file system (FAT's)."""
+
+RenameCallback = Callable[[str], None]
+"""Called with the archive's docset folder name, when it is renamed while installing."""
+
 
 @attrs.define
 class MetaData:
@@ -31,11 +54,56 @@ class MetaData:
     urls: list[str]
 
 
+@attrs.define
+class InstalledDocSet:
+    """Summary of an installed docset, from its `meta.json` file."""
+
+    name: str
+    folder: str
+    mtime_ns: int
+    """Modification time of `meta.json`, to detect changes."""
+    # *cattrs* evaluations this type hint, so we cannot use | when <= py3.10
+    version: Optional[str] = None
+    feed_url: Optional[str] = None
+    urls: list[str] = attrs.field(factory=list)
+
+
+@attrs.define
+class Manifest:
+    """Cached list of the docsets installed in a docset folder.
+
+    The manifest is trusted while the docset folder's modification time is unchanged,
+    otherwise only the `meta.json` files that have changed are read again.
+    Like git's "racy" index check, the manifest is not trusted if the folder was
+    modified within the file system's timestamp resolution of the scan,
+    since a docset added in the same tick would not change the modification time.
+
+    """
+
+    mtime_ns: int = 0
+    """Modification time of the docset folder when the manifest was saved."""
+    scanned_at_ns: int = 0
+    """Time the docset folder was scanned."""
+
+    def is_current(self, mtime_ns: int) -> bool:
+        """Check whether the manifest is up to date with the docset folder."""
+        return (
+            mtime_ns == self.mtime_ns
+            and self.scanned_at_ns - mtime_ns >= _MTIME_GRANULARITY_NS
+        )
+
+    docsets: dict[str, InstalledDocSet] = attrs.field(factory=dict)
+    """Installed docsets, keyed by folder name."""
+
+
 @attrs.define
 class Zeal:
     """Class for interacting with the installed Zeal application."""
 
     docset_path: Path
+    _lock: threading.Lock = attrs.field(
+        factory=threading.Lock, init=False, repr=False, eq=False
+    )
 
     @classmethod
     def load_config(cls, config_file: str):
@@ -58,43 +126,348 @@ class Zeal:
 
     def installed_docsets(self) -> Iterator[str]:
         """List of locally installed DocSets."""
-        for meta_json in self.docset_path.glob("*/meta.json"):
-            metadata = json.load(meta_json.open("r"))
-            yield metadata["name"]
+        for docset in self.installed_metadata():
+            yield docset.name
+
+    def installed_metadata(self) -> list[InstalledDocSet]:
+        """Metadata for the locally installed DocSets (that have a `meta.json`)."""
+        with self._lock:
+            manifest = self._load_manifest()
+            if not manifest.is_current(self._docset_path_mtime()):
+                manifest = self._refresh_manifest(manifest)
+                self._save_manifest(manifest)
+        return list(manifest.docsets.values())
+
+    def _refresh_manifest(self, manifest: Manifest) -> Manifest:
+        """Update the manifest for any `meta.json` files that have changed."""
+        scanned_at_ns = time.time_ns()
+        refreshed = Manifest(
+            mtime_ns=self._docset_path_mtime(), scanned_at_ns=scanned_at_ns
+        )
+        for entry in os.scandir(self.docset_path):
+            if not entry.is_dir():
+                continue
+            meta_json = Path(entry.path) / "meta.json"
+            try:
+                mtime_ns = meta_json.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            cached = manifest.docsets.get(entry.name)
+            if cached and cached.mtime_ns == mtime_ns:
+                refreshed.docsets[entry.name] = cached
+            elif installed := _read_meta_json(meta_json, entry.name, mtime_ns):
+                refreshed.docsets[entry.name] = installed
+        return refreshed
+
+    def _manifest_file(self) -> Path:
+        """Manifest location, in the application data folder.
+
+        It is not saved in the docset folder,
+        since saving it would change the folder's modification time.
+
+        """
+        path_hash = hashlib.sha256(str(self.docset_path.resolve()).encode())
+        return user_data_path(APP_NAME) / "installed" / f"{path_hash.hexdigest()}.json"
+
+    def _load_manifest(self) -> Manifest:
+        try:
+            raw_manifest = json.loads(self._manifest_file().read_text())
+            return Converter().structure(raw_manifest, Manifest)
+        except (OSError, ValueError, TypeError, KeyError):
+            return Manifest()
+
+    def _save_manifest(self, manifest: Manifest) -> None:
+        manifest_file = self._manifest_file()
+        manifest_file.parent.mkdir(exist_ok=True, parents=True)
+        temp_file = manifest_file.with_name(f"{manifest_file.name}.tmp")
+        temp_file.write_text(json.dumps(Converter().unstructure(manifest)))
+        temp_file.replace(manifest_file)
+
+    def _docset_path_mtime(self) -> int:
+        return self.docset_path.stat().st_mtime_ns
+
+    def install_docset(
+        self,
+        docset: DocSet,
+        tarball: Path,
+        *,
+        replace: bool = False,
+        on_rename: RenameCallback | None = None,
+    ) -> None:
+        """Install a docset into the Zeal data directory.
+
+        If `replace` is set, an installed copy of the docset is removed first.
+        `on_rename` is called if the archive's docset folder has the wrong name.
+
+        """
+        import tarfile
 
-    def install_docset(self, docset: DocSet, tarball: Path) -> None:
-        """Install a docset into the Zeal data directory."""
-        # TODO: don't install if docset already installed
         with tarfile.open(tarball) as docset_archive:
-            docset_folder = docset_archive.next()
-            if not (docset_folder and docset_folder.name.endswith(".docset")):
-                raise ApplicationError(f"Unexpected contents for {docset.name} archive")
-            docset_archive.extractall(self.docset_path)
+            self._extract_docset(docset, docset_archive, replace, on_rename)
+
+    def install_docset_stream(
+        self,
+        docset: DocSet,
+        stream: BinaryIO,
+        *,
+        replace: bool = False,
+        on_rename: RenameCallback | None = None,
+    ) -> None:
+        """Install a docset while reading the archive from a stream.
+
+        Members are extracted as they are read,
+        so the archive can be installed as it is downloaded.
+        The stream is read to the end before the docset is moved into place,
+        so a stream that checks the archive (like `download.ArchiveStream`)
+        can still prevent the install by raising an error.
+
+        """
+        import tarfile
+
+        with tarfile.open(fileobj=stream, mode="r|*") as docset_archive:
+            self._extract_docset(docset, docset_archive, replace, on_rename, stream)
+
+    def link_docset(
+        self, docset: DocSet, source: Path, *, replace: bool = False
+    ) -> None:
+        """Install a docset from a copy installed in another docset folder.
+
+        The files are hard linked, so the copies share disk space,
+        and are copied if they cannot be linked (such as on another file system).
+        `meta.json` is written for this folder, and the search index is copied,
+        since Zeal adds its own indexes to it.
+
+        """
+
+        def link(staging_path: Path) -> None:
+            with timings.phase("link", docset.name) as phase:
+                phase.files = _link_tree(source, staging_path / f"{docset.name}.docset")
+
+        self._stage_docset(docset, replace, link)
+
+    def _extract_docset(
+        self,
+        docset: DocSet,
+        docset_archive: tarfile.TarFile,
+        replace: bool,
+        on_rename: RenameCallback | None,
+        stream: BinaryIO | None = None,
+    ) -> None:
+        """Extract the docset, ensuring the docset folder is given the correct name.
+
+        The rest of the archive `stream` (if any) is read after extracting,
+        as the archive can end with padding that is not part of the tar file.
 
-        # ensure docset folder given the correct name
-        expected_folder_name = f"{docset.name}.docset"
-        if docset_folder.name != expected_folder_name:
-            console.print(
-                f"Fixing folder name for {docset.name!r}:", expected_folder_name
+        """
+
+        def extract(staging_path: Path) -> None:
+            with timings.phase("extract", docset.name) as phase:
+                members = _rename_docset_folder(docset, docset_archive, on_rename)
+                if timings.recorder().enabled:
+                    members = _count_members(members, phase)
+                docset_archive.extractall(staging_path, members=members)
+                if stream is not None:
+                    while stream.read(_READ_SIZE):
+                        pass
+
+        self._stage_docset(docset, replace, extract)
+
+    def _stage_docset(
+        self, docset: DocSet, replace: bool, fill: Callable[[Path], None]
+    ) -> None:
+        """Create the docset in a staging folder (with `fill`), then move it into place.
+
+        The staging folder is next to the docset folder,
+        so Zeal never sees a partially installed docset.
+        Staging folders left by interrupted installs are removed first.
+
+        """
+        folder = f"{docset.name}.docset"
+        destination = self.docset_path / folder
+        if destination.exists() and not replace:
+            raise ApplicationError(f"Destination folder already exists: {destination}")
+
+        self._remove_stale_staging(docset)
+        staging_path = Path(
+            tempfile.mkdtemp(prefix=f".{docset.name}-", dir=self.docset_path)
+        )
+        try:
+            fill(staging_path)
+
+            converter = Converter()
+            metadata = MetaData(
+                name=docset.name,
+                title=docset.title,
+                version=docset.version,
+                urls=docset.urls,
+                feed_url=FEED_URL.format(name=docset.name),
             )
-            destination = self.docset_path / expected_folder_name
-            if destination.exists():
-                raise ApplicationError(
-                    f"Destination folder already exists: {destination}"
+            meta_json = staging_path / folder / "meta.json"
+            meta_json.write_text(json.dumps(converter.unstructure(metadata), indent=2))
+            mtime_ns = meta_json.stat().st_mtime_ns
+
+            with timings.phase("swap folder", docset.name):
+                _swap_folder(
+                    staging_path / folder, destination, staging_path / "previous"
                 )
-            source = self.docset_path / docset_folder.name
-            source.rename(destination)
-
-        converter = Converter()
-        meta_json = self.docset_path / expected_folder_name / "meta.json"
-        metadata = MetaData(
-            name=docset.name,
-            title=docset.title,
-            version=docset.version,
-            urls=docset.urls,
-            feed_url=FEED_URL.format(name=docset.name),
-        )
-        json.dump(converter.unstructure(metadata), meta_json.open("w"), indent=2)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+        self._add_to_manifest(metadata, folder, mtime_ns)
+
+    def _remove_stale_staging(self, docset: DocSet) -> None:
+        """Remove the docset's staging folders that have not changed recently.
+
+        Recent folders are kept, as another install might still be using them.
+
+        """
+        prefix = f".{docset.name}-"
+        stale_before = time.time() - _STALE_STAGING_AGE
+        for path in self.docset_path.glob(f"{glob.escape(prefix)}*"):
+            # `tempfile.mkdtemp` adds 8 random characters,
+            # so longer names are for other docsets with this name as a prefix
+            if len(path.name) != len(prefix) + 8:
+                continue
+            with contextlib.suppress(OSError):
+                if path.is_dir() and path.stat().st_mtime < stale_before:
+                    shutil.rmtree(path)
+
+    def _add_to_manifest(self, metadata: MetaData, folder: str, mtime_ns: int) -> None:
+        """Record a newly installed docset, so its `meta.json` is not read again.
+
+        The folder's modification time is not updated,
+        since other changes might have been made, so the next check still looks for
+        changed `meta.json` files.
+
+        """
+        with self._lock:
+            manifest = self._load_manifest()
+            manifest.docsets[folder] = InstalledDocSet(
+                name=metadata.name,
+                folder=folder,
+                mtime_ns=mtime_ns,
+                version=metadata.version,
+                feed_url=metadata.feed_url,
+                urls=metadata.urls,
+            )
+            self._save_manifest(manifest)
+
+
+def _count_members(
+    members: Iterator[tarfile.TarInfo], phase: timings.Phase
+) -> Iterator[tarfile.TarInfo]:
+    """Count the files, and their uncompressed size, as they are extracted."""
+    phase.files, phase.bytes = 0, 0
+    for member in members:
+        if member.isfile():
+            phase.files += 1
+            phase.bytes += member.size
+        yield member
+
+
+def _rename_docset_folder(
+    docset: DocSet,
+    docset_archive: tarfile.TarFile,
+    on_rename: RenameCallback | None = None,
+) -> Iterator[tarfile.TarInfo]:
+    """Yield archive members, moved into the expected docset folder.
+
+    Renaming while extracting avoids another pass over the extracted files.
+
+    """
+    expected_folder_name = f"{docset.name}.docset"
+    docset_folder = None
+    for member in docset_archive:
+        folder, separator, path = member.name.removeprefix("./").partition("/")
+        if docset_folder is None:
+            docset_folder = folder
+            if not docset_folder.endswith(".docset"):
+                raise ApplicationError(f"Unexpected contents for {docset.name} archive")
+            if docset_folder != expected_folder_name and on_rename:
+                on_rename(docset_folder)
+        if folder != docset_folder:
+            # only the docset folder is installed
+            continue
+        member.name = f"{expected_folder_name}{separator}{path}"
+        if member.islnk():
+            link_folder, separator, path = member.linkname.removeprefix("./").partition(
+                "/"
+            )
+            if link_folder == docset_folder:
+                member.linkname = f"{expected_folder_name}{separator}{path}"
+        yield member
+
+    if docset_folder is None:
+        raise ApplicationError(f"Unexpected contents for {docset.name} archive")
+
+
+def _link_tree(source: Path, destination: Path) -> int:
+    """Hard link the files of a docset folder into a new folder.
+
+    Returns the number of files linked or copied.
+    The top level `meta.json` is left out, since each folder has its own.
+
+    """
+    files = 0
+    can_link = True
+
+    def link_or_copy(source_file: str, destination_file: str) -> None:
+        nonlocal files, can_link
+        files += 1
+        if can_link and not source_file.endswith(".dsidx"):
+            try:
+                os.link(source_file, destination_file)
+                return
+            except OSError:
+                # probably another file system, so do not try linking again
+                can_link = False
+        shutil.copy2(source_file, destination_file)
+
+    def ignore(folder: str, names: list[str]) -> list[str]:
+        return ["meta.json"] if Path(folder) == source else []
+
+    shutil.copytree(
+        source, destination, symlinks=True, ignore=ignore, copy_function=link_or_copy
+    )
+    return files
+
+
+def _swap_folder(source: Path, destination: Path, backup: Path) -> None:
+    """Move a folder into place, replacing any existing folder.
+
+    Any existing folder is renamed to `backup` first (and restored if the move fails),
+    so the destination is only missing between two renames.
+
+    """
+    replacing = destination.exists()
+    if replacing:
+        destination.rename(backup)
+    try:
+        source.rename(destination)
+    except OSError:
+        if replacing:
+            backup.rename(destination)
+        raise
+
+
+def _read_meta_json(
+    meta_json: Path, folder: str, mtime_ns: int
+) -> InstalledDocSet | None:
+    """Read the parts of `meta.json` that are needed, which Zeal also writes."""
+    try:
+        metadata = json.loads(meta_json.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(metadata, dict) or "name" not in metadata:
+        return None
+    return InstalledDocSet(
+        name=metadata["name"],
+        folder=folder,
+        mtime_ns=mtime_ns,
+        version=metadata.get("version"),
+        feed_url=metadata.get("feed_url"),
+        urls=metadata.get("urls", []),
+    )
 
 
 def _find_linux_config_file() -> Path:
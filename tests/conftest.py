@@ -11,3 +11,12 @@ import pytest
 def data_folder() -> Path:
     """Fixture to simplify accessing test data files."""
     return Path(__file__).parent / "data"
+
+
+@pytest.fixture(autouse=True)
+def user_folders(tmp_path_factory, monkeypatch) -> Path:
+    """Keep the application's data and cache files out of the real user folders."""
+    user_folder = tmp_path_factory.mktemp("user")
+    monkeypatch.setenv("XDG_DATA_HOME", str(user_folder / "data"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(user_folder / "cache"))
+    return user_folder
@@ -0,0 +1,212 @@
+"""Test functionality in the `api` module."""
+
+from __future__ import annotations
+
+import asyncio
+import shutil
+import threading
+import time
+
+from zeal_feeds import api, download, user_contrib
+from zeal_feeds.api import Event, IndexOptions, InstallOptions, Stage
+from zeal_feeds.mirrors import MirrorStats
+from zeal_feeds.transport import default_transport
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor, DocSetCollection
+from zeal_feeds.zeal import Zeal
+
+
+def _docset(name: str, version: str = "1.0") -> DocSet:
+    return DocSet(
+        name=name,
+        author=DocSetAuthor(name="", link=""),
+        archive=f"{name}.tgz",
+        version=version,
+        urls=[f"https://example.com/{name}.tgz"],
+    )
+
+
+def test_load_index_events(monkeypatch):
+    """Verify index events are delivered in the event loop's thread."""
+    index = DocSetCollection([_docset("attrs")])
+    monkeypatch.setattr(user_contrib, "load_cached_index", lambda max_age, url: index)
+    events = []
+
+    def on_event(event):
+        events.append((event, threading.get_ident()))
+
+    async def load():
+        return await api.load_index(IndexOptions(ttl=60), on_event=on_event)
+
+    assert asyncio.run(load()) is index
+    assert events == [(Event(Stage.CACHED_INDEX), threading.get_ident())]
+
+
+def test_install_concurrently(data_folder, tmp_path, monkeypatch):
+    """Verify installs run `jobs` at a time, and failures are reported."""
+    running, most_running = 0, 0
+    lock = threading.Lock()
+
+    def fake_download(docset, destination, mirror_stats, on_progress, sha256=None):
+        nonlocal running, most_running
+        with lock:
+            running += 1
+            most_running = max(most_running, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        if docset.name == "broken":
+            raise OSError("mirror unavailable")
+        on_progress(10, 10)
+        destination.parent.mkdir(exist_ok=True, parents=True)
+        shutil.copy(data_folder / "wxPython.tgz", destination)
+        return destination
+
+    monkeypatch.setattr(api, "user_cache_path", lambda app_name: tmp_path)
+    monkeypatch.setattr(download, "download_archive", fake_download)
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    zeal = Zeal(tmp_path / "docsets")
+    zeal.docset_path.mkdir()
+    docsets = [_docset("broken"), _docset("wxPython"), _docset("other")]
+    events = []
+
+    failures = asyncio.run(
+        api.install(
+            zeal,
+            docsets,
+            InstallOptions(jobs=2, dry_run=True),
+            on_event=events.append,
+        )
+    )
+
+    assert failures == {"broken": "mirror unavailable"}
+    assert most_running == 2
+    assert Event(Stage.DOWNLOADING, "wxPython", 10, 10) in events
+    assert Event(Stage.DOWNLOADED, "wxPython") in events
+    assert not any(event.stage is Stage.INSTALLED for event in events)
+
+
+def test_install_calls_share_downloads(data_folder, tmp_path, monkeypatch):
+    """Verify concurrent installs of the same docset download it once."""
+    downloads = []
+
+    def fake_download(docset, destination, mirror_stats, on_progress, sha256=None):
+        downloads.append(destination)
+        time.sleep(0.05)
+        destination.parent.mkdir(exist_ok=True, parents=True)
+        shutil.copy(data_folder / "wxPython.tgz", destination)
+        return destination
+
+    monkeypatch.setattr(api, "user_cache_path", lambda app_name: tmp_path)
+    monkeypatch.setattr(download, "download_archive", fake_download)
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    zeals = [Zeal(tmp_path / name) for name in ("first", "second")]
+    for zeal in zeals:
+        zeal.docset_path.mkdir()
+
+    async def install_all():
+        return await asyncio.gather(
+            *(api.install(zeal, [_docset("wxPython")]) for zeal in zeals)
+        )
+
+    assert asyncio.run(install_all()) == [{}, {}]
+    assert downloads == [tmp_path / "downloads" / "wxPython.tgz"]
+    for zeal in zeals:
+        assert (zeal.docset_path / "wxPython.docset" / "meta.json").is_file()
+
+
+def test_update(data_folder, tmp_path, monkeypatch, capsys):
+    """Verify outdated docsets are installed over the old version."""
+    zeal = Zeal(tmp_path / "docsets")
+    zeal.docset_path.mkdir()
+    archive = tmp_path / "wxPython.tgz"
+    shutil.copy(data_folder / "wxPython.tgz", archive)
+    zeal.install_docset(_docset("wxPython", "1.0"), archive)
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    monkeypatch.setattr(
+        download, "download_archive", lambda *args, **kwargs: archive.resolve()
+    )
+    index = DocSetCollection([_docset("wxPython", "2.0")])
+
+    (outdated,) = api.outdated(zeal, index)
+    assert (outdated.installed.version, outdated.docset.version) == ("1.0", "2.0")
+
+    events = []
+    failures = asyncio.run(
+        api.update(zeal, index, InstallOptions(cache_size=0), on_event=events.append)
+    )
+
+    assert failures == {}
+    assert api.outdated(zeal, index) == []
+    # the archive's folder has a different name, which is reported but not printed
+    assert Event(Stage.RENAMED, "wxPython") in events
+    assert capsys.readouterr().out == ""
+
+
+def test_install_several_folders(data_folder, tmp_path, monkeypatch):
+    """Verify a docset is extracted once, and linked into the other folders."""
+    zeals = [Zeal(tmp_path / name) for name in ("first", "second", "third")]
+    for zeal in zeals:
+        zeal.docset_path.mkdir()
+    (zeals[0].docset_path / "wxPython.docset").mkdir()
+    archive = tmp_path / "wxPython.tgz"
+    shutil.copy(data_folder / "wxPython.tgz", archive)
+    installs = []
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    monkeypatch.setattr(
+        download, "download_archive", lambda *args, **kwargs: archive.resolve()
+    )
+    original_install = Zeal.install_docset
+    monkeypatch.setattr(
+        Zeal,
+        "install_docset",
+        lambda zeal, *args, **kwargs: (
+            installs.append(zeal),
+            original_install(zeal, *args, **kwargs),
+        ),
+    )
+
+    failures = asyncio.run(api.install(zeals, [_docset("wxPython")]))
+
+    assert failures == {}
+    # the first folder already has the docset, so it is not replaced
+    assert installs == [zeals[1]]
+    assert not (zeals[0].docset_path / "wxPython.docset" / "meta.json").exists()
+    icon = "wxPython.docset/icon.png"
+    assert (zeals[2].docset_path / icon).samefile(zeals[1].docset_path / icon)
+
+
+def test_install_stream_checks_digest(data_folder, tmp_path, monkeypatch):
+    """Verify a streamed archive that does not match its digest is not installed."""
+
+    class FakeResponse:
+        def __init__(self):
+            self.status_code = 200
+            self.headers = {}
+
+        def close(self):
+            return None
+
+        def raise_for_status(self):
+            return None
+
+        def iter_content(self, chunk_size):
+            yield (data_folder / "wxPython.tgz").read_bytes()
+
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    monkeypatch.setattr(MirrorStats, "rank", lambda self, urls: list(urls))
+    monkeypatch.setattr(
+        default_transport(), "get", lambda url, **kwargs: FakeResponse()
+    )
+    zeal = Zeal(tmp_path)
+
+    failures = asyncio.run(
+        api.install(
+            zeal,
+            [_docset("wxPython")],
+            InstallOptions(stream=True),
+            digests={"wxPython": "abc"},
+        )
+    )
+
+    assert failures["wxPython"].endswith("expected abc")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,71 @@
+"""Test functionality in the `archive_cache` module."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+
+from zeal_feeds.archive_cache import ArchiveCache, digest_path
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor
+
+
+def _docset(name: str, version: str) -> DocSet:
+    return DocSet(
+        name=name,
+        author=DocSetAuthor(name="", link=""),
+        archive=f"{name}.tgz",
+        version=version,
+    )
+
+
+def _add_archive(cache: ArchiveCache, docset: DocSet, size: int, last_used: int):
+    download = cache.path.parent / docset.archive
+    download.write_bytes(b"x" * size)
+    archive = cache.add(docset, download)
+    os.utime(archive, (last_used, last_used))
+
+
+def test_archive_cache_get(tmp_path):
+    """Verify archives are cached by docset version."""
+    cache = ArchiveCache(tmp_path / "archives")
+    docset = _docset("Alpinejs", "3.7.x/5_2021-12-14")
+    _add_archive(cache, docset, 10, 1_000)
+
+    assert cache.get(docset) == cache.archive_path(docset)
+    assert cache.get(_docset("Alpinejs", "3.8")) is None
+    (entry,) = cache.entries()
+    assert (entry.name, entry.version, entry.size) == ("Alpinejs", docset.version, 10)
+    assert entry.last_used > 1_000
+
+
+def test_archive_cache_prune(tmp_path):
+    """Verify the least recently used archives are removed first."""
+    cache = ArchiveCache(tmp_path / "archives", max_size=25)
+    _add_archive(cache, _docset("Old", "1"), 10, 1_000)
+    _add_archive(cache, _docset("Newer", "1"), 10, 2_000)
+    _add_archive(cache, _docset("Newest", "1"), 10, 3_000)
+
+    removed = cache.prune()
+
+    assert [entry.name for entry in removed] == ["Old"]
+    assert [entry.name for entry in cache.entries()] == ["Newest", "Newer"]
+    assert not (tmp_path / "archives" / "Old").exists()
+    assert len(cache.clear()) == 2
+
+
+def test_archive_cache_verify(tmp_path):
+    """Verify a cached archive that does not match its digest is removed."""
+    cache = ArchiveCache(tmp_path / "archives")
+    docset = _docset("Alpinejs", "3.8")
+    download = tmp_path / docset.archive
+    download.write_bytes(b"archive")
+    digest_path(download).write_text(hashlib.sha256(b"archive").hexdigest())
+    archive = cache.add(docset, download)
+
+    assert cache.verify(docset)
+    assert [entry.name for entry in cache.entries()] == ["Alpinejs"]
+
+    archive.write_bytes(b"corrupt")
+    assert not cache.verify(docset)
+    assert cache.get(docset) is None
+    assert cache.entries() == []
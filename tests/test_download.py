@@ -0,0 +1,190 @@
+"""Test functionality in the `download` module."""
+
+from __future__ import annotations
+
+import hashlib
+
+import pytest
+import requests
+
+from zeal_feeds import ApplicationError, download
+from zeal_feeds.mirrors import MirrorStats
+from zeal_feeds.transport import default_transport
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor
+
+ARCHIVE = bytes(range(256)) * 16
+
+DOCSET = DocSet(
+    name="Foo",
+    author=DocSetAuthor(name="", link=""),
+    archive="Foo.tgz",
+    version="1.0",
+    urls=["https://one.example.com/Foo.tgz", "https://two.example.com/Foo.tgz"],
+)
+
+
+class FakeResponse:
+    """Minimal stand-in for a streaming `requests.Response`."""
+
+    def __init__(self, content: bytes, *, offset: int = 0, fail_after: int = 0):
+        self.status_code = 206 if offset else 200
+        self.headers = {"content-length": str(len(content) - offset)}
+        if offset:
+            self.headers["content-range"] = (
+                f"bytes {offset}-{len(content) - 1}/{len(content)}"
+            )
+        self._content = content[offset:]
+        self._fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+    def close(self):  # noqa: D102
+        return None
+
+    def raise_for_status(self):  # noqa: D102
+        return None
+
+    def iter_content(self, chunk_size):  # noqa: D102
+        chunk_size = min(chunk_size, 512)
+        for start in range(0, len(self._content), chunk_size):
+            if self._fail_after and start >= self._fail_after:
+                raise requests.ConnectionError("connection reset")
+            yield self._content[start : start + chunk_size]
+
+
+@pytest.fixture
+def stats() -> MirrorStats:
+    """Mirror statistics that prefer the first example mirror."""
+    stats = MirrorStats()
+    stats.record_latency("one.example.com", 0.1)
+    stats.record_latency("two.example.com", 0.2)
+    return stats
+
+
+def test_download_fails_over_and_resumes(tmp_path, monkeypatch, stats):
+    """Verify a failed mirror is replaced, continuing from the received bytes."""
+    requested = []
+
+    def fake_get(url, headers, **kwargs):
+        requested.append((url, headers))
+        if "one" in url:
+            return FakeResponse(ARCHIVE, fail_after=1024)
+        return FakeResponse(ARCHIVE, offset=_range_offset(headers))
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    archive = download.download_archive(DOCSET, tmp_path / "Foo.tgz", stats)
+
+    assert archive.read_bytes() == ARCHIVE
+    assert requested == [
+        (DOCSET.urls[0], {}),
+        (DOCSET.urls[1], {"Range": "bytes=1024-"}),
+    ]
+    assert stats["one.example.com"].failures == 1
+
+
+def _range_offset(headers: dict[str, str]) -> int:
+    return int(headers["Range"][6:-1]) if headers else 0
+
+
+def test_download_resumes_previous_run(tmp_path, monkeypatch, stats):
+    """Verify a partial download from an earlier run is resumed."""
+    destination = tmp_path / "Foo.tgz"
+    (tmp_path / "Foo.tgz.part").write_bytes(ARCHIVE[:1000])
+    download.PartialDownload(size=len(ARCHIVE), mirror=DOCSET.urls[1]).save(
+        tmp_path / "Foo.tgz.part.json"
+    )
+    offsets = []
+
+    def fake_get(url, headers, **kwargs):
+        offsets.append(_range_offset(headers))
+        return FakeResponse(ARCHIVE, offset=_range_offset(headers))
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    download.download_archive(DOCSET, destination, stats)
+
+    assert offsets == [1000]
+    assert destination.read_bytes() == ARCHIVE
+    assert not (tmp_path / "Foo.tgz.part.json").exists()
+    # the digest includes the bytes from the earlier run
+    expected_digest = hashlib.sha256(ARCHIVE).hexdigest()
+    assert (tmp_path / "Foo.tgz.sha256").read_text().strip() == expected_digest
+
+
+def test_download_restarts_changed_archive(tmp_path, monkeypatch, stats):
+    """Verify a partial download is discarded if the archive size changed."""
+    destination = tmp_path / "Foo.tgz"
+    (tmp_path / "Foo.tgz.part").write_bytes(b"x" * 1000)
+    download.PartialDownload(size=10_000).save(tmp_path / "Foo.tgz.part.json")
+    offsets = []
+
+    def fake_get(url, headers, **kwargs):
+        offsets.append(_range_offset(headers))
+        return FakeResponse(ARCHIVE, offset=_range_offset(headers))
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    download.download_archive(DOCSET, destination, stats)
+
+    assert offsets == [1000, 0]
+    assert destination.read_bytes() == ARCHIVE
+
+
+def test_archive_stream_fails_over(monkeypatch, stats):
+    """Verify a stream continues from another mirror after an error."""
+    requested = []
+
+    def fake_get(url, headers, **kwargs):
+        requested.append((url, headers))
+        if "one" in url:
+            return FakeResponse(ARCHIVE, fail_after=1024)
+        return FakeResponse(ARCHIVE, offset=_range_offset(headers))
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    with download.ArchiveStream(DOCSET, stats) as stream:
+        assert stream.read() == ARCHIVE
+    assert requested[1] == (DOCSET.urls[1], {"Range": "bytes=1024-"})
+
+
+def test_download_all_mirrors_fail(tmp_path, monkeypatch, stats):
+    """Verify an error is raised when no mirror can provide the archive."""
+
+    def fake_get(url, headers, **kwargs):
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    with pytest.raises(ApplicationError, match="from any mirror"):
+        download.download_archive(DOCSET, tmp_path / "Foo.tgz", stats)
+    assert (tmp_path / "Foo.tgz.part").exists()
+
+
+def test_download_checks_digest(tmp_path, monkeypatch, stats):
+    """Verify an archive that does not match the expected digest is discarded."""
+    progress = []
+
+    def fake_get(url, headers, **kwargs):
+        return FakeResponse(ARCHIVE, offset=_range_offset(headers))
+
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    with pytest.raises(ApplicationError, match="expected 0000"):
+        download.download_archive(DOCSET, tmp_path / "Foo.tgz", stats, sha256="0000")
+    assert not (tmp_path / "Foo.tgz.part").exists()
+
+    download.download_archive(
+        DOCSET,
+        tmp_path / "Foo.tgz",
+        stats,
+        lambda downloaded, total: progress.append(downloaded),
+        sha256=hashlib.sha256(ARCHIVE).hexdigest(),
+    )
+    # progress updates are limited by time, but always include the last one
+    assert len(progress) < len(ARCHIVE) // 512
+    assert progress[-1] == len(ARCHIVE)
@@ -0,0 +1,73 @@
+"""Test functionality in the `lockfile` module."""
+
+from __future__ import annotations
+
+import pytest
+
+from zeal_feeds import ApplicationError
+from zeal_feeds.archive_cache import ArchiveCache, digest_path
+from zeal_feeds.lockfile import LockedDocSet, Lockfile
+from zeal_feeds.zeal import InstalledDocSet
+
+URL = "https://kapeli.com/feeds/zzz/user_contributed/build/pika/pika.tgz"
+
+
+def test_lockfile_from_installed(tmp_path):
+    """Verify the archive name comes from the URL, and the digest from the cache."""
+    cache = ArchiveCache(tmp_path / "archives")
+    installed = [
+        InstalledDocSet("pika", "pika.docset", 0, version="1.0.0b1", urls=[URL]),
+        InstalledDocSet("Alpinejs", "Alpinejs.docset", 0, version="3.8"),
+    ]
+    download = tmp_path / "pika.tgz"
+    download.write_bytes(b"archive")
+    digest_path(download).write_text("abc123\n")
+    cache.add(LockedDocSet("pika", "1.0.0b1", "pika.tgz", [URL]).to_docset(), download)
+
+    lockfile = Lockfile.from_installed(installed, cache)
+
+    assert lockfile.docsets == [
+        LockedDocSet("Alpinejs", "3.8"),
+        LockedDocSet("pika", "1.0.0b1", "pika.tgz", [URL], sha256="abc123"),
+    ]
+    assert [docset.resolved for docset in lockfile.docsets] == [False, True]
+
+
+def test_lockfile_load(tmp_path):
+    """Verify a saved lockfile loads, and duplicate docsets are removed."""
+    lockfile = Lockfile(
+        [
+            LockedDocSet("pika", "1.0", "pika.tgz", [URL]),
+            LockedDocSet("Alpinejs", "3.8"),
+            LockedDocSet("Pika", "1.1", "pika.tgz", [URL]),
+        ]
+    )
+    path = tmp_path / "docsets.lock"
+    path.write_text(lockfile.dump())
+
+    loaded = Lockfile.load(str(path))
+
+    assert loaded == lockfile
+    assert [(docset.name, docset.version) for docset in loaded.unique()] == [
+        ("Pika", "1.1"),
+        ("Alpinejs", "3.8"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("content", "error"),
+    [
+        (None, "Failed to read"),
+        ("{", "Invalid lockfile"),
+        ('{"docsets": [{"name": "pika"}]}', "Invalid lockfile"),
+        ('{"docsets": [], "version": 99}', "version 99"),
+    ],
+)
+def test_lockfile_load_errors(tmp_path, content, error):
+    """Verify problems with the lockfile are reported as application errors."""
+    path = tmp_path / "docsets.lock"
+    if content is not None:
+        path.write_text(content)
+
+    with pytest.raises(ApplicationError, match=error):
+        Lockfile.load(str(path))
@@ -0,0 +1,265 @@
+"""Test functionality in the `main` module."""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import shutil
+import subprocess
+import sys
+
+from platformdirs import user_data_path
+
+from zeal_feeds import APP_NAME, api, download, main
+from zeal_feeds.lockfile import LockedDocSet, Lockfile
+from zeal_feeds.mirrors import MirrorStats
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor, DocSetCollection
+from zeal_feeds.zeal import FEED_URL, Zeal
+
+
+def _docset(name: str, version: str = "1.0") -> DocSet:
+    return DocSet(
+        name=name,
+        author=DocSetAuthor(name="", link=""),
+        archive=f"{name}.tgz",
+        version=version,
+    )
+
+
+def _write_meta_json(docset_path, name, version, feed_url=None):
+    folder = docset_path / f"{name}.docset"
+    folder.mkdir(parents=True)
+    metadata = {"name": name, "version": version}
+    if feed_url:
+        metadata["feed_url"] = feed_url
+    (folder / "meta.json").write_text(json.dumps(metadata))
+
+
+def test_install_docsets_reports_failures(data_folder, tmp_path, monkeypatch):
+    """Verify a failed docset does not prevent the others from installing."""
+
+    def fake_download(docset, destination, mirror_stats, on_progress, sha256=None):
+        if docset.name == "broken":
+            raise OSError("mirror unavailable")
+        destination.parent.mkdir(exist_ok=True, parents=True)
+        shutil.copy(data_folder / "wxPython.tgz", destination)
+        return destination
+
+    monkeypatch.setattr(api, "user_cache_path", lambda app_name: tmp_path)
+    monkeypatch.setattr(download, "download_archive", fake_download)
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    zeal = Zeal(tmp_path / "docsets")
+    zeal.docset_path.mkdir()
+
+    failures = main._install_docsets(
+        zeal, [_docset("broken"), _docset("wxPython")], jobs=2, dry_run=False
+    )
+
+    assert failures == {"broken": "mirror unavailable"}
+    assert (zeal.docset_path / "wxPython.docset").is_dir()
+    assert not (tmp_path / "downloads" / "wxPython.tgz").exists()
+
+    # reinstalling uses the cached archive
+    monkeypatch.setattr(download, "download_archive", None)
+    failures = main._install_docsets(
+        zeal, [_docset("wxPython")], jobs=1, dry_run=False, replace=True
+    )
+    assert failures == {}
+
+
+def test_install_docsets_stream(data_folder, tmp_path, monkeypatch):
+    """Verify docsets can be installed while streaming the archive."""
+
+    class FakeStream(io.RawIOBase):
+        def __init__(self, docset, mirror_stats, on_progress, sha256=None):
+            self._archive = (data_folder / "wxPython.tgz").open("rb")
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            return self._archive.readinto(buffer)
+
+    monkeypatch.setattr(download, "ArchiveStream", FakeStream)
+    monkeypatch.setattr(MirrorStats, "load", lambda: MirrorStats())
+    zeal = Zeal(tmp_path)
+
+    failures = main._install_docsets(zeal, [_docset("wxPython")], jobs=1, stream=True)
+
+    assert failures == {}
+    assert (tmp_path / "wxPython.docset" / "meta.json").is_file()
+
+
+def test_update_outdated_docsets(tmp_path, monkeypatch):
+    """Verify only outdated docsets from the user contributed feeds are updated."""
+    _write_meta_json(tmp_path, "Current", "2.0", FEED_URL.format(name="Current"))
+    _write_meta_json(tmp_path, "Outdated", "1.0", FEED_URL.format(name="Outdated"))
+    _write_meta_json(tmp_path, "Official", "1.0")
+    index = DocSetCollection(
+        [
+            _docset("Current", "2.0"),
+            _docset("Outdated", "1.1"),
+            _docset("Official", "2"),
+        ]
+    )
+    installs = []
+
+    def fake_install_docsets(zeal, docsets, *, jobs, **options):
+        installs.append(([docset.name for docset in docsets], options))
+        return {}
+
+    monkeypatch.setattr(main, "_load_docset_index", lambda args: index)
+    monkeypatch.setattr(main, "_install_docsets", fake_install_docsets)
+    args = argparse.Namespace(
+        config=None, check=False, jobs=2, cache_size=0, stream=False
+    )
+    monkeypatch.setattr(Zeal, "find_config", lambda: Zeal(tmp_path))
+
+    assert main.update(args) is None
+    assert installs == [
+        (["Outdated"], {"cache_size": 0, "stream": False, "replace": True})
+    ]
+
+    args.check = True
+    assert main.update(args) is None
+    assert len(installs) == 1
+
+
+def test_cached_search_imports(data_folder):
+    """Verify a search with a cached index does not import the heavy modules."""
+    cache_folder = user_data_path(APP_NAME)
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    shutil.copy(data_folder / "docsets.json", cache_folder / "docsets.json")
+    command = [sys.executable, "-X", "importtime", "-m", "zeal_feeds", "search", "pika"]
+    # the first search writes the pre-parsed cache
+    subprocess.run(command, capture_output=True, check=True)
+
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+
+    # lines are "import time: <self us> | <cumulative us> | <indented module name>"
+    imported = {
+        line.rpartition("|")[2].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    assert "zeal_feeds.user_contrib" in imported
+    heavy_modules = {"requests", "urllib3", "tarfile", "cattrs", "rich.progress"}
+    assert imported & heavy_modules == set()
+
+
+def test_install_from_file(tmp_path, monkeypatch):
+    """Verify a lockfile installs without the index, skipping up to date docsets."""
+    _write_meta_json(tmp_path, "Current", "2.0", FEED_URL.format(name="Current"))
+    _write_meta_json(tmp_path, "Outdated", "1.0", FEED_URL.format(name="Outdated"))
+    lockfile = Lockfile(
+        [
+            LockedDocSet("Current", "2.0", "Current.tgz", ["https://a/Current.tgz"]),
+            LockedDocSet(
+                "Outdated", "1.1", "Outdated.tgz", ["https://a/Outdated.tgz"], "def"
+            ),
+            LockedDocSet("New", "1.0", "New.tgz", ["https://a/New.tgz"], "abc"),
+            LockedDocSet("new", "1.0", "New.tgz", ["https://a/New.tgz"], "abc"),
+        ]
+    )
+    (tmp_path / "docsets.lock").write_text(lockfile.dump())
+    installs = []
+
+    def fake_install_docsets(zeal, docsets, *, jobs, **options):
+        installs.append(([docset.name for docset in docsets], options))
+        return {}
+
+    def fail_load_docset_index(args):
+        raise AssertionError("index should not be loaded")
+
+    monkeypatch.setattr(main, "_load_docset_index", fail_load_docset_index)
+    monkeypatch.setattr(main, "_install_docsets", fake_install_docsets)
+    monkeypatch.setattr(Zeal, "find_config", lambda: Zeal(tmp_path))
+    args = argparse.Namespace(
+        docset=[],
+        from_file=str(tmp_path / "docsets.lock"),
+        docset_path=None,
+        config=None,
+        jobs=2,
+        cache_size=0,
+        dry_run=False,
+        stream=False,
+    )
+
+    assert main.install(args) is None
+    ((names, options),) = installs
+    assert names == ["Outdated", "new"]
+    assert options["digests"] == {"Outdated": "def", "new": "abc"}
+    assert options["replace"]
+
+
+def test_install_from_file_checks_versions(tmp_path, monkeypatch):
+    """Verify locked docsets without a digest have the locked version in the index."""
+    lockfile = Lockfile(
+        [
+            LockedDocSet("Unresolved", "1.0"),
+            LockedDocSet("NoDigest", "1.0", "NoDigest.tgz", ["https://a/NoDigest.tgz"]),
+        ]
+    )
+    (tmp_path / "docsets.lock").write_text(lockfile.dump())
+    index = DocSetCollection([_docset("Unresolved", "1.0"), _docset("NoDigest", "1.1")])
+    installs = []
+
+    def fake_install_docsets(zeal, docsets, *, jobs, **options):
+        installs.append([docset.name for docset in docsets])
+        return {}
+
+    monkeypatch.setattr(main, "_load_docset_index", lambda args: index)
+    monkeypatch.setattr(main, "_install_docsets", fake_install_docsets)
+    monkeypatch.setattr(Zeal, "find_config", lambda: Zeal(tmp_path))
+    args = argparse.Namespace(
+        docset=[],
+        from_file=str(tmp_path / "docsets.lock"),
+        docset_path=None,
+        config=None,
+        jobs=2,
+        cache_size=0,
+        dry_run=False,
+        stream=False,
+    )
+
+    error = main.install(args)
+    assert error is not None
+    assert "NoDigest (1.0 locked, 1.1 in index)" in error
+    assert "Unresolved" not in error
+    assert installs == []
+
+    index = DocSetCollection([_docset("Unresolved", "1.0"), _docset("NoDigest", "1.0")])
+    assert main.install(args) is None
+    assert installs == [["Unresolved", "NoDigest"]]
+
+
+def test_export(tmp_path, monkeypatch):
+    """Verify only user contributed docsets are exported."""
+    _write_meta_json(tmp_path, "Contrib", "2.0", FEED_URL.format(name="Contrib"))
+    _write_meta_json(tmp_path, "Official", "1.0")
+    monkeypatch.setattr(Zeal, "find_config", lambda: Zeal(tmp_path))
+    lockfile_path = tmp_path / "docsets.lock"
+
+    args = argparse.Namespace(config=None, file=str(lockfile_path))
+    assert main.export(args) is None
+
+    lockfile = Lockfile.load(str(lockfile_path))
+    assert [docset.name for docset in lockfile.docsets] == ["Contrib"]
+
+
+def test_export_stdout(tmp_path, capsys):
+    """Verify only the lockfile is written to standard output."""
+    _write_meta_json(tmp_path, "Contrib", "2.0", FEED_URL.format(name="Contrib"))
+    _write_meta_json(tmp_path, "Official", "1.0")
+    config_file = tmp_path / "Zeal.conf"
+    config_file.write_text(f"[docsets]\npath={tmp_path}\n")
+
+    args = argparse.Namespace(config=str(config_file), file="-")
+    assert main.export(args) is None
+
+    output = capsys.readouterr()
+    lockfile = json.loads(output.out)
+    assert [docset["name"] for docset in lockfile["docsets"]] == ["Contrib"]
+    assert "Installing docsets to" in output.err
+    assert "Skipping 'Official'" in output.err
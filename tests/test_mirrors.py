@@ -0,0 +1,65 @@
+"""Test functionality in the `mirrors` module."""
+
+from __future__ import annotations
+
+import time
+
+from zeal_feeds.mirrors import HostStats, MirrorStats
+
+URLS = [
+    "https://slow.example.com/foo.tgz",
+    "https://fast.example.com/foo.tgz",
+    "https://flaky.example.com/foo.tgz",
+]
+
+
+def test_rank_uses_saved_stats():
+    """Verify mirrors are ordered by estimated download time without probing."""
+    now = time.time()
+    stats = MirrorStats(
+        {
+            "slow.example.com": HostStats(latency=0.1, throughput=1e5, probed_at=now),
+            "fast.example.com": HostStats(latency=0.2, throughput=1e7, probed_at=now),
+            "flaky.example.com": HostStats(latency=0.1, failures=2, probed_at=now),
+        }
+    )
+
+    assert stats.rank(URLS) == [URLS[1], URLS[0], URLS[2]]
+
+
+def test_rank_probes_stale_hosts(monkeypatch):
+    """Verify hosts without recent measurements are probed."""
+    probed = []
+
+    def fake_probe(self, url):
+        probed.append(url)
+        self.record_latency(url.split("/")[2], 0.5 if "slow" in url else 0.1)
+
+    monkeypatch.setattr(MirrorStats, "probe", fake_probe)
+    stats = MirrorStats({"flaky.example.com": HostStats(probed_at=time.time())})
+
+    assert stats.rank(URLS[:2]) == [URLS[1], URLS[0]]
+    assert sorted(probed) == sorted(URLS[:2])
+
+
+def test_save_and_load(tmp_path):
+    """Verify statistics are saved between runs."""
+    stats_file = tmp_path / "mirrors.json"
+    stats = MirrorStats.load(stats_file)
+    stats.record_throughput("fast.example.com", 1_000_000, 2.0)
+    stats.save()
+
+    assert MirrorStats.load(stats_file)["fast.example.com"].throughput == 500_000
+
+
+def test_rank_unmeasured_throughput():
+    """Verify a host that was only probed is not ranked on its latency alone."""
+    now = time.time()
+    stats = MirrorStats(
+        {
+            "slow.example.com": HostStats(latency=0.2, probed_at=now),
+            "fast.example.com": HostStats(latency=0.1, throughput=1e7, probed_at=now),
+        }
+    )
+
+    assert stats.rank(URLS[:2]) == [URLS[1], URLS[0]]
@@ -0,0 +1,166 @@
+"""Test functionality in the `serve` module."""
+
+from __future__ import annotations
+
+import shutil
+import threading
+
+import pytest
+import requests
+from platformdirs import user_data_path
+
+from zeal_feeds import APP_NAME
+from zeal_feeds.archive_cache import ArchiveCache
+from zeal_feeds.mirrors import MirrorStats
+from zeal_feeds.serve import INDEX_PATH, DocsetProxy, DocsetServer
+from zeal_feeds.transport import default_transport
+
+ARCHIVE = bytes(range(100))
+
+
+@pytest.fixture
+def server(data_folder, tmp_path):
+    """Serve the test index, from the cache, on a free localhost port."""
+    cache_folder = user_data_path(APP_NAME) / "serve"
+    cache_folder.mkdir(parents=True)
+    shutil.copy(data_folder / "docsets.json", cache_folder / "docsets.json")
+    proxy = DocsetProxy(
+        upstream_url="https://example.com/api/docsets",
+        index_ttl=60,
+        cache=ArchiveCache(tmp_path / "archives"),
+        mirror_stats=MirrorStats(),
+    )
+    with DocsetServer(("127.0.0.1", 0), proxy) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+@pytest.fixture
+def upstream(monkeypatch) -> list[str]:
+    """Send the test archive from every mirror, recording the request methods."""
+    methods = []
+
+    def fake_request(method):
+        def request(url, **kwargs):
+            methods.append(method)
+            return FakeResponse(ARCHIVE)
+
+        return request
+
+    monkeypatch.setattr(default_transport(), "get", fake_request("GET"))
+    monkeypatch.setattr(default_transport(), "head", fake_request("HEAD"))
+    return methods
+
+
+class FakeResponse:
+    """Minimal stand-in for an upstream `requests.Response`."""
+
+    def __init__(self, content: bytes):
+        self.status_code = 200
+        self.headers = {"content-length": str(len(content))}
+        self._content = content
+
+    def close(self):  # noqa: D102
+        return None
+
+    def raise_for_status(self):  # noqa: D102
+        return None
+
+    def iter_content(self, chunk_size):  # noqa: D102
+        yield from (self._content[:50], self._content[50:])
+
+
+def _url(server: DocsetServer, path: str) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{path}"
+
+
+def test_serve_index(server):
+    """Verify the archive URLs point to the server, and the index can be revalidated."""
+    r = requests.get(_url(server, INDEX_PATH), timeout=5)
+    r.raise_for_status()
+    pika = next(docset for docset in r.json() if docset["name"] == "pika")
+    assert pika["urls"] == [_url(server, "/archives/pika/pika.tgz")]
+
+    etag_request = requests.get(
+        _url(server, INDEX_PATH),
+        headers={"If-None-Match": r.headers["ETag"]},
+        timeout=5,
+    )
+    date_request = requests.get(
+        _url(server, INDEX_PATH),
+        headers={"If-Modified-Since": r.headers["Last-Modified"]},
+        timeout=5,
+    )
+    assert etag_request.status_code == date_request.status_code == 304
+
+
+def test_serve_index_cache(server):
+    """Verify the server does not share the index cached by the other commands."""
+    client_index = user_data_path(APP_NAME) / "docsets.json"
+    client_index.write_text("[]")
+
+    r = requests.get(_url(server, INDEX_PATH), timeout=5)
+
+    assert len(r.json()) == 540
+    assert client_index.read_text() == "[]"
+
+
+def test_serve_archive(server, upstream):
+    """Verify an archive is downloaded once, and supports range requests."""
+    archive_url = _url(server, "/archives/pika/pika.tgz")
+
+    r = requests.get(archive_url, timeout=5)
+    assert r.content == ARCHIVE
+    partial = requests.get(archive_url, headers={"Range": "bytes=90-"}, timeout=5)
+    assert partial.status_code == 206
+    assert partial.headers["Content-Range"] == "bytes 90-99/100"
+    assert partial.content == ARCHIVE[90:]
+    if_range = requests.get(
+        archive_url, headers={"Range": "bytes=90-", "If-Range": '"old"'}, timeout=5
+    )
+    assert if_range.status_code == 200
+    unsatisfiable = requests.get(
+        archive_url, headers={"Range": "bytes=100-"}, timeout=5
+    )
+    assert unsatisfiable.status_code == 416
+    assert upstream.count("GET") == 1
+
+    assert (
+        requests.get(_url(server, "/archives/pika/other.tgz"), timeout=5).status_code
+        == 404
+    )
+    assert requests.get(_url(server, "/unknown"), timeout=5).status_code == 404
+
+
+def test_serve_archive_head(server, upstream):
+    """Verify a HEAD request for an archive that is not cached does not download it."""
+    archive_url = _url(server, "/archives/pika/pika.tgz")
+
+    head = requests.head(archive_url, timeout=5)
+
+    assert head.status_code == 200
+    assert head.headers["Content-Length"] == "100"
+    assert "GET" not in upstream
+    assert server.proxy.cache.entries() == []
+
+    # the first download is streamed, with the same validators as the cached archive
+    r = requests.get(archive_url, timeout=5)
+    assert r.content == ARCHIVE
+    assert r.headers["ETag"] == head.headers["ETag"]
+    assert [entry.size for entry in server.proxy.cache.entries()] == [100]
+
+
+@pytest.mark.parametrize("max_size", [0, 50])
+def test_serve_archive_over_cap(server, upstream, max_size):
+    """Verify an archive bigger than the cache is still sent after pruning."""
+    server.proxy.cache.max_size = max_size
+    archive_url = _url(server, "/archives/pika/pika.tgz")
+
+    for _ in range(2):
+        r = requests.get(archive_url, timeout=5)
+        assert r.status_code == 200
+        assert r.content == ARCHIVE
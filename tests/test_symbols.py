@@ -0,0 +1,145 @@
+"""Test functionality in the `symbols` module."""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sqlite3
+
+import pytest
+
+from zeal_feeds import symbols
+from zeal_feeds.symbols import DSIDX_PATH, Symbol, SymbolIndex
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor
+from zeal_feeds.zeal import Zeal
+
+
+@pytest.fixture
+def zeal(data_folder, tmp_path) -> Zeal:
+    """Docset folder with two copies of the wxPython docset."""
+    zeal = Zeal(tmp_path / "docsets")
+    zeal.docset_path.mkdir()
+    for name in ("wxPython", "wxCopy"):
+        docset = DocSet(
+            name=name,
+            author=DocSetAuthor(name="", link=""),
+            archive="wxPython.tgz",
+            version="4.0.7",
+        )
+        zeal.install_docset(docset, data_folder / "wxPython.tgz")
+    return zeal
+
+
+def test_query(zeal):
+    """Verify the combined index finds the same symbols as each docset's index."""
+    installed = zeal.installed_metadata()
+
+    results = symbols.query(zeal.docset_path, installed, "bell", 3, jobs=2)
+
+    assert results == [
+        Symbol("wx.Bell", "Function", "wx.functions.html#wx.Bell", "wxCopy"),
+        Symbol("wx.Bell", "Function", "wx.functions.html#wx.Bell", "wxPython"),
+        Symbol(
+            "wx.ListCtrl.EnableBellOnNoMatch",
+            "Method",
+            "wx.ListCtrl.html#wx.ListCtrl.EnableBellOnNoMatch",
+            "wxCopy",
+        ),
+    ]
+    for text in ("bell", "Frame.Show", "wx", "no such symbol"):
+        assert symbols.query(
+            zeal.docset_path, installed, text, 10, jobs=2
+        ) == symbols.search_docsets(zeal.docset_path, installed, text, 10, jobs=2)
+
+
+def test_refresh(zeal):
+    """Verify only new and changed docsets are indexed again."""
+    installed = zeal.installed_metadata()
+    index = SymbolIndex.open(zeal.docset_path)
+
+    assert index.refresh(zeal.docset_path, installed, jobs=2) == 2
+    assert index.refresh(zeal.docset_path, installed, jobs=2) == 0
+
+    dsidx = zeal.docset_path / "wxCopy.docset" / DSIDX_PATH
+    os.utime(dsidx, ns=(0, 0))
+    assert index.refresh(zeal.docset_path, installed, jobs=2) == 1
+    assert len(index.search("wx.Bell", 10)) == 2
+
+    remaining = [docset for docset in installed if docset.name == "wxPython"]
+    assert index.refresh(zeal.docset_path, remaining, jobs=2) == 0
+    assert [symbol.docset for symbol in index.search("wx.Bell", 10)] == ["wxPython"]
+    index.close()
+
+
+def test_unreadable_index(zeal, capsys):
+    """Verify a docset with a broken index is skipped."""
+    (zeal.docset_path / "wxCopy.docset" / DSIDX_PATH).write_text("not a database")
+    installed = zeal.installed_metadata()
+
+    for search in (symbols.query, symbols.search_docsets):
+        results = search(zeal.docset_path, installed, "wx.Bell", 10, 2)
+        assert [symbol.docset for symbol in results] == ["wxPython"]
+        assert "Skipping 'wxCopy'" in capsys.readouterr().out
+
+
+def test_unreadable_index_retried(zeal):
+    """Verify a docset whose index could not be read is tried again."""
+    dsidx = zeal.docset_path / "wxCopy.docset" / DSIDX_PATH
+    contents = dsidx.read_bytes()
+    dsidx.write_text("not a database")
+    mtime_ns = dsidx.stat().st_mtime_ns
+    installed = zeal.installed_metadata()
+    index = SymbolIndex.open(zeal.docset_path)
+
+    assert index.refresh(zeal.docset_path, installed, jobs=2) == 2
+
+    # the index is readable again, with the same modification time
+    dsidx.write_bytes(contents)
+    os.utime(dsidx, ns=(mtime_ns, mtime_ns))
+    assert index.refresh(zeal.docset_path, installed, jobs=2) == 1
+    assert len(index.search("wx.Bell", 10)) == 2
+    index.close()
+
+
+def test_read_ztoken_symbols(tmp_path):
+    """Verify symbols are read from Core Data search indexes."""
+    dsidx = tmp_path / "docSet.dsidx"
+    with contextlib.closing(sqlite3.connect(dsidx)) as connection, connection:
+        connection.executescript(
+            """
+            CREATE TABLE ZTOKEN (
+                Z_PK INTEGER PRIMARY KEY, ZTOKENNAME TEXT,
+                ZTOKENTYPE INTEGER, ZMETAINFORMATION INTEGER
+            );
+            CREATE TABLE ZTOKENTYPE (Z_PK INTEGER PRIMARY KEY, ZTYPENAME TEXT);
+            CREATE TABLE ZTOKENMETAINFORMATION (
+                Z_PK INTEGER PRIMARY KEY, ZFILE INTEGER, ZANCHOR TEXT
+            );
+            CREATE TABLE ZFILEPATH (Z_PK INTEGER PRIMARY KEY, ZPATH TEXT);
+            INSERT INTO ZTOKENTYPE VALUES (1, 'cl');
+            INSERT INTO ZFILEPATH VALUES (1, 'widget.html');
+            INSERT INTO ZTOKENMETAINFORMATION VALUES (1, 1, 'Widget'), (2, 1, NULL);
+            INSERT INTO ZTOKEN VALUES (1, 'Widget', 1, 1), (2, 'widget', 1, 2);
+            """
+        )
+
+    assert sorted(symbols.read_symbols(dsidx)) == [
+        ("Widget", "cl", "widget.html#Widget"),
+        ("widget", "cl", "widget.html"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("name", "expected"),
+    [
+        ("join", 0),
+        ("os.path.join", 1),
+        ("QString::join", 1),
+        ("joinpath", 2),
+        ("os.path.joinpath", 3),
+        ("os.path.split", 4),
+    ],
+)
+def test_match_rank(name, expected):
+    """Verify exact matches rank above prefixes and substrings."""
+    assert symbols._match_rank(name, "join") == expected
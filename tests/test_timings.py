@@ -0,0 +1,49 @@
+"""Test functionality in the `timings` module."""
+
+from __future__ import annotations
+
+import json
+import tarfile
+
+from zeal_feeds import main, timings
+from zeal_feeds.user_contrib import DocSet, DocSetAuthor
+from zeal_feeds.zeal import Zeal
+
+
+def test_timings_disabled():
+    """Verify nothing is recorded unless timings are enabled."""
+    recorder = timings.recorder()
+    with timings.phase("download", "Foo") as phase:
+        phase.bytes = 10
+
+    assert not recorder.enabled
+    assert not hasattr(recorder, "phases")
+
+
+def test_timings_install(data_folder, tmp_path, monkeypatch, capsys):
+    """Verify extracting a docset records the files and their size."""
+    monkeypatch.setattr(timings, "_recorder", timings.Recorder())
+    recorder = timings.recorder()
+    assert isinstance(recorder, timings.Recorder)
+    docset = DocSet(
+        name="wxPython",
+        author=DocSetAuthor(name="", link=""),
+        archive="wxPython.tgz",
+        version="1.0",
+    )
+
+    Zeal(tmp_path).install_docset(docset, data_folder / "wxPython.tgz")
+
+    with tarfile.open(data_folder / "wxPython.tgz") as archive:
+        files = [member for member in archive if member.isfile()]
+    extract, swap = recorder.phases
+    assert (extract.name, extract.docset) == ("extract", "wxPython")
+    assert extract.files == len(files)
+    assert extract.bytes == sum(member.size for member in files)
+    assert swap.name == "swap folder"
+
+    capsys.readouterr()
+    main._print_timings(recorder, "json")
+    report = json.loads(capsys.readouterr().err)
+    assert [phase["name"] for phase in report["totals"]] == ["extract", "swap folder"]
+    assert report["totals"][0]["files"] == len(files)
@@ -0,0 +1,80 @@
+"""Test functionality in the `transport` module."""
+
+from __future__ import annotations
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from zeal_feeds import transport
+from zeal_feeds.transport import Throttle, Transport
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fail the first request with a server error, then succeed."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: D102, N802
+        self.server.clients.append(self.client_address)
+        status = 503 if len(self.server.clients) == 1 else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):  # noqa: A002, D102
+        return
+
+
+@pytest.fixture
+def server():
+    """HTTP server on a free localhost port."""
+    with ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler) as server:
+        server.clients = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+
+def test_transport_retries_and_reuses_connections(server):
+    """Verify server errors are retried, on the same pooled connection."""
+    host, port = server.server_address[:2]
+    url = f"http://{host}:{port}/foo.tgz"
+    http = Transport(retry_backoff=0)
+
+    first = http.get(url)
+    second = http.get(url)
+    http.close()
+
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert len(server.clients) == 3
+    assert len(set(server.clients)) == 1
+    assert http.session(url) is http.session(f"http://{host}:{port}/bar.tgz")
+
+
+def test_retry_backoff_is_jittered():
+    """Verify the backoff is randomized, up to the exponential backoff."""
+    retry = transport._JitteredRetry(total=5, backoff_factor=1).increment()
+    retry = retry.increment().increment()
+    delays = {retry.get_backoff_time() for _ in range(20)}
+    assert len(delays) > 1
+    assert all(0 <= delay <= 4 for delay in delays)
+
+
+def test_throttle_limits_rate(monkeypatch):
+    """Verify receiving more than the rate waits for the excess."""
+    clock = [100.0]
+    sleeps = []
+    monkeypatch.setattr(transport.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(transport.time, "sleep", sleeps.append)
+    throttle = Throttle(1_000)
+
+    clock[0] += 0.5
+    throttle.consume(500)
+    throttle.consume(1_000)
+
+    assert sleeps == [1.0]
@@ -3,10 +3,14 @@
 from __future__ import annotations
 
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import attrs
 import pytest
 
 from zeal_feeds import user_contrib
+from zeal_feeds.transport import default_transport
 
 
 def test_parse_docset_index(data_folder):
@@ -94,6 +98,45 @@ def test_docset_collection_get(item, expected):
     assert COLLECTION.get(item) == expected
 
 
+def test_docset_collection_from_records():
+    """Verify a collection from records only creates the DocSets that are used."""
+    structured = []
+
+    def structure(docset):
+        structured.append(docset.name)
+        return docset
+
+    collection = user_contrib.DocSetCollection.from_records(
+        ((docset.name, docset.aliases, docset) for docset in DOCSETS.values()),
+        structure,
+    )
+
+    assert len(collection) == 4
+    assert collection["acme"] == DOCSETS["acme"]
+    assert list(collection.search("foo bar")) == [DOCSETS["foobar"]]
+    assert structured == ["ACME", "FooBar"]
+    assert list(collection) == list(COLLECTION)
+
+
+def test_docset_collection_from_records_threads():
+    """Verify a docset accessed from several threads at once is always found."""
+
+    def structure(docset):
+        time.sleep(0.01)
+        return attrs.evolve(docset)
+
+    collection = user_contrib.DocSetCollection.from_records(
+        ((docset.name, docset.aliases, docset) for docset in DOCSETS.values()),
+        structure,
+    )
+
+    with ThreadPoolExecutor(8) as executor:
+        docsets = list(executor.map(collection.get, ["acme"] * 8))
+
+    assert all(docset is docsets[0] for docset in docsets)
+    assert docsets[0] == DOCSETS["acme"]
+
+
 @pytest.mark.parametrize(
     ("search", "expected"),
     [
@@ -106,6 +149,47 @@ def test_docset_collection_search(search, expected):
     assert sorted(COLLECTION.search(search)) == sorted(expected)
 
 
+@pytest.mark.parametrize("search", ["a", "py", "Java", "doc", "_", "script", "zzz"])
+def test_docset_collection_search_index(data_folder, search):
+    """Verify the trigram index finds the same docsets as checking every docset."""
+    index_json = json.loads((data_folder / "docsets.json").read_text())
+    collection = user_contrib.DocSetCollection(
+        user_contrib._parse_docset_index(index_json)
+    )
+    text = search.lower()
+    expected = [
+        docset
+        for docset in collection.values()
+        if text in docset.name.lower()
+        or text in docset.title.lower()
+        or any(text in alias.lower() for alias in docset.aliases)
+    ]
+
+    assert list(collection.search(search)) == expected
+
+
+@pytest.mark.parametrize(
+    "search", ["pyhton", "djnago", "reakt", "jvaascript", "sqlalchemyy", "a", ""]
+)
+def test_docset_collection_fuzzy_search_index(data_folder, search):
+    """Verify the fuzzy search filters find the same docsets as checking every one."""
+    index_json = json.loads((data_folder / "docsets.json").read_text())
+    collection = user_contrib.DocSetCollection(
+        user_contrib._parse_docset_index(index_json)
+    )
+    limit = user_contrib.FUZZY_DISTANCE
+    expected = [
+        docset
+        for docset in collection.values()
+        if any(
+            user_contrib._bounded_edit_distance(search, field.lower(), limit) <= limit
+            for field in (docset.name, docset.title, *docset.aliases)
+        )
+    ]
+
+    assert list(collection.fallback_search(search)) == expected
+
+
 @pytest.mark.parametrize(
     ("search", "expected"),
     [
@@ -113,8 +197,205 @@ def test_docset_collection_search(search, expected):
         ("foobra", [DOCSETS["foobar"]]),
         ("acec", [DOCSETS["acme"]]),
         ("amecs", []),
+        ("foo-baz", [DOCSETS["foobar"]]),
+        ("beep bop", [DOCSETS["beep_beep"]]),
     ],
 )
 def test_docset_collection_fuzzy_search(search, expected):
     """Verify docset search functionality."""
     assert sorted(COLLECTION.fallback_search(search)) == sorted(expected)
+
+
+class FakeIndexResponse:
+    """Minimal stand-in for the `requests.Response` of the docset index."""
+
+    def __init__(self, index_json, status_code=200, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers or {}
+        self.content = b"" if index_json is None else json.dumps(index_json).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, chunk_size):  # noqa: D102
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+
+def test_index_conditional_request(data_folder, tmp_path, monkeypatch):
+    """Verify the cached index is revalidated instead of downloaded again."""
+    index_json = json.loads((data_folder / "docsets.json").read_text())
+    requests_headers = []
+
+    def fake_get(url, headers, stream):
+        requests_headers.append(headers)
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeIndexResponse(None, status_code=304)
+        return FakeIndexResponse(index_json, headers={"etag": '"v1"'})
+
+    monkeypatch.setattr(user_contrib, "user_data_path", lambda app_name: tmp_path)
+    monkeypatch.setattr(default_transport(), "get", fake_get)
+
+    first = user_contrib.user_contrib_index("https://example.com/api/docsets")
+    second = user_contrib.user_contrib_index("https://example.com/api/docsets")
+
+    assert requests_headers == [{}, {"If-None-Match": '"v1"'}]
+    assert len(first) == len(second) == 540
+    assert json.loads((tmp_path / "docsets.json").read_text()) == index_json
+    assert list(first.values()) == list(user_contrib._parse_docset_index(index_json))
+    assert user_contrib.load_cached_index(max_age=60) is not None
+    assert user_contrib.load_cached_index(max_age=-1) is None
+    url = "https://example.com/api/docsets"
+    assert user_contrib.load_cached_index(max_age=60, url=url) is not None
+    other_url = "http://lan:8080/api/docsets"
+    assert user_contrib.load_cached_index(max_age=60, url=other_url) is None
+
+
+def test_binary_index_cache(data_folder, tmp_path):
+    """Verify the pre-parsed cache matches the JSON, and is ignored when stale."""
+    cached_index = tmp_path / "docsets.json"
+    cached_index.write_bytes((data_folder / "docsets.json").read_bytes())
+    binary_index = tmp_path / "docsets.bin"
+    expected = list(
+        user_contrib._parse_docset_index(json.loads(cached_index.read_text()))
+    )
+
+    assert list(user_contrib._load_index_file(cached_index).values()) == expected
+    assert binary_index.exists()
+    docsets = user_contrib._read_binary_index(binary_index, cached_index)
+    assert docsets is not None
+    assert list(docsets.values()) == expected
+
+    cached_index.write_text("[]")
+    assert user_contrib._read_binary_index(binary_index, cached_index) is None
+    assert len(user_contrib._load_index_file(cached_index)) == 0
+
+
+def test_binary_index_search_index(data_folder, tmp_path, monkeypatch):
+    """Verify the search index is saved with the pre-parsed cache."""
+    cached_index = tmp_path / "docsets.json"
+    cached_index.write_bytes((data_folder / "docsets.json").read_bytes())
+    built = user_contrib._load_index_file(cached_index)
+
+    def fail_build(names, normalize):
+        raise AssertionError("search index should be loaded")
+
+    monkeypatch.setattr(user_contrib._SearchIndex, "build", fail_build)
+    docsets = user_contrib._read_binary_index(tmp_path / "docsets.bin", cached_index)
+
+    assert docsets is not None
+    for search in ("py", "Java", "pika", "zzz"):
+        assert docsets.ranked_search(search) == built.ranked_search(search)
+    assert list(docsets.fallback_search("pyhton")) == list(
+        built.fallback_search("pyhton")
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 65_536])
+def test_iter_json_array(data_folder, chunk_size):
+    """Verify an array is parsed element by element from chunks of any size."""
+    index = (data_folder / "docsets.json").read_text()
+    text = f'[{index}, [12, 3.5e1, "é", true], 100, [], {{}}, 4.5, 1e5, -0.25E-3]\n'
+    chunks = (text[i : i + chunk_size] for i in range(0, len(text), chunk_size))
+
+    assert list(user_contrib._iter_json_array(chunks)) == json.loads(text)
+
+
+@pytest.mark.parametrize(
+    "text", ["", "{}", "[1,]", "[1 2]", '[{"a": 1}', "[1] x", "[1", "[1,"]
+)
+def test_iter_json_array_errors(text):
+    """Verify invalid or truncated JSON is an error."""
+    chunks = (text[i : i + 2] for i in range(0, len(text), 2))
+    with pytest.raises(ValueError):
+        list(user_contrib._iter_json_array(chunks))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+@pytest.mark.parametrize("text", ["[4.5]", "[1e5]", "[-12.5E-1, 7]"])
+def test_iter_json_array_split_numbers(text, chunk_size):
+    """Verify a number split between chunks is parsed as one number."""
+    chunks = (text[i : i + chunk_size] for i in range(0, len(text), chunk_size))
+
+    assert list(user_contrib._iter_json_array(chunks)) == json.loads(text)
+
+
+def test_iter_json_array_error_position():
+    """Verify errors give their position in the whole input, not the read buffer."""
+    text = '[\n  {"a": 1},\n  {"b": 2}\n  {"c": 3}\n]'
+    chunks = (text[i : i + 4] for i in range(0, len(text), 4))
+
+    with pytest.raises(json.JSONDecodeError) as exc_info:
+        list(user_contrib._iter_json_array(chunks))
+
+    position = text.index('{"c"')
+    assert (exc_info.value.pos, exc_info.value.lineno, exc_info.value.colno) == (
+        position,
+        4,
+        3,
+    )
+    assert str(exc_info.value).endswith(f"line 4 column 3 (char {position})")
+
+
+def test_stream_index_invalid(tmp_path):
+    """Verify an invalid index does not replace the cached index."""
+    cached_index = tmp_path / "docsets.json"
+    cached_index.write_text("[]")
+
+    with pytest.raises(ValueError):
+        user_contrib._stream_index([b'[{"name": "pi', b"\xc3"], cached_index)
+
+    assert cached_index.read_text() == "[]"
+    assert list(tmp_path.iterdir()) == [cached_index]
+
+
+@pytest.mark.parametrize(
+    ("search", "limit", "expected"),
+    [
+        ("foo", None, [("foo", "EXACT"), ("foobar", "PREFIX")]),
+        ("bar", None, [("foobar", "SUBSTRING")]),
+        ("beep b", None, [("beep_beep", "PREFIX")]),
+        ("o-b", None, [("foobar", "ALIAS")]),
+        ("fo", 1, [("foo", "PREFIX")]),
+        ("acm", None, [("acme", "PREFIX")]),
+        ("aceme", None, [("acme", "FUZZY")]),
+    ],
+)
+def test_docset_collection_ranked_search(search, limit, expected):
+    """Verify search results are ordered by relevance."""
+    results = COLLECTION.ranked_search(search, limit=limit)
+
+    assert [(r.docset.name.lower(), r.rank.name) for r in results] == expected
+
+
+def _edit_distance(pattern: str, target: str) -> int:
+    """Unbounded Levenshtein distance, for comparison."""
+    previous = list(range(len(target) + 1))
+    for i, pattern_char in enumerate(pattern, start=1):
+        current = [i]
+        for j, target_char in enumerate(target, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (pattern_char != target_char),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize("limit", [0, 1, 2, 3])
+def test_bounded_edit_distance(limit):
+    """Verify the bounded edit distance matches the full calculation."""
+    words = ["", "a", "ab", "acme", "amce", "acmes", "foobar", "foo bar", "barfoo"]
+    for pattern in words:
+        for target in words:
+            expected = min(_edit_distance(pattern, target), limit + 1)
+            assert (
+                user_contrib._bounded_edit_distance(pattern, target, limit) == expected
+            ), (pattern, target)
@@ -2,6 +2,15 @@
 
 from __future__ import annotations
 
+import json
+import os
+import tarfile
+import time
+
+import pytest
+
+from zeal_feeds import ApplicationError
+from zeal_feeds import zeal as zeal_module
 from zeal_feeds.user_contrib import DocSet, DocSetAuthor
 from zeal_feeds.zeal import Zeal
 
@@ -27,3 +36,139 @@ def test_docset_install_wrong_folder_name(data_folder, tmp_path) -> None:
     zeal.install_docset(docset_meta, docset_tarball)
     print("Directory contents:", list(tmp_path.iterdir()))
     assert (tmp_path / f"{docset_name}.docset").is_dir()
+
+
+def test_installed_docsets_manifest(data_folder, tmp_path, monkeypatch) -> None:
+    """Verify installed docsets are cached, only reading changed `meta.json` files."""
+    zeal = Zeal(tmp_path)
+    docset_meta = DocSet(
+        name="wxPython",
+        author=DocSetAuthor(name="", link=""),
+        archive="wxPython.tgz",
+        version="4.0.7",
+    )
+    zeal.install_docset(docset_meta, data_folder / "wxPython.tgz")
+    other_docset = tmp_path / "Other.docset"
+    other_docset.mkdir()
+    (other_docset / "meta.json").write_text(json.dumps({"name": "Other"}))
+    (tmp_path / "NoMeta.docset").mkdir()
+
+    read_files = []
+    read_meta_json = zeal_module._read_meta_json
+
+    def counting_read_meta_json(meta_json, folder, mtime_ns):
+        read_files.append(folder)
+        return read_meta_json(meta_json, folder, mtime_ns)
+
+    monkeypatch.setattr(zeal_module, "_read_meta_json", counting_read_meta_json)
+
+    assert sorted(zeal.installed_docsets()) == ["Other", "wxPython"]
+    assert read_files == ["Other.docset"]
+
+    assert sorted(Zeal(tmp_path).installed_docsets()) == ["Other", "wxPython"]
+    assert read_files == ["Other.docset"]
+
+
+def test_docset_install_replace(data_folder, tmp_path) -> None:
+    """Verify a docset is replaced only after the new version is extracted."""
+    zeal = Zeal(tmp_path)
+    docset_meta = DocSet(
+        name="wxPython",
+        author=DocSetAuthor(name="", link=""),
+        archive="wxPython.tgz",
+        version="4.0.7",
+    )
+    docset_folder = tmp_path / "wxPython.docset"
+    docset_folder.mkdir()
+    (docset_folder / "old-file").touch()
+
+    with pytest.raises(ApplicationError, match="already exists"):
+        zeal.install_docset(docset_meta, data_folder / "wxPython.tgz")
+
+    broken_tarball = tmp_path / "broken.tgz"
+    with tarfile.open(broken_tarball, "w:gz") as broken_archive:
+        broken_archive.add(data_folder / "docsets.json", arcname="docsets.json")
+    with pytest.raises(ApplicationError, match="Unexpected contents"):
+        zeal.install_docset(docset_meta, broken_tarball, replace=True)
+    assert (docset_folder / "old-file").exists()
+
+    zeal.install_docset(docset_meta, data_folder / "wxPython.tgz", replace=True)
+    assert not (docset_folder / "old-file").exists()
+    assert (docset_folder / "meta.json").exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "broken.tgz",
+        "wxPython.docset",
+    ]
+
+
+def test_link_docset(data_folder, tmp_path, monkeypatch) -> None:
+    """Verify a docset is hard linked into another folder, with its own `meta.json`."""
+    docset_meta = DocSet(
+        name="wxPython",
+        author=DocSetAuthor(name="", link=""),
+        archive="wxPython.tgz",
+        version="4.0.7",
+    )
+    first, second = Zeal(tmp_path / "first"), Zeal(tmp_path / "second")
+    first.docset_path.mkdir()
+    second.docset_path.mkdir()
+    first.install_docset(docset_meta, data_folder / "wxPython.tgz")
+    source = first.docset_path / "wxPython.docset"
+
+    second.link_docset(docset_meta, source)
+
+    linked = second.docset_path / "wxPython.docset"
+    license_file = "Contents/Resources/LICENSE"
+    search_index = "Contents/Resources/docSet.dsidx"
+    assert (linked / license_file).samefile(source / license_file)
+    assert not (linked / search_index).samefile(source / search_index)
+    assert (linked / search_index).read_bytes() == (source / search_index).read_bytes()
+    assert not (linked / "meta.json").samefile(source / "meta.json")
+    assert list(second.installed_docsets()) == ["wxPython"]
+
+    # files are copied when they cannot be linked
+    def no_link(source_file, destination_file):
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(zeal_module.os, "link", no_link)
+    second.link_docset(docset_meta, source, replace=True)
+    assert not (linked / license_file).samefile(source / license_file)
+    assert (linked / license_file).read_bytes() == (source / license_file).read_bytes()
+
+
+def test_installed_docsets_racy_manifest(tmp_path, monkeypatch) -> None:
+    """Verify a docset added in the same timestamp tick as the scan is found."""
+    folder_mtime_ns = time.time_ns()
+    # a coarse timestamp, which is not changed by adding the second docset
+    monkeypatch.setattr(Zeal, "_docset_path_mtime", lambda self: folder_mtime_ns)
+    zeal = Zeal(tmp_path)
+    for name in ("First", "Second"):
+        docset_folder = tmp_path / f"{name}.docset"
+        docset_folder.mkdir()
+        (docset_folder / "meta.json").write_text(json.dumps({"name": name}))
+        assert name in zeal.installed_docsets()
+
+
+def test_docset_install_removes_stale_staging(data_folder, tmp_path) -> None:
+    """Verify staging folders left by interrupted installs are removed."""
+    zeal = Zeal(tmp_path)
+    docset_meta = DocSet(
+        name="wxPython",
+        author=DocSetAuthor(name="", link=""),
+        archive="wxPython.tgz",
+        version="4.0.7",
+    )
+    stale, recent, other = (
+        tmp_path / name
+        for name in (".wxPython-stale000", ".wxPython-recent00", ".wxPython-2-abcd1234")
+    )
+    for staging_folder in (stale, recent, other):
+        (staging_folder / "wxPython.docset").mkdir(parents=True)
+        os.utime(staging_folder, (0, 0))
+    os.utime(recent)
+
+    zeal.install_docset(docset_meta, data_folder / "wxPython.tgz")
+
+    assert not stale.exists()
+    assert recent.exists()
+    assert other.exists()